@@ -1,10 +1,17 @@
 import struct
 from io import RawIOBase
+from os import PathLike
+from pathlib import Path
+from typing import Optional, Sequence, Tuple, Union
 
-__all__ = ['encode', 'decode']
+import numpy as np
+
+__all__ = ['encode', 'decode', 'load', 'numeric_columns', 'string_column']
 
 _tp_int = {
     'numeric': 1,
+    'real': 1,
+    'integer': 1,
     'string': 2,
     'date': 3,
     'relational': 4
@@ -30,6 +37,60 @@ def _remove_null(b: bytes) -> str:
     return b[:b.find('\x00')]
 
 
+def _is_numeric(tp: Union[str, list]) -> bool:
+    return not isinstance(tp, list) and _tp_int[tp.lower()] == 1
+
+
+def record_dtype(attributes: Sequence[Tuple[str, Union[str, list]]]) \
+        -> np.dtype:
+    """Returns the packed NumPy structured dtype of a single record with
+    the given attributes. Numeric attributes are stored as little-endian
+    float32 and all others as null-padded byte strings. Fields are named
+    f0, f1, ... in attribute order.
+    """
+    return np.dtype([
+        ('f{}'.format(i), '<f4' if _is_numeric(tp) else 'S' + str(MAX_NOM_LEN))
+        for i, (_, tp) in enumerate(attributes)
+    ])
+
+
+def _decode_header(fid: RawIOBase) -> Tuple[str, list, int]:
+    """Reads the relation and attributes from the start of the file and
+    returns them along with the size of the header in bytes.
+    """
+    relation = struct.unpack(RELATION_FMT, fid.read(MAX_RELATION_LEN))[0]
+    relation = _remove_null(relation)
+    size = MAX_RELATION_LEN
+
+    attributes = []
+    num_attrs = struct.unpack('<I', fid.read(4))[0]
+    size += 4
+    packer = struct.Struct(ATTR_FMT)
+    for i in range(num_attrs):
+        name, tp = packer.unpack(fid.read(packer.size))
+        size += packer.size
+        name = _remove_null(name)
+
+        if tp == 0:
+            num_tps = struct.unpack('<I', fid.read(4))[0]
+            fmt_str = NOM_FMT * num_tps
+            tps = [_remove_null(x) for x in struct.unpack(
+                fmt_str, fid.read(struct.calcsize(fmt_str)))]
+            size += 4 + struct.calcsize(fmt_str)
+            attributes.append((name, tps))
+        else:
+            attributes.append((name, _int_tp[tp].upper()))
+    return relation, attributes, size
+
+
+def _decode_strings(col: np.ndarray) -> np.ndarray:
+    """Decodes a column of null-padded byte strings, decoding each
+    unique value only once.
+    """
+    uniq, inverse = np.unique(col, return_inverse=True)
+    return np.char.decode(uniq, 'utf-8')[inverse]
+
+
 def encode(fid: RawIOBase, data: dict):
     """Encodes a text ARFF file to a binary file with essentially the same
     similar structure.
@@ -41,7 +102,8 @@ def encode(fid: RawIOBase, data: dict):
 
     data: dict
         The ARFF data dictionary. Must have 'relation', 'attributes' and 'data'
-        keys.
+        keys. 'data' may either be a list of instances or a structured
+        array with dtype given by record_dtype().
     """
     fid.write(struct.pack(RELATION_FMT, data['relation'].encode()))
 
@@ -54,16 +116,17 @@ def encode(fid: RawIOBase, data: dict):
             fmt_str = '<I' + NOM_FMT * len(tp)
             fid.write(struct.pack(fmt_str, len(tp), *[x.encode() for x in tp]))
 
-    fmt_str = '<'
-    for _, tp in data['attributes']:
-        if not isinstance(tp, list) and tp.lower() == 'numeric':
-            fmt_str += 'f'
-        else:
-            fmt_str += NOM_FMT
-    packer = struct.Struct(fmt_str)
-    for inst in data['data']:
-        inst = [x.encode() if isinstance(x, str) else x for x in inst]
-        fid.write(packer.pack(*inst))
+    dtype = record_dtype(data['attributes'])
+    if isinstance(data['data'], np.ndarray):
+        records = np.ascontiguousarray(data['data'], dtype=dtype)
+    else:
+        records = np.empty(len(data['data']), dtype=dtype)
+        for i, col in enumerate(zip(*data['data'])):
+            if records.dtype[i].kind == 'S':
+                col = np.char.encode(np.array(col, dtype=str), 'utf-8')
+            records['f{}'.format(i)] = col
+    # Write the record buffer directly without going through struct
+    fid.write(records.view(np.uint8).data)
 
 
 def decode(fid: RawIOBase):
@@ -80,41 +143,86 @@ def decode(fid: RawIOBase):
         A dictionary representing the ARFF file.
     """
     data = {}
-    relation = struct.unpack(RELATION_FMT, fid.read(MAX_RELATION_LEN))[0]
-    data['relation'] = _remove_null(relation)
+    data['relation'], data['attributes'], _ = _decode_header(fid)
+    dtype = record_dtype(data['attributes'])
+    records = np.frombuffer(fid.read(), dtype=dtype)
+
+    cols = []
+    for i in range(len(dtype)):
+        col = records['f{}'.format(i)]
+        if col.dtype.kind == 'S':
+            col = _decode_strings(col)
+        cols.append(col.tolist())
+    data['data'] = [list(x) for x in zip(*cols)]
+    return data
 
-    data['attributes'] = []
-    tp_array = []
-    num_attrs = struct.unpack('<I', fid.read(4))[0]
-    packer = struct.Struct(ATTR_FMT)
-    for i in range(num_attrs):
-        name, tp = packer.unpack(fid.read(packer.size))
-        name = _remove_null(name)
 
-        tp_array.append(tp)
-        if tp == 0:
-            num_tps = struct.unpack('<I', fid.read(4))[0]
-            fmt_str = NOM_FMT * num_tps
-            tps = [_remove_null(x) for x in struct.unpack(
-                fmt_str, fid.read(struct.calcsize(fmt_str)))]
-            data['attributes'].append((name, tps))
-        else:
-            data['attributes'].append((name, _int_tp[tp].upper()))
+def load(path: Union[PathLike, str], mmap: bool = True) -> dict:
+    """Loads a binary ARFF file created with encode() as a structured
+    array of records, without parsing each record individually.
+
+    Parameters:
+    -----------
+    path: pathlike or str
+        The path to the binary ARFF file.
+    mmap: bool, default = True
+        Whether to memory-map the data section instead of reading it
+        into memory. The map is copy-on-write so that the arrays can be
+        modified in-place without changing the file.
 
-    fmt_str = '<'
-    for tp in tp_array:
-        if tp == 1:
-            fmt_str += 'f'
+    Returns:
+    --------
+    data: dict
+        A dictionary with 'relation' and 'attributes' as in decode(),
+        and 'data', a structured array with dtype given by
+        record_dtype(). Use numeric_columns() and string_column() to
+        get usable arrays from it.
+    """
+    path = Path(path)
+    with open(path, 'rb') as fid:
+        relation, attributes, header_size = _decode_header(fid)
+        dtype = record_dtype(attributes)
+        if not mmap or path.stat().st_size == header_size:
+            records = np.frombuffer(fid.read(), dtype=dtype)
         else:
-            fmt_str += NOM_FMT
-    packer = struct.Struct(fmt_str)
-
-    data['data'] = []
-    while True:
-        buf = fid.read(packer.size)
-        if len(buf) == 0:
-            break
-        inst = packer.unpack(buf)
-        inst = [_remove_null(x) if isinstance(x, bytes) else x for x in inst]
-        data['data'].append(inst)
-    return data
+            records = np.memmap(fid, dtype=dtype, mode='c',
+                                offset=header_size)
+    return {'relation': relation, 'attributes': attributes, 'data': records}
+
+
+def numeric_columns(records: np.ndarray, columns: Sequence[int],
+                    rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """Returns a 2-D float32 matrix of the given numeric columns of a
+    structured array returned by load(). If the columns are adjacent in
+    the record and rows is not given, the matrix is a strided view of
+    the records and no data is copied. Otherwise only the selected rows
+    and columns are copied.
+    """
+    columns = list(columns)
+    fields = ['f{}'.format(i) for i in columns]
+    if any(records.dtype[f] != np.dtype('<f4') for f in fields):
+        raise ValueError("Not all columns are numeric.")
+    n_rows = len(records) if rows is None else len(rows)
+    if len(columns) == 0:
+        return np.empty((n_rows, 0), dtype=np.float32)
+
+    offset = records.dtype.fields[fields[0]][1]
+    if columns == list(range(columns[0], columns[0] + len(columns))):
+        x = np.ndarray(
+            (len(records), len(columns)), dtype='<f4', buffer=records,
+            offset=offset, strides=(records.dtype.itemsize, 4)
+        )
+        return x if rows is None else x[rows]
+    if rows is None:
+        return np.stack([records[f] for f in fields], axis=1)
+    return np.stack([records[f][rows] for f in fields], axis=1)
+
+
+def string_column(records: np.ndarray, column: int,
+                  rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """Returns the given string or nominal column of a structured array
+    returned by load(), decoded to a str array. Each unique value is
+    decoded only once. If rows is given, only those rows are decoded.
+    """
+    col = records['f{}'.format(column)]
+    return _decode_strings(col if rows is None else col[rows])
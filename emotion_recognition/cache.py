@@ -0,0 +1,253 @@
+"""Content-addressed on-disk cache of fold results, so that re-running
+an experiment skips every fit that has already been computed.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import types
+from functools import partial
+from os import PathLike
+from pathlib import PurePath
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+from .utils import RaggedArray
+
+__all__ = ['fingerprint', 'FitCache']
+
+# Default maximum total size of a FitCache, in bytes
+_MAX_CACHE_BYTES = 1 << 30
+
+# Number of bytes of an array to hash at a time
+_HASH_BLOCK = 1 << 24
+
+
+def _bytes(arr: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(arr).reshape(-1).view(np.uint8)
+
+
+def _update_array(h, arr: np.ndarray, memo: set):
+    h.update('ndarray{}{}'.format(arr.dtype.str, arr.shape).encode())
+    if arr.dtype == object:
+        for x in arr.flat:
+            _update(h, x, memo)
+    elif arr.ndim == 0 or arr.flags.c_contiguous or len(arr) == 0:
+        h.update(_bytes(arr))
+    else:
+        # Copy at most _HASH_BLOCK bytes at a time
+        rows = max(1, _HASH_BLOCK // max(1, arr[0].nbytes))
+        for i in range(0, len(arr), rows):
+            h.update(_bytes(arr[i:i + rows]))
+
+
+def _update_code(h, code: types.CodeType, memo: set):
+    h.update(code.co_code)
+    _update(h, code.co_names, memo)
+    _update(h, tuple(x for x in code.co_consts
+                     if not isinstance(x, types.CodeType)), memo)
+    for x in code.co_consts:
+        if isinstance(x, types.CodeType):
+            _update_code(h, x, memo)
+
+
+def _state(obj) -> Any:
+    """Returns what is hashed in place of an arbitrary object."""
+    if hasattr(obj, 'fingerprint_state'):
+        return obj.fingerprint_state()
+    if hasattr(obj, 'get_params'):
+        return obj.get_params(deep=False)
+    if hasattr(obj, 'get_config'):
+        return obj.get_config()
+    if hasattr(obj, '__dict__'):
+        return {k: v for k, v in vars(obj).items() if not k.startswith('_')}
+    return pickle.dumps(obj, protocol=4)
+
+
+def _update(h, obj, memo: set):
+    if obj is None or isinstance(obj, (bool, int, float, complex, str,
+                                       bytes, range)):
+        h.update('{}:{!r};'.format(type(obj).__name__, obj).encode())
+    elif isinstance(obj, (np.ndarray, np.generic)):
+        _update_array(h, np.asarray(obj), memo)
+    elif isinstance(obj, PurePath):
+        _update(h, str(obj), memo)
+    elif isinstance(obj, type):
+        h.update('type:{}.{};'.format(obj.__module__,
+                                      obj.__qualname__).encode())
+    elif id(obj) in memo:
+        # Reference cycle
+        h.update(b'cycle;')
+    else:
+        memo.add(id(obj))
+        if isinstance(obj, RaggedArray):
+            h.update(b'RaggedArray')
+            _update(h, obj.flat, memo)
+            _update(h, obj.offsets, memo)
+        elif isinstance(obj, (list, tuple)):
+            h.update('{}{};'.format(type(obj).__name__, len(obj)).encode())
+            for x in obj:
+                _update(h, x, memo)
+        elif isinstance(obj, dict):
+            items = sorted(obj.items(), key=lambda kv: repr(kv[0]))
+            h.update('dict{};'.format(len(items)).encode())
+            for k, v in items:
+                _update(h, k, memo)
+                _update(h, v, memo)
+        elif isinstance(obj, (set, frozenset)):
+            h.update('set{};'.format(len(obj)).encode())
+            for x in sorted(fingerprint(x) for x in obj):
+                h.update(x.encode())
+        elif isinstance(obj, partial):
+            h.update(b'partial')
+            _update(h, (obj.func, obj.args, obj.keywords), memo)
+        elif isinstance(obj, types.FunctionType):
+            h.update('function:{}.{};'.format(obj.__module__,
+                                              obj.__qualname__).encode())
+            _update_code(h, obj.__code__, memo)
+            _update(h, (obj.__defaults__, obj.__kwdefaults__), memo)
+            for cell in obj.__closure__ or ():
+                try:
+                    _update(h, cell.cell_contents, memo)
+                except ValueError:
+                    # Empty cell
+                    h.update(b'empty;')
+        elif isinstance(obj, types.MethodType):
+            h.update(b'method')
+            _update(h, (obj.__func__, obj.__self__), memo)
+        elif isinstance(obj, types.BuiltinFunctionType):
+            h.update('builtin:{}.{};'.format(
+                getattr(obj, '__module__', None), obj.__qualname__).encode())
+        else:
+            h.update('object:{}.{};'.format(
+                type(obj).__module__, type(obj).__qualname__).encode())
+            _update(h, _state(obj), memo)
+        memo.discard(id(obj))
+
+
+def fingerprint(*objs) -> str:
+    """Returns a hex digest identifying the contents of the given
+    objects.
+
+    Arrays and RaggedArrays are hashed by dtype, shape and data.
+    Functions are hashed by name and bytecode, including constants,
+    default arguments and closure variables, but not the globals they
+    reference. Other objects are hashed by their fingerprint_state()
+    method if defined, otherwise by get_params(deep=False) for sklearn
+    estimators, get_config() for Keras objects, or their public
+    attributes.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    _update(h, objs, set())
+    return h.hexdigest()
+
+
+class FitCache:
+    """Content-addressed cache of fold results (e.g. predictions and
+    metrics, and optionally fitted models) in a directory on local
+    disk, with one pickle file per entry.
+
+    Entries are keyed by the fingerprint() of everything that determines
+    the result, e.g. the dataset, train/test indices, model and
+    hyperparameters, so a cached result is only reused for an identical
+    fit. When the total size exceeds max_bytes, least recently used
+    entries are deleted. Entries are written atomically, so the cache
+    may be shared by concurrent processes.
+
+    Note that functions are hashed by their own code only, so the cache
+    should be cleared after changing code that they call.
+
+    Parameters:
+    -----------
+    path: pathlike or str
+        The cache directory, created if it does not exist.
+    max_bytes: int, optional
+        Maximum total size of the cache. Default is 1 GiB.
+    store_models: bool
+        Whether to also store fitted models where supported. Default is
+        to store only predictions and metrics.
+    """
+    def __init__(self, path: Union[PathLike, str],
+                 max_bytes: Optional[int] = None,
+                 store_models: bool = False):
+        self.path = str(path)
+        self.max_bytes = _MAX_CACHE_BYTES if max_bytes is None else max_bytes
+        self.store_models = store_models
+        os.makedirs(self.path, exist_ok=True)
+
+    def key(self, *objs) -> str:
+        """Returns the key for the result determined by objs."""
+        return fingerprint(*objs)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key + '.pkl')
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the entry with the given key, or None if there is no
+        such entry.
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as fid:
+                value = pickle.load(fid)
+        except FileNotFoundError:
+            return None
+        except (EOFError, pickle.UnpicklingError):
+            # Incomplete or corrupt entry
+            self._remove(path)
+            return None
+        try:
+            # Mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Stores an entry, evicting least recently used entries if the
+        cache is full.
+        """
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=self.path)
+        with os.fdopen(fd, 'wb') as fid:
+            pickle.dump(value, fid, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._entry_path(key))
+        self._evict()
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.path):
+            if not entry.name.endswith('.pkl'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    @property
+    def size(self) -> int:
+        """Total size of all entries, in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """Removes all entries."""
+        for _, _, path in self._entries():
+            self._remove(path)
@@ -1,22 +1,41 @@
 import abc
+import copy
 import os
+import random
+import time
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
-from typing import (Any, Callable, Dict, Iterable, List, Optional, Sequence,
-                    Tuple, Union)
+from collections import Counter
+from itertools import chain
+from os import PathLike
+from typing import (Any, Callable, Dict, Iterable, Iterator, List,
+                    NamedTuple, Optional, Sequence, Tuple, Union)
 
 import numpy as np
 import pandas as pd
-from sklearn.base import BaseEstimator, ClassifierMixin
-from sklearn.metrics import precision_score, recall_score
+from scipy.stats import rankdata
+from sklearn.base import (BaseEstimator, ClassifierMixin, TransformerMixin,
+                          clone)
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.metrics import recall_score
+from sklearn.metrics import check_scoring
 from sklearn.model_selection import (BaseCrossValidator, KFold,
-                                     LeaveOneGroupOut, ParameterGrid)
-from sklearn.svm import SVC
+                                     LeaveOneGroupOut, ParameterGrid,
+                                     check_cv)
+from sklearn.svm import SVC, LinearSVC
 
+from .cache import FitCache, fingerprint
 from .dataset import CombinedDataset, LabelledDataset
+from .kernels import KernelCache, blocked_kernel, gram_tiles, sq_dist_tiles
+from .metrics import classification_metrics
+from .normalisation import FoldNormaliser
+from .parallel import parallel_imap, parallel_map
+from .results import ResultsStore
 from .utils import shuffle_multiple
 
-__all__ = ['PrecomputedSVC', 'Classifier', 'SKLearnClassifier']
+__all__ = ['PrecomputedSVC', 'SVMPathSearchCV', 'Classifier',
+           'SKLearnClassifier']
 
 SKClassifierFunction = Callable[[], ClassifierMixin]
 ScoreFunction = Callable[[np.ndarray, np.ndarray], float]
@@ -25,25 +44,63 @@ KernelFunction = Callable[[np.ndarray, np.ndarray], np.ndarray]
 METRICS = ['prec', 'rec', 'uap', 'uar', 'war']
 
 
-def linear_kernel(x, y) -> np.ndarray:
+def linear_kernel(x, y, out: Optional[np.ndarray] = None,
+                  max_memory: Optional[int] = None,
+                  n_jobs: int = 1) -> np.ndarray:
+    if out is not None or max_memory is not None:
+        return blocked_kernel(gram_tiles(x, y), len(x), len(y), out=out,
+                              max_memory=max_memory, n_jobs=n_jobs)
     return np.matmul(x, y.T)
 
 
-def poly_kernel(x, y, d=2, r=0,
-                gamma: Union[str, float] = 'auto') -> np.ndarray:
-    a = np.matmul(x, y.T)
+def _poly_transform(block: np.ndarray, d: int, r: float, gamma: float):
+    block *= gamma
+    block += r
+    block **= d
+
+
+def poly_kernel(x, y, d=2, r=0, gamma: Union[str, float] = 'auto',
+                out: Optional[np.ndarray] = None,
+                max_memory: Optional[int] = None,
+                n_jobs: int = 1) -> np.ndarray:
     if gamma == 'auto':
         gamma = 1 / x.shape[1]
+    if out is not None or max_memory is not None:
+        tiles = gram_tiles(x, y, partial(_poly_transform, d=d, r=r,
+                                         gamma=gamma))
+        return blocked_kernel(tiles, len(x), len(y), out=out,
+                              max_memory=max_memory, n_jobs=n_jobs)
+    a = np.matmul(x, y.T)
     return (gamma * a + r)**d
 
 
-def rbf_kernel(x, y, gamma: Union[str, float] = 'auto') -> np.ndarray:
+def _rbf_transform(block: np.ndarray, gamma: float):
+    block *= -gamma
+    np.exp(block, out=block)
+
+
+def rbf_kernel(x, y, gamma: Union[str, float] = 'auto',
+               out: Optional[np.ndarray] = None,
+               max_memory: Optional[int] = None,
+               n_jobs: int = 1) -> np.ndarray:
+    """RBF kernel exp(-gamma * ||x - y||^2).
+
+    If out or max_memory is given, the kernel is computed in float32 in
+    tiles of at most max_memory bytes, written in-place into out (which
+    may be memory-mapped), so that no full-size temporaries are created.
+    Tiles are computed in parallel by n_jobs threads. The same applies
+    to linear_kernel() and poly_kernel().
+    """
+    if gamma == 'auto':
+        gamma = 1 / x.shape[1]
+    if out is not None or max_memory is not None:
+        tiles = sq_dist_tiles(x, y, partial(_rbf_transform, gamma=gamma))
+        return blocked_kernel(tiles, len(x), len(y), out=out,
+                              max_memory=max_memory, n_jobs=n_jobs)
     a = np.matmul(x, y.T)
     xx = np.sum(x**2, axis=1)
     yy = np.sum(y**2, axis=1)
     s = xx[:, np.newaxis] + yy[np.newaxis, :]
-    if gamma == 'auto':
-        gamma = 1 / x.shape[1]
     # <x - y, x - y> = <x, x> + <y, y> - 2<x, y>
     return np.exp(-gamma * (s - 2 * a))
 
@@ -54,6 +111,23 @@ class PrecomputedSVC(SVC):
     string which is transparently mapped to and from the corresponding
     callable function with the relevant parameters (degree, gamma,
     coef0). All other parameters are passed directly to SVC.
+
+    If kernel_cache is given, the input to fit() and predict() must be a
+    column of instance indices into the cached dataset, as returned by
+    KernelCache.indices(), and kernel matrices are sliced from the cache
+    rather than computed.
+
+    If kernel_memory is given, kernel matrices are computed in float32
+    tiles of at most that many bytes, without full-size temporaries.
+
+    If approximation is given, the kernel (with the same kernel, gamma,
+    degree and coef0 parameters) is approximated by an explicit feature
+    map of rank n_components, and a linear SVM is trained in the primal
+    on the mapped features. This scales roughly linearly with the number
+    of instances. approximation may be 'nystroem', for any kernel, or
+    'rff' (random Fourier features), for the 'rbf' kernel only. The
+    'linear' kernel needs no feature map. If probability is True, Platt
+    scaling is fit with CalibratedClassifierCV.
     """
     KERNELS = {'rbf': rbf_kernel, 'poly': poly_kernel, 'linear': linear_kernel}
 
@@ -61,7 +135,11 @@ class PrecomputedSVC(SVC):
                  shrinking=True, probability=False, tol=1e-3, cache_size=200,
                  class_weight=None, verbose=False, max_iter=-1,
                  decision_function_shape='ovr', break_ties=False,
-                 random_state=None):
+                 random_state=None,
+                 kernel_cache: Optional[KernelCache] = None,
+                 kernel_memory: Optional[int] = None,
+                 approximation: Optional[str] = None,
+                 n_components: int = 1000):
         super().__init__(
             kernel=kernel, degree=degree, gamma=gamma,
             coef0=coef0, tol=tol, C=C, shrinking=shrinking,
@@ -71,6 +149,10 @@ class PrecomputedSVC(SVC):
             break_ties=break_ties, random_state=random_state
         )
         self.kernel_name = kernel
+        self.kernel_cache = kernel_cache
+        self.kernel_memory = kernel_memory
+        self.approximation = approximation
+        self.n_components = n_components
         self.kernel = self._get_kernel_func()
 
     def get_params(self, deep) -> Dict[str, Any]:
@@ -90,14 +172,163 @@ class PrecomputedSVC(SVC):
         predict(). This is calculated at runtime in order to more easily
         handle changes in parameters such as kernel, gamma, etc.
         """
-        f = self.KERNELS[self.kernel]
+        if self.kernel_cache is not None:
+            return partial(self.kernel_cache.kernel_function,
+                           kernel=self.kernel_name, gamma=self.gamma,
+                           degree=self.degree, coef0=self.coef0)
+        f = self.KERNELS[self.kernel_name]
         params = {}
-        if self.kernel == 'poly':
+        if self.kernel_name == 'poly':
             params = {'d': self.degree, 'r': self.coef0, 'gamma': self.gamma}
-        elif self.kernel == 'rbf':
+        elif self.kernel_name == 'rbf':
             params = {'gamma': self.gamma}
+        if self.kernel_memory is not None:
+            params['max_memory'] = self.kernel_memory
         return partial(f, **params)
 
+    def _get_feature_map(self, n_features: int) -> Optional[TransformerMixin]:
+        """Returns the (unfitted) feature map approximating the kernel,
+        or None for the linear kernel.
+        """
+        gamma = 1 / n_features if self.gamma == 'auto' else self.gamma
+        if self.kernel_name == 'linear':
+            return None
+        if self.approximation == 'rff':
+            if self.kernel_name != 'rbf':
+                raise ValueError("Random Fourier features are only valid for "
+                                 "the rbf kernel.")
+            return RBFSampler(gamma=gamma, n_components=self.n_components,
+                              random_state=self.random_state)
+        elif self.approximation == 'nystroem':
+            return Nystroem(kernel=self.kernel_name, gamma=gamma,
+                            degree=self.degree, coef0=self.coef0,
+                            n_components=self.n_components,
+                            random_state=self.random_state)
+        raise ValueError("Unknown kernel approximation '{}'.".format(
+            self.approximation))
+
+    def fit(self, X, y, sample_weight=None):
+        if self.approximation is None:
+            return super().fit(X, y, sample_weight=sample_weight)
+        if self.kernel_cache is not None:
+            raise ValueError("Kernel approximation cannot be used with a "
+                             "kernel cache.")
+        X = np.asarray(X)
+        self.feature_map_ = self._get_feature_map(X.shape[1])
+        if self.feature_map_ is not None:
+            X = self.feature_map_.fit_transform(X)
+        max_iter = 1000 if self.max_iter == -1 else self.max_iter
+        linear = LinearSVC(C=self.C, tol=self.tol, dual=False,
+                           class_weight=self.class_weight,
+                           max_iter=max_iter, random_state=self.random_state)
+        if self.probability:
+            self.calibrated_ = CalibratedClassifierCV(
+                linear, method='sigmoid', ensemble=False
+            ).fit(X, y, sample_weight=sample_weight)
+            # With ensemble=False this is fit on all the training data
+            linear = self.calibrated_.calibrated_classifiers_[0].estimator
+        else:
+            linear.fit(X, y, sample_weight=sample_weight)
+        self.linear_ = linear
+        self.classes_ = linear.classes_
+        return self
+
+    def _transform(self, X) -> np.ndarray:
+        X = np.asarray(X)
+        if self.feature_map_ is None:
+            return X
+        return self.feature_map_.transform(X)
+
+    def predict(self, X) -> np.ndarray:
+        if self.approximation is None:
+            return super().predict(X)
+        return self.linear_.predict(self._transform(X))
+
+    def decision_function(self, X) -> np.ndarray:
+        if self.approximation is None:
+            return super().decision_function(X)
+        return self.linear_.decision_function(self._transform(X))
+
+    def predict_proba(self, X) -> np.ndarray:
+        if self.approximation is None:
+            return super().predict_proba(X)
+        if not self.probability:
+            raise AttributeError("predict_proba is not available when "
+                                 "probability=False")
+        return self.calibrated_.predict_proba(self._transform(X))
+
+    def predict_log_proba(self, X) -> np.ndarray:
+        return np.log(self.predict_proba(X))
+
+    def _fit_gram(self, gram: np.ndarray, X, y, sample_weight=None):
+        """Fits using the given precomputed training kernel matrix of X,
+        rather than computing it. The kernel function is still used for
+        prediction.
+        """
+        kernel = self.kernel
+        self.kernel = lambda a, b: gram
+        try:
+            super().fit(X, y, sample_weight=sample_weight)
+        finally:
+            self.kernel = kernel
+        return self
+
+    def _has_bounded_svs(self, y, sample_weight=None) -> bool:
+        """Whether any dual coefficient of the fitted model is at its
+        upper bound C_i = C * class_weight[y_i] * sample_weight[i].
+        """
+        sv = self.support_
+        bound = self.C * self.class_weight_[np.searchsorted(self.classes_,
+                                                            y[sv])]
+        if sample_weight is not None:
+            bound = bound * sample_weight[sv]
+        return bool(np.any(np.abs(self.dual_coef_) >= bound * (1 - 1e-8)))
+
+    def fit_path(self, X, y, Cs: Sequence[float],
+                 sample_weight=None) -> List['PrecomputedSVC']:
+        """Fits a copy of this classifier for each value of C, returned
+        in the same order as Cs. The training kernel matrix is computed
+        once and shared by all fits.
+
+        Values of C are solved in increasing order. Once a solution has
+        no dual coefficients at their upper bound, it is also the
+        solution for every larger C, so the remaining fits are skipped
+        and share that solution. (libsvm cannot be warm-started from a
+        previous dual solution, so each remaining fit is a cold start.)
+        """
+        y = np.asarray(y)
+        if sample_weight is not None:
+            sample_weight = np.asarray(sample_weight)
+        models: List[Optional[PrecomputedSVC]] = [None] * len(Cs)
+        if self.approximation is not None:
+            for i, C in enumerate(Cs):
+                models[i] = clone(self).set_params(C=C).fit(
+                    X, y, sample_weight=sample_weight)
+            return models
+
+        gram = np.asarray(self.kernel(X, X), dtype=np.float64, order='C')
+        prev = None
+        for i in np.argsort(Cs, kind='stable'):
+            if prev is not None and not self.probability \
+                    and not prev._has_bounded_svs(y, sample_weight):
+                clf = copy.copy(prev)
+                clf.C = Cs[i]
+            else:
+                clf = clone(self).set_params(C=Cs[i])
+                clf._fit_gram(gram, X, y, sample_weight=sample_weight)
+            models[i] = prev = clf
+        return models
+
+
+def _precompute_kernels(model, param_grid: Optional[Iterable[Dict[str, Any]]]):
+    """Computes the matrices needed by param_grid of the KernelCache of a
+    PrecomputedSVC, if any, so that they are computed once before the
+    cache is shared with parallel workers rather than by each worker.
+    """
+    if isinstance(model, PrecomputedSVC) and model.kernel_cache is not None:
+        model.kernel_cache.precompute(params.get('kernel', model.kernel_name)
+                                      for params in (param_grid or [{}]))
+
 
 class Classifier(abc.ABC):
     """Base class for classifiers used in test_model()."""
@@ -125,6 +356,13 @@ class Classifier(abc.ABC):
         """Generates predictions for the given input."""
         return NotImplementedError()
 
+    def fingerprint_state(self) -> Dict[str, Any]:
+        """Returns the parameters which determine the results of fit()
+        and predict(), to identify this classifier in FitCache keys.
+        Default is all public attributes.
+        """
+        return {k: v for k, v in vars(self).items() if not k.startswith('_')}
+
 
 class SKLearnClassifier(Classifier):
     """Class wrapper for a scikit-learn classifier instance.
@@ -135,13 +373,37 @@ class SKLearnClassifier(Classifier):
         A callable that returns a new proper classifier that can be
         trained.
     param_grid: dict, optional
+    search: str, one of {'grid', 'halving'}
+        How to search param_grid. See optimise_params().
+    search_args: dict
+        Additional arguments for the search, e.g. the budget for
+        successive halving.
+    backend: str, one of {'thread', 'process'}
+        Whether to fit candidates in threads or processes. See
+        optimise_params().
+    max_workers: int
+        The number of candidates to fit in parallel. Default is the
+        number of CPUs available to this process.
+    blas_threads: int, optional
+        The number of BLAS threads of each worker process if backend is
+        'process'. See optimise_params().
     """
     def __init__(self, model_fn: SKClassifierFunction,
                  param_grid: Optional[Dict[str, Sequence]],
-                 cv_score_fn: Optional[ScoreFunction]):
+                 cv_score_fn: Optional[ScoreFunction],
+                 search: str = 'grid',
+                 search_args: Dict[str, Any] = {},
+                 backend: str = 'thread',
+                 max_workers: int = len(os.sched_getaffinity(0)),
+                 blas_threads: Optional[int] = None):
         self.model_fn = model_fn
         self.param_grid = ParameterGrid(param_grid)
         self.cv_score_fn = cv_score_fn
+        self.search = search
+        self.search_args = search_args
+        self.backend = backend
+        self.max_workers = max_workers
+        self.blas_threads = blas_threads
 
     def fit(self, x_train: np.ndarray, y_train: np.ndarray,
             x_valid: np.ndarray, y_valid: np.ndarray, fold=None):
@@ -153,7 +415,9 @@ class SKLearnClassifier(Classifier):
         if self.param_grid:
             self.clf = optimise_params(
                 self.param_grid, self.model_fn, self.cv_score_fn, x_train,
-                y_train, x_valid, y_valid, max_workers=24
+                y_train, x_valid, y_valid, max_workers=self.max_workers,
+                search=self.search, search_args=self.search_args,
+                backend=self.backend, blas_threads=self.blas_threads
             )
         else:
             self.clf = self.model_fn()
@@ -163,6 +427,130 @@ class SKLearnClassifier(Classifier):
                 y_test: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         return self.clf.predict(x_test), y_test
 
+    def fingerprint_state(self) -> Dict[str, Any]:
+        # Parallelism settings and the fitted classifier don't affect
+        # results
+        return {'model_fn': self.model_fn,
+                'param_grid': self.param_grid.param_grid,
+                'cv_score_fn': self.cv_score_fn, 'search': self.search,
+                'search_args': self.search_args}
+
+
+def _fold_data(x: np.ndarray, idx: np.ndarray, train: np.ndarray,
+               normaliser: Optional[FoldNormaliser]) -> np.ndarray:
+    """Returns x[idx], normalised with statistics from the given
+    training instances if a normaliser is given.
+    """
+    if normaliser is None:
+        return x[idx]
+    return normaliser.transform(x[idx], idx, train)
+
+
+class _FoldJob(NamedTuple):
+    """One (fold, rep) job of cross-validation. Indices refer to the
+    full dataset. norm_train gives the training instances whose
+    statistics normalise the training, validation and test data, so
+    that the model is tested on data normalised as it was trained. key
+    identifies the result in a FitCache.
+    """
+    fold: Any
+    name: str
+    rep: int
+    seed: int
+    train: np.ndarray
+    valid: np.ndarray
+    test: np.ndarray
+    norm_train: np.ndarray
+    key: Optional[str] = None
+
+
+def _job_seeds(random_state: Optional[int]) -> Iterable[int]:
+    """Yields a deterministic sequence of independent seeds."""
+    seq = np.random.SeedSequence(random_state)
+    while True:
+        yield int(seq.spawn(1)[0].generate_state(1)[0])
+
+
+def _with_cache_keys(jobs: List[_FoldJob], cache: Optional[FitCache],
+                     seeded: bool, *context) -> List[_FoldJob]:
+    """Returns the jobs with FitCache keys determined by the context
+    (i.e. data, model, etc.) and each job's indices and rep, and its
+    seed if seeded.
+    """
+    if cache is None:
+        return jobs
+    prefix = cache.key(*context)
+    return [job._replace(key=cache.key(
+        prefix, job.fold, job.rep, job.train, job.valid, job.test,
+        job.norm_train, job.seed if seeded else None
+    )) for job in jobs]
+
+
+def _run_fold(job: _FoldJob, model: Classifier, x: np.ndarray, y: np.ndarray,
+              n_classes: int, normaliser: Optional[FoldNormaliser],
+              copy_model: bool, cache: Optional[FitCache] = None) \
+        -> Tuple[Any, int, Dict[str, Any]]:
+    """Fits and tests the model on one fold, returning the fold, rep and
+    metrics. If the result is in cache, it is returned without fitting.
+    """
+    if cache is not None:
+        entry = cache.get(job.key)
+        if entry is not None:
+            print("{} (rep {}): cached".format(job.name, job.rep))
+            return job.fold, job.rep, entry['metrics']
+    print("{} (rep {})".format(job.name, job.rep))
+    # Seed the global RNGs used by models and shuffle_multiple()
+    np.random.seed(job.seed)
+    random.seed(job.seed)
+    if copy_model:
+        model = copy.deepcopy(model)
+
+    x_train = _fold_data(x, job.train, job.norm_train, normaliser)
+    if job.valid is job.train:
+        x_valid = x_train
+    else:
+        x_valid = _fold_data(x, job.valid, job.norm_train, normaliser)
+    x_test = _fold_data(x, job.test, job.norm_train, normaliser)
+
+    model.fit(x_train, y[job.train], x_valid, y[job.valid], fold=job.fold)
+    # We need to return y_true just in case the order is modified by
+    # batching.
+    y_pred, y_true = model.predict(x_test, y[job.test])
+    metrics = classification_metrics(y_true, y_pred, n_classes)
+    if cache is not None:
+        entry = {'y_pred': y_pred, 'y_true': y_true, 'metrics': metrics}
+        if cache.store_models:
+            entry['model'] = model
+        cache.put(job.key, entry)
+    return job.fold, job.rep, metrics
+
+
+def _run_folds(jobs: List[_FoldJob], model: Classifier,
+               x: np.ndarray, y: np.ndarray, n_classes: int,
+               normaliser: Optional[FoldNormaliser], n_jobs: int,
+               backend: str, blas_threads: Optional[int],
+               cache: Optional[FitCache] = None) \
+        -> Iterator[Tuple[Any, int, Dict[str, Any]]]:
+    """Runs the jobs, in parallel if n_jobs > 1, yielding the results
+    in order. Each parallel job fits its own copy of the model.
+    """
+    if n_jobs > 1 and isinstance(model, SKLearnClassifier):
+        _precompute_kernels(model.model_fn(), model.param_grid)
+    fn = partial(_run_fold, model=model, x=x, y=y, n_classes=n_classes,
+                 normaliser=normaliser, copy_model=n_jobs > 1, cache=cache)
+    return parallel_imap(fn, jobs, n_jobs, backend=backend,
+                         blas_threads=blas_threads)
+
+
+def _pending_jobs(store: ResultsStore,
+                  jobs: List[_FoldJob]) -> List[_FoldJob]:
+    """Returns the jobs whose results are not already in store."""
+    todo = [job for job in jobs if not store.is_done(job.fold, job.rep)]
+    if len(todo) < len(jobs):
+        print("Resuming: {} of {} folds already done.".format(
+            len(jobs) - len(todo), len(jobs)))
+    return todo
+
 
 def within_corpus_cross_validation(model: Classifier,
                                    x: np.ndarray,
@@ -172,7 +560,16 @@ def within_corpus_cross_validation(model: Classifier,
                                    classes: List[str],
                                    reps: int = 1,
                                    splitter: BaseCrossValidator = KFold(10),
-                                   validation: str = 'valid'):
+                                   validation: str = 'valid',
+                                   normaliser: Optional[FoldNormaliser]
+                                   = None,
+                                   n_jobs: int = 1,
+                                   backend: str = 'process',
+                                   blas_threads: Optional[int] = None,
+                                   random_state: Optional[int] = None,
+                                   results_path: Optional[
+                                       Union[PathLike, str]] = None,
+                                   cache: Optional[FitCache] = None):
     """Cross validates a `Classifier` instance on a single dataset.
 
     Parameters:
@@ -196,6 +593,36 @@ def within_corpus_cross_validation(model: Classifier,
         Validation method to use for parameter optimisation. 'train'
         uses training data, 'test' uses test data, 'valid' uses a random
         inner cross-validation fold with the same splitting method.
+    normaliser: FoldNormaliser, optional
+        If given, the data of each fold is normalised using statistics
+        of that fold's training data only, e.g. from
+        Dataset.fold_normaliser(). x should then be unnormalised. If
+        validation is 'valid', this is the inner training set, and the
+        validation and test data use the same statistics.
+    n_jobs: int
+        Number of (fold, rep) jobs to run in parallel. Each job fits
+        its own copy of the model.
+    backend: str, one of {'process', 'thread'}
+        How to run parallel jobs. With 'process', x is shared with the
+        workers rather than copied, and the model must be picklable.
+        See parallel_map().
+    blas_threads: int, optional
+        BLAS threads per worker process. See parallel_map().
+    random_state: int, optional
+        Seed from which each job's seed is derived. Each job seeds the
+        global numpy and random RNGs with its own seed, so results do
+        not depend on n_jobs.
+    results_path: pathlike or str, optional
+        If given, results are saved to this .npz file after each fold,
+        and folds already saved there by an interrupted run with the
+        same data, model, splitter, validation, normaliser and
+        random_state are not run again. Results saved by a different
+        run raise a ValueError. See ResultsStore.
+    cache: FitCache, optional
+        If given, the predictions and metrics of each fold are cached,
+        keyed by the data, model, normaliser, fold indices and rep (and
+        job seed if random_state is given), and folds with cached
+        results are not fit again, e.g. when re-running an experiment.
 
     Returns:
     --------
@@ -203,40 +630,29 @@ def within_corpus_cross_validation(model: Classifier,
         A dataframe holding the results from all runs with this model.
     """
     folds = splitter.get_n_splits(x, y, speakers)
-    df = pd.DataFrame(
-        index=pd.RangeIndex(1, folds + 1),
-        columns=pd.MultiIndex.from_product(
-            [METRICS, classes, range(reps)], names=['metric', 'class', 'rep'])
-    )
-
-    fold = 1
-    # LOSGO cross-validation
-    for train, test in splitter.split(x, y, groups):
-        x_train = x[train]
-        y_train = y[train]
-        x_test = x[test]
-        y_test = y[test]
-
-        # This checks to see if the test set still has different
-        # speakers, so that we can validate using each of them. This is
-        # used for IEMOCAP and MSP-IMPROV sessions.
-        n_splits = splitter.get_n_splits(x_test, y_test, speakers[test])
-        if n_splits > 1 and isinstance(splitter, LeaveOneGroupOut):
-            for valid, test in splitter.split(x_test, y_test, speakers[test]):
-                print("Fold {}/{}".format(fold, folds))
-
-                x_valid = x_test[valid]
-                y_valid = y_test[valid]
-                x_test2 = x_test[test]
-                y_test2 = y_test[test]
-
-                model.fit(x_train, y_train, x_valid, y_valid, fold=fold)
-                # We need to return y_true just in case the order is
-                # modified by batching.
-                y_pred, y_true = model.predict(x_test2, y_test2)
-                _record_metrics(df, fold, y_true, y_pred, len(classes))
-                fold += 1
-        else:
+
+    seeds = _job_seeds(random_state)
+    jobs = []
+    for rep in range(reps):
+        fold = 1
+        # LOSGO cross-validation
+        for train, test in splitter.split(x, y, groups):
+            # This checks to see if the test set still has different
+            # speakers, so that we can validate using each of them. This
+            # is used for IEMOCAP and MSP-IMPROV sessions.
+            n_splits = splitter.get_n_splits(x[test], y[test], speakers[test])
+            if n_splits > 1 and isinstance(splitter, LeaveOneGroupOut):
+                for valid, test2 in splitter.split(x[test], y[test],
+                                                   speakers[test]):
+                    jobs.append(_FoldJob(
+                        fold, "Fold {}/{}".format(fold, folds), rep,
+                        next(seeds), train, test[valid], test[test2], train
+                    ))
+                    fold += 1
+                continue
+
+            seed = next(seeds)
+            norm_train = train
             # TODO: fix this in the general case when using arbitrary
             # cross-validation splitter
             # Make sure we have at least two speakers in the training
@@ -244,36 +660,58 @@ def within_corpus_cross_validation(model: Classifier,
             if validation == 'valid' and len(
                     np.unique(speakers[train])) >= 2:
                 n_splits = splitter.get_n_splits(
-                    x_train, y_train, speakers[train])
+                    x[train], y[train], speakers[train])
 
                 # Select random inner fold to use as validation set
-                r = np.random.randint(n_splits) + 1
-                splits = splitter.split(x_train, y_train, speakers[train])
+                r = np.random.default_rng(seed).integers(n_splits) + 1
+                splits = splitter.split(x[train], y[train], speakers[train])
                 for _ in range(r):
                     train2, valid = next(splits)
-
-                x_valid = x_train[valid]
-                y_valid = y_train[valid]
-                x_train = x_train[train2]
-                y_train = y_train[train2]
+                valid = train[valid]
+                train = train[train2]
+                if normaliser is not None:
+                    # Normalise with statistics of the inner training set
+                    # only, which the test data must also use.
+                    norm_train = train
             elif validation == 'test':
-                x_valid = x_test
-                y_valid = y_test
+                valid = test
             else:
-                x_valid = x_train
-                y_valid = y_train
-
-            print("Fold {}/{}".format(fold, folds))
-            model.fit(x_train, y_train, x_valid, y_valid, fold=fold)
-            y_pred, y_true = model.predict(x_test, y_test)
-            _record_metrics(df, fold, y_true, y_pred, len(classes))
+                valid = train
+            jobs.append(_FoldJob(fold, "Fold {}/{}".format(fold, folds), rep,
+                                 seed, train, valid, test, norm_train))
             fold += 1
-    return df
+
+    # Inner speaker splits can give more folds than the splitter
+    n_folds = max([folds] + [job.fold for job in jobs])
+    run_key = ''
+    if results_path is not None:
+        run_key = fingerprint(x, y, speakers, groups, model, splitter,
+                              validation, normaliser, random_state)
+    store = ResultsStore(METRICS, classes, reps, range(1, n_folds + 1),
+                         path=results_path, run_key=run_key)
+    jobs = _with_cache_keys(_pending_jobs(store, jobs), cache,
+                            random_state is not None, x, y, len(classes),
+                            model, normaliser)
+    for fold, rep, metrics in _run_folds(
+            jobs, model, x, y, len(classes), normaliser, n_jobs, backend,
+            blas_threads, cache=cache):
+        store.record(fold, rep, metrics)
+        store.flush()
+    return store.to_dataframe()
 
 
 def cross_corpus_cross_validation(clf: Classifier,
                                   combined_dataset: CombinedDataset,
-                                  reps: int = 1):
+                                  reps: int = 1,
+                                  normaliser: Optional[FoldNormaliser]
+                                  = None,
+                                  n_jobs: int = 1,
+                                  backend: str = 'process',
+                                  blas_threads: Optional[int] = None,
+                                  random_state: Optional[int] = None,
+                                  results_path: Optional[
+                                      Union[PathLike, str]] = None,
+                                  cache: Optional[FitCache] = None):
     """Performs cross-validation using each corpus as test set, and the
     rest as training set.
 
@@ -286,40 +724,82 @@ def cross_corpus_cross_validation(clf: Classifier,
         corpora.
     reps: int
         The number of repetitions to do for each cross-validation round.
+    normaliser: FoldNormaliser, optional
+        If given, the data of each fold is normalised using statistics
+        of that fold's training data only, e.g. from
+        CombinedDataset.fold_normaliser().
+    n_jobs, backend, blas_threads, random_state:
+        Parallel execution of (corpus, rep) jobs. See
+        within_corpus_cross_validation().
+    results_path: pathlike or str, optional
+        File to save results to after each fold, and resume from. See
+        within_corpus_cross_validation().
+    cache: FitCache, optional
+        Cache of fold results. See within_corpus_cross_validation().
     """
-    df = pd.DataFrame(
-        index=pd.Index(combined_dataset.corpora),
-        columns=pd.MultiIndex.from_product(
-            [METRICS, combined_dataset.classes, range(reps)],
-            names=['metric', 'class', 'rep']
-        )
-    )
-    n_classes = len(combined_dataset.classes)
+    run_key = ''
+    if results_path is not None:
+        run_key = fingerprint(combined_dataset.x, combined_dataset.y,
+                              combined_dataset.corpus_indices, clf,
+                              normaliser, random_state)
+    store = ResultsStore(METRICS, combined_dataset.classes, reps,
+                         combined_dataset.corpora, path=results_path,
+                         run_key=run_key)
+    seeds = _job_seeds(random_state)
+    jobs = []
     for corpus in combined_dataset.corpora:
-        print("Fold {}".format(corpus))
         test_idx, train_idx = combined_dataset.get_corpus_split(corpus)
-        x_train = combined_dataset.x[train_idx]
-        y_train = combined_dataset.y[train_idx]
-        x_test = combined_dataset.x[test_idx]
-        y_test = combined_dataset.y[test_idx]
         for rep in range(reps):
-            print("Rep {}".format(rep))
-            clf.fit(x_train, y_train, x_valid=x_train, y_valid=y_train,
-                    fold=corpus)
-            y_pred, y_true = clf.predict(x_test, y_test)
-
-            # Record metrics
-            df.loc[corpus, ('war', slice(None), rep)] = recall_score(
-                y_true, y_pred, average='micro')
-            df.loc[corpus, ('uar', slice(None), rep)] = recall_score(
-                y_true, y_pred, average='macro')
-            df.loc[corpus, ('uap', slice(None), rep)] = precision_score(
-                y_true, y_pred, average='macro')
-            df.loc[corpus, ('rec', slice(None), rep)] = recall_score(
-                y_true, y_pred, average=None, labels=list(range(n_classes)))
-            df.loc[corpus, ('prec', slice(None), rep)] = precision_score(
-                y_true, y_pred, average=None, labels=list(range(n_classes)))
-    return df
+            jobs.append(_FoldJob(corpus, "Fold {}".format(corpus), rep,
+                                 next(seeds), train_idx, train_idx, test_idx,
+                                 train_idx))
+
+    x, y = combined_dataset.x, combined_dataset.y
+    n_classes = len(combined_dataset.classes)
+    jobs = _with_cache_keys(_pending_jobs(store, jobs), cache,
+                            random_state is not None, x, y, n_classes, clf,
+                            normaliser)
+    for corpus, rep, metrics in _run_folds(
+            jobs, clf, x, y, n_classes, normaliser, n_jobs, backend,
+            blas_threads, cache=cache):
+        store.record(corpus, rep, metrics)
+        store.flush()
+    return store.to_dataframe()
+
+
+class _BinaryJob(NamedTuple):
+    """One class-vs-rest problem on one fold of test_one_vs_rest()."""
+    cls: str
+    label: int
+    rep: int
+    fold: int
+    train: np.ndarray
+    test: np.ndarray
+
+
+def _run_binary(job: _BinaryJob, model_fn: Callable,
+                param_grid: Optional[ParameterGrid], x: np.ndarray,
+                y: np.ndarray, max_workers: int) \
+        -> Tuple[_BinaryJob, Dict[str, float]]:
+    """Fits and tests a classifier of job.label against the rest,
+    returning the job and the precision and recall of that class.
+    """
+    y = (y == job.label).astype(int)
+    x_train, y_train = x[job.train], y[job.train]
+    x_test, y_test = x[job.test], y[job.test]
+
+    if param_grid:
+        classifier = optimise_params(
+            param_grid, model_fn, recall_score, x_train, y_train, x_test,
+            y_test, max_workers=max_workers
+        )
+    else:
+        classifier = model_fn()
+        classifier.fit(x_train, y_train)
+
+    y_pred = classifier.predict(x_test)
+    metrics = classification_metrics(y_test, y_pred, 2)
+    return job, {'prec': metrics['prec'][1], 'rec': metrics['rec'][1]}
 
 
 def test_one_vs_rest(model_fn,
@@ -327,15 +807,43 @@ def test_one_vs_rest(model_fn,
                      gender: str = 'all',
                      reps: int = 1,
                      param_grid: Optional[Dict[str, Any]] = None,
-                     splitter: BaseCrossValidator = KFold(10)) -> pd.DataFrame:
+                     splitter: BaseCrossValidator = KFold(10),
+                     n_jobs: int = 1,
+                     backend: str = 'thread',
+                     blas_threads: Optional[int] = None) -> pd.DataFrame:
+    """Cross-validates a binary classifier of each class against the
+    rest, returning the precision and recall of each class in each fold.
+
+    The folds are split once using the multiclass labels and shared by
+    all classes. If model_fn returns a PrecomputedSVC, kernel values are
+    computed once for the whole dataset in a KernelCache, which is
+    shared by all folds, classes and grid points.
+
+    Parameters:
+    -----------
+    model_fn: callable
+        Returns a new classifier, with parameters from param_grid as
+        keyword arguments.
+    dataset: LabelledDataset
+        The dataset.
+    gender: str, one of {'all', 'male', 'female'}
+        Which speakers' instances to use.
+    reps: int
+        The number of repetitions.
+    param_grid: dict, optional
+        If given, parameters are optimised on the test data of each fold
+        with optimise_params().
+    splitter: BaseCrossValidator
+        The cross-validation splitter, with speakers as groups.
+    n_jobs: int
+        Number of binary problems to fit in parallel.
+    backend: str, one of {'thread', 'process'}
+        How to run parallel jobs. See parallel_map().
+    blas_threads: int, optional
+        BLAS threads per worker process. See parallel_map().
+    """
     labels = sorted([x[:3] for x in dataset.classes])
 
-    rec = pd.DataFrame(
-        index=pd.RangeIndex(splitter.get_n_splits(
-            dataset.x, dataset.labels[0], dataset.speaker_indices)),
-        columns=pd.MultiIndex.from_product(
-            [['prec', 'rec'], labels, list(range(reps))],
-            names=['metric', 'class', 'rep']))
     if gender == 'male':
         gender_indices = dataset.male_indices
     elif gender == 'female':
@@ -345,27 +853,34 @@ def test_one_vs_rest(model_fn,
 
     groups = dataset.speaker_indices[gender_indices]
     x = dataset.x[gender_indices]
-    for cls in dataset.classes:
-        y = dataset.labels[cls][gender_indices]
-        for rep in range(reps):
-            for fold, (train, test) in enumerate(
-                    splitter.split(x, y, groups)):
-                x_train, y_train = x[train], y[train]
-                x_test, y_test = x[test], y[test]
-
-                if param_grid:
-                    classifier = optimise_params(
-                        param_grid, model_fn, recall_score, x_train, y_train,
-                        x_test, y_test
-                    )
-                else:
-                    classifier = model_fn()
-
-                y_pred = classifier.predict(x_test)
-                rec[('prec', cls[:3], rep)][fold] = precision_score(y_test,
-                                                                    y_pred)
-                rec[('rec', cls[:3], rep)][fold] = recall_score(y_test, y_pred)
-    return rec
+    y = dataset.y[gender_indices]
+    if param_grid:
+        param_grid = ParameterGrid(param_grid)
+
+    model = model_fn()
+    if isinstance(model, PrecomputedSVC) and model.approximation is None:
+        cache = KernelCache(x)
+        model_fn = partial(model_fn, kernel_cache=cache)
+        _precompute_kernels(model_fn(), param_grid)
+        x = cache.indices()
+
+    n_folds = splitter.get_n_splits(x, y, groups)
+    store = ResultsStore(['prec', 'rec'], labels, reps, range(n_folds))
+    jobs = []
+    for rep in range(reps):
+        for fold, (train, test) in enumerate(splitter.split(x, y, groups)):
+            for label, cls in enumerate(dataset.classes):
+                jobs.append(_BinaryJob(cls[:3], label, rep, fold, train,
+                                       test))
+
+    # Divide the CPUs between parallel jobs and their parameter searches
+    max_workers = max(1, len(os.sched_getaffinity(0)) // n_jobs)
+    fn = partial(_run_binary, model_fn=model_fn, param_grid=param_grid, x=x,
+                 y=y, max_workers=max_workers)
+    for job, metrics in parallel_imap(fn, jobs, n_jobs, backend=backend,
+                                      blas_threads=blas_threads):
+        store.record(job.fold, job.rep, metrics, cls=job.cls)
+    return store.to_dataframe()
 
 
 def _test_one_param(params, cls, score_fn, x_train, y_train, x_valid, y_valid):
@@ -376,6 +891,46 @@ def _test_one_param(params, cls, score_fn, x_train, y_train, x_valid, y_valid):
     return classifier, score
 
 
+def _path_key(params: Dict[str, Any]) -> str:
+    """Identifies the C path that a parameter combination belongs to."""
+    return repr(sorted((k, v) for k, v in params.items() if k != 'C'))
+
+
+def _c_paths(param_grid: Iterable[Dict[str, Any]]) \
+        -> List[Tuple[Dict[str, Any], List[float]]]:
+    """Groups a parameter grid by all parameters except C, returning a
+    list of (params, Cs) pairs in order of first appearance.
+    """
+    paths: Dict[str, Tuple[Dict[str, Any], List[float]]] = {}
+    for params in param_grid:
+        params = dict(params)
+        C = params.pop('C', 1.0)
+        paths.setdefault(_path_key(params), (params, []))[1].append(C)
+    return list(paths.values())
+
+
+def _path_order(param_grid: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Returns, for each combination of param_grid in order, its index
+    in the concatenation of the Cs of _c_paths(param_grid).
+    """
+    keys = [_path_key(params) for params in param_grid]
+    lengths = Counter(keys)
+    starts = dict(zip(lengths, np.cumsum([0] + list(lengths.values()))))
+    order = np.empty(len(keys), dtype=np.int64)
+    for i, key in enumerate(keys):
+        order[i] = starts[key]
+        starts[key] += 1
+    return order
+
+
+def _test_param_path(path, cls, score_fn, x_train, y_train, x_valid,
+                     y_valid):
+    params, Cs = path
+    classifiers = cls(**params).fit_path(x_train, y_train, Cs)
+    return [(clf, score_fn(y_valid, clf.predict(x_valid)))
+            for clf in classifiers]
+
+
 def optimise_params(param_grid: Iterable[Dict[str, Sequence]],
                     cls: Callable,
                     score_fn: ScoreFunction,
@@ -383,9 +938,27 @@ def optimise_params(param_grid: Iterable[Dict[str, Sequence]],
                     y_train: np.ndarray,
                     x_valid: np.ndarray,
                     y_valid: np.ndarray,
-                    max_workers=len(os.sched_getaffinity(0))) -> BaseEstimator:
+                    max_workers=len(os.sched_getaffinity(0)),
+                    search: str = 'grid',
+                    search_args: Dict[str, Any] = {},
+                    backend: str = 'thread',
+                    blas_threads: Optional[int] = None) -> BaseEstimator:
     """Performs cross-validation for SKLearnClassifier's using the given
-    parameter grid and validation data.
+    parameter grid and validation data. For PrecomputedSVC, the values
+    of C for each other parameter combination are fit as a path with
+    PrecomputedSVC.fit_path().
+
+    Candidates are fit in parallel by max_workers threads, or processes
+    if backend is 'process', in which case the data are shared with the
+    workers through memory-mapped files and each worker uses
+    blas_threads BLAS threads. See parallel_map(). cls must then be
+    picklable, e.g. a class or a functools.partial of one.
+
+    If search is 'halving', candidates are instead selected by
+    successive_halving(), with additional arguments from search_args,
+    and the returned classifier has a search_history_ attribute
+    recording the score of each candidate at each rung and which were
+    pruned.
 
     Returns:
     --------
@@ -393,29 +966,276 @@ def optimise_params(param_grid: Iterable[Dict[str, Sequence]],
         The best trained classifier for the given parameter
         combinations.
     """
-    with ThreadPoolExecutor(max_workers=max_workers) as pool:
-        max_score = -1
-        fn = partial(_test_one_param, cls=cls, score_fn=score_fn,
-                     x_train=x_train, y_train=y_train, x_valid=x_valid,
-                     y_valid=y_valid)
-        for clf, score in pool.map(fn, param_grid):
-            if score > max_score:
-                max_score = score
-                classifier = clf
+    param_grid = list(param_grid)
+    if len(param_grid) > 0:
+        _precompute_kernels(cls(**param_grid[0]), param_grid)
+    if search == 'halving':
+        classifier, history = successive_halving(
+            param_grid, cls, score_fn, x_train, y_train, x_valid, y_valid,
+            max_workers=max_workers, backend=backend,
+            blas_threads=blas_threads, **search_args
+        )
+        classifier.search_history_ = history
+        return classifier
+    elif search != 'grid':
+        raise ValueError("Unknown search '{}'.".format(search))
+
+    kwargs = dict(cls=cls, score_fn=score_fn, x_train=x_train,
+                  y_train=y_train, x_valid=x_valid, y_valid=y_valid)
+    if len(param_grid) > 0 and isinstance(cls(**param_grid[0]),
+                                          PrecomputedSVC):
+        results = chain.from_iterable(parallel_map(
+            partial(_test_param_path, **kwargs), _c_paths(param_grid),
+            max_workers, backend=backend, blas_threads=blas_threads
+        ))
+    else:
+        results = parallel_map(
+            partial(_test_one_param, **kwargs), param_grid, max_workers,
+            backend=backend, blas_threads=blas_threads
+        )
+    max_score = -1
+    for clf, score in results:
+        if score > max_score:
+            max_score = score
+            classifier = clf
     return classifier
 
 
-def _record_metrics(df, fold, y_true, y_pred, n_classes):
-    df.loc[fold, ('war', slice(None))] = recall_score(y_true, y_pred,
-                                                      average='micro')
-    df.loc[fold, ('uar', slice(None))] = recall_score(y_true, y_pred,
-                                                      average='macro')
-    df.loc[fold, ('uap', slice(None))] = precision_score(y_true, y_pred,
-                                                         average='macro')
-    df.loc[fold, ('rec', slice(None))] = recall_score(
-        y_true, y_pred, average=None, labels=list(range(n_classes)))
-    df.loc[fold, ('prec', slice(None))] = precision_score(
-        y_true, y_pred, average=None, labels=list(range(n_classes)))
+def _stratified_order(y: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Returns a random permutation of the instances such that every
+    prefix has approximately the class proportions of y.
+    """
+    perm = rng.permutation(len(y))
+    classes, y_idx, counts = np.unique(y[perm], return_inverse=True,
+                                       return_counts=True)
+    # Rank of each instance within its class
+    by_class = np.argsort(y_idx, kind='stable')
+    rank = np.empty(len(y), dtype=np.int64)
+    rank[by_class] = np.arange(len(y)) - np.repeat(np.cumsum(counts)
+                                                   - counts, counts)
+    return perm[np.argsort((rank + 0.5) / counts[y_idx], kind='stable')]
+
+
+def successive_halving(param_grid: Iterable[Dict[str, Any]],
+                       cls: Callable,
+                       score_fn: ScoreFunction,
+                       x_train: np.ndarray,
+                       y_train: np.ndarray,
+                       x_valid: np.ndarray,
+                       y_valid: np.ndarray,
+                       factor: int = 3,
+                       min_samples: Optional[int] = None,
+                       max_fits: Optional[int] = None,
+                       max_time: Optional[float] = None,
+                       random_state: Optional[int] = None,
+                       max_workers=len(os.sched_getaffinity(0)),
+                       backend: str = 'thread',
+                       blas_threads: Optional[int] = None) \
+        -> Tuple[BaseEstimator, pd.DataFrame]:
+    """Selects parameters by successive halving. All candidates are
+    trained on a small stratified subsample of the training data and
+    scored on the validation data; the best 1/factor of them are kept
+    and trained on factor times as many instances, and so on until the
+    final rung, in which the remaining candidates are trained on all the
+    training data.
+
+    Parameters:
+    -----------
+    param_grid: iterable of dict
+        The candidate parameters, e.g. a ParameterGrid.
+    cls: callable
+        Creates a classifier from the parameters.
+    score_fn: callable
+        Score function taking (y_true, y_pred). Higher is better.
+    x_train, y_train, x_valid, y_valid: ndarray
+        Training and validation data.
+    factor: int
+        The fraction of candidates kept, and the growth in training
+        size, at each rung.
+    min_samples: int, optional
+        The number of training instances in the first rung. By default
+        this is chosen so the last rung uses all training instances.
+    max_fits: int, optional
+        Budget on the total number of fits. If the next rung would
+        exceed it, all but the best candidate are pruned and that is
+        fit on all the training data.
+    max_time: float, optional
+        Budget in seconds, applied in the same way before each rung.
+    random_state: int, optional
+        Seed for the subsample order.
+    max_workers, backend, blas_threads:
+        Parallelism of each rung. See optimise_params().
+
+    Returns:
+    --------
+    classifier
+        The best candidate, trained on all the training data.
+    history: pandas.DataFrame
+        One row per candidate per rung, with columns 'rung',
+        'n_samples', 'params', 'score' and 'pruned', where pruned is
+        True if the candidate was dropped after that rung.
+    """
+    start = time.perf_counter()
+    candidates = list(param_grid)
+    n_train = len(y_train)
+    # ceil(log_factor(n_candidates)) + 1, in exact integer arithmetic
+    n_rungs = 1
+    while factor**(n_rungs - 1) < len(candidates):
+        n_rungs += 1
+    if min_samples is None:
+        min_samples = n_train // factor**(n_rungs - 1)
+    min_samples = max(min_samples, len(np.unique(y_train)))
+    order = _stratified_order(y_train,
+                              np.random.default_rng(random_state))
+
+    history = []
+    n_fits = 0
+    for rung in range(n_rungs):
+        final = rung == n_rungs - 1 or len(candidates) == 1
+        over_budget = (
+            (max_fits is not None
+             and n_fits + len(candidates) + 1 > max_fits)
+            or (max_time is not None
+                and time.perf_counter() - start > max_time)
+        )
+        if over_budget and not final and len(history) > 0:
+            # Keep only the best of the last completed rung
+            best = candidates[0]
+            for row in history:
+                if row['rung'] == rung - 1:
+                    row['pruned'] = row['params'] is not best
+            candidates = [best]
+            final = True
+
+        n_samples = (n_train if final
+                     else min(n_train, min_samples * factor**rung))
+        idx = np.sort(order[:n_samples])
+        fn = partial(_test_one_param, cls=cls, score_fn=score_fn,
+                     x_train=x_train[idx], y_train=y_train[idx],
+                     x_valid=x_valid, y_valid=y_valid)
+        results = parallel_map(fn, candidates, max_workers, backend=backend,
+                               blas_threads=blas_threads)
+        n_fits += len(candidates)
+
+        scores = np.array([score for _, score in results])
+        ranking = np.argsort(-scores, kind='stable')
+        n_keep = 1 if final else int(np.ceil(len(candidates) / factor))
+        keep = set(ranking[:n_keep].tolist())
+        for i, params in enumerate(candidates):
+            history.append({'rung': rung, 'n_samples': n_samples,
+                            'params': params, 'score': scores[i],
+                            'pruned': i not in keep})
+        classifier = results[ranking[0]][0]
+        candidates = [candidates[i] for i in ranking[:n_keep]]
+        if final:
+            break
+
+    history = pd.DataFrame(history)
+    history['params'] = history['params'].map(str)
+    return classifier, history
+
+
+class SVMPathSearchCV(BaseEstimator):
+    """Exhaustive cross-validated search over a parameter grid for
+    PrecomputedSVC, which fits the values of C for each other parameter
+    combination and fold as a path with PrecomputedSVC.fit_path(). This
+    can replace GridSearchCV for PrecomputedSVC, and has the same
+    best_params_, best_score_, best_estimator_ and (a subset of)
+    cv_results_ attributes.
+
+    Parameters:
+    -----------
+    estimator: PrecomputedSVC
+        The base classifier.
+    param_grid: dict or list of dict
+        The parameter grid, as for GridSearchCV.
+    cv: int or cross-validator, optional
+        Cross-validation splitter, as for GridSearchCV.
+    scoring: str or callable, optional
+        Scorer used to select parameters, as for GridSearchCV.
+    n_jobs: int, optional
+        Number of threads to fit paths in parallel. -1 uses all
+        available CPUs.
+    refit: bool, default = True
+        Whether to refit the best estimator on all the data.
+    """
+    def __init__(self, estimator: PrecomputedSVC,
+                 param_grid: Union[Dict[str, Sequence],
+                                   List[Dict[str, Sequence]]],
+                 cv=None, scoring=None, n_jobs: Optional[int] = None,
+                 refit: bool = True):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.cv = cv
+        self.scoring = scoring
+        self.n_jobs = n_jobs
+        self.refit = refit
+
+    def fit(self, X, y, groups=None, sample_weight=None):
+        y = np.asarray(y)
+        if sample_weight is not None:
+            sample_weight = np.asarray(sample_weight)
+        cv = check_cv(self.cv, y, classifier=True)
+        scorer = check_scoring(self.estimator, self.scoring)
+        grid = list(ParameterGrid(self.param_grid))
+        _precompute_kernels(self.estimator, grid)
+        paths = _c_paths(grid)
+        splits = list(cv.split(X, y, groups))
+
+        def fit_path(task):
+            (params, Cs), (train, test) = task
+            clf = clone(self.estimator).set_params(**params)
+            if sample_weight is None:
+                models = clf.fit_path(X[train], y[train], Cs)
+                return [scorer(m, X[test], y[test]) for m in models]
+            # Test scores are weighted, as in GridSearchCV
+            models = clf.fit_path(X[train], y[train], Cs,
+                                  sample_weight=sample_weight[train])
+            return [scorer(m, X[test], y[test],
+                           sample_weight=sample_weight[test])
+                    for m in models]
+
+        n_jobs = self.n_jobs or 1
+        if n_jobs < 0:
+            n_jobs = len(os.sched_getaffinity(0))
+        tasks = [(path, split) for path in paths for split in splits]
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(fit_path, tasks))
+
+        candidates = [dict(params, C=C) for params, Cs in paths for C in Cs]
+        # scores[path, split, C] -> scores[candidate, split]
+        scores = np.concatenate([
+            np.array(results[i * len(splits):(i + 1) * len(splits)]).T
+            for i in range(len(paths))
+        ])
+        # Put candidates in ParameterGrid order, as for GridSearchCV
+        order = _path_order(grid)
+        candidates = [candidates[i] for i in order]
+        scores = scores[order]
+        mean = scores.mean(1)
+        self.cv_results_ = {
+            'params': candidates,
+            'mean_test_score': mean,
+            'std_test_score': scores.std(1),
+            # Tied candidates share the best rank
+            'rank_test_score': rankdata(-mean, method='min').astype(int),
+        }
+        for i in range(len(splits)):
+            self.cv_results_['split{}_test_score'.format(i)] = scores[:, i]
+        self.best_index_ = int(np.argmax(mean))
+        self.best_params_ = candidates[self.best_index_]
+        self.best_score_ = mean[self.best_index_]
+        if self.refit:
+            self.best_estimator_ = clone(self.estimator).set_params(
+                **self.best_params_).fit(X, y, sample_weight=sample_weight)
+        return self
+
+    def predict(self, X) -> np.ndarray:
+        return self.best_estimator_.predict(X)
+
+    def score(self, X, y) -> float:
+        return check_scoring(self.estimator, self.scoring)(
+            self.best_estimator_, X, y)
 
 
 def print_results(df: pd.DataFrame):
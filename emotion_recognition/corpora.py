@@ -1,7 +1,10 @@
 """List of speech corpora metadata."""
 
 import re
-from typing import Callable, Dict, List, Optional, Set
+from typing import Callable, Dict, List, Optional, Sequence, Set, Union
+
+import numpy as np
+import pandas as pd
 
 
 class CorpusInfo:
@@ -11,9 +14,15 @@ class CorpusInfo:
     -----------
     name: str
         The corpus name.
-    get_speaker: callable
+    get_speaker: callable, optional
         A function that takes a clip name as argument and returns the
-        corresponding speaker.
+        corresponding speaker. Only needed if the speaker can't be
+        given by speaker_slice or speaker_pattern.
+    speaker_slice: slice, optional
+        The slice of a clip name that gives the speaker.
+    speaker_pattern: str, optional
+        A regular expression with one group, which gives the speaker
+        when searched for in a clip name.
     male_speakers: list of str
         List of male speakers.
     female_speakers: list of str
@@ -25,7 +34,9 @@ class CorpusInfo:
     """
     def __init__(self,
                  name: str,
-                 get_speaker: Callable[[str], str],
+                 get_speaker: Optional[Callable[[str], str]] = None,
+                 speaker_slice: Optional[slice] = None,
+                 speaker_pattern: Optional[str] = None,
                  male_speakers: List[str] = [],
                  female_speakers: List[str] = [],
                  speakers: List[str] = [],
@@ -50,10 +61,67 @@ class CorpusInfo:
             self.speaker_groups = speaker_groups
         else:
             self.speaker_groups = [{x} for x in self.speakers]
-        self.get_speaker = get_speaker
+
+        if sum(x is not None for x in [get_speaker, speaker_slice,
+                                       speaker_pattern]) != 1:
+            raise ValueError("Exactly one of get_speaker, speaker_slice and "
+                             "speaker_pattern must be given.")
+        self._get_speaker = get_speaker
+        self._speaker_slice = speaker_slice
+        self._speaker_regex = None
+        if speaker_pattern is not None:
+            self._speaker_regex = re.compile(speaker_pattern)
+
+        # Lookup tables from speaker to index. The first occurrence is
+        # used if a speaker is listed twice.
+        self.speaker_index: Dict[str, int] = {}
+        for i, sp in enumerate(self.speakers):
+            self.speaker_index.setdefault(sp, i)
+        male = set(self.male_speakers)
+        female = set(self.female_speakers)
+        self.speaker_is_male = np.array([x in male for x in self.speakers])
+        self.speaker_is_female = np.array(
+            [x in female for x in self.speakers])
+        group_index = {sp: i for i, g in enumerate(self.speaker_groups)
+                       for sp in g}
+        self.speaker_group_index = np.array(
+            [group_index.get(x, -1) for x in self.speakers], dtype=int)
 
     def get_speaker(self, name: str) -> str:
-        raise NotImplementedError()
+        """Returns the speaker of the given clip name."""
+        if self._speaker_slice is not None:
+            return name[self._speaker_slice]
+        if self._speaker_regex is not None:
+            return self._speaker_regex.search(name).group(1)
+        return self._get_speaker(name)
+
+    def get_speakers(self, names: Union[Sequence[str], np.ndarray]) \
+            -> np.ndarray:
+        """Returns an array of the speaker of each of the given clip
+        names. This is vectorised if the speaker is given by a slice or
+        pattern.
+        """
+        names = pd.Series(names, dtype=object)
+        if self._speaker_slice is not None:
+            speakers = names.str.slice(self._speaker_slice.start,
+                                       self._speaker_slice.stop)
+        elif self._speaker_regex is not None:
+            speakers = names.str.extract(self._speaker_regex, expand=False)
+        else:
+            speakers = names.map(self._get_speaker)
+        return speakers.to_numpy(dtype=object)
+
+    def get_speaker_indices(self, names: Union[Sequence[str], np.ndarray]) \
+            -> np.ndarray:
+        """Returns the index into speakers of the speaker of each of the
+        given clip names.
+        """
+        indices = pd.Series(self.get_speakers(names)).map(self.speaker_index)
+        if indices.isna().any():
+            unknown = set(pd.Series(names)[indices.isna().to_numpy()])
+            raise ValueError("Unknown speaker for clips {}.".format(
+                ', '.join(sorted(map(str, unknown))[:10])))
+        return indices.to_numpy(dtype=int)
 
     def get_speaker_group(self, name: str) -> int:
         for idx, g in enumerate(self.speaker_groups):
@@ -104,7 +172,7 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
         male_speakers=['01', '03', '05', '07', '09', '11'],
         female_speakers=['02', '04', '06', '08', '10', '12'],
         get_emotion=lambda n: n[3],
-        get_speaker=lambda n: n[:2]
+        speaker_slice=slice(None, 2)
     ),
     'crema-d': EmotionalCorpusInfo(
         'CREMA-D',
@@ -131,7 +199,7 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
             '1044', '1037', '1081'
         ],
         get_emotion=lambda n: n[9],
-        get_speaker=lambda n: n[:4]
+        speaker_slice=slice(None, 4)
     ),
     'demos': EmotionalCorpusInfo(
         'DEMoS',
@@ -155,7 +223,7 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
             '45', '46', '47', '49', '54', '55', '56', '57', '60', '61'
         ],
         get_emotion=lambda n: n[-6:-3],
-        get_speaker=lambda n: n[-9:-7]
+        speaker_slice=slice(-9, -7)
     ),
     'emodb': EmotionalCorpusInfo(
         'EMO-DB',
@@ -171,7 +239,7 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
         male_speakers=['03', '10', '11', '12', '15'],
         female_speakers=['08', '09', '13', '14', '16'],
         get_emotion=lambda n: n[5],
-        get_speaker=lambda n: n[:2]
+        speaker_slice=slice(None, 2)
     ),
     'emofilm': EmotionalCorpusInfo(
         'EmoFilm',
@@ -184,7 +252,7 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
         },
         speakers=['en', 'es', 'it'],
         get_emotion=lambda n: n[2:5],
-        get_speaker=lambda n: n[-2:]
+        speaker_slice=slice(-2, None)
     ),
     'enterface': EmotionalCorpusInfo(
         'eNTERFACE',
@@ -198,7 +266,7 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
         },
         speakers=['s' + str(i) for i in range(1, 45) if i != 6],
         get_emotion=lambda n: n[-4:-2],
-        get_speaker=lambda n: n[:n.find('_')]
+        speaker_pattern=r'^([^_]*)_'
     ),
     'iemocap': EmotionalCorpusInfo(
         'IEMOCAP',
@@ -213,7 +281,7 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
         speaker_groups=[{'01M', '01F'}, {'02M', '02F'}, {'03M', '03F'},
                         {'04M', '04F'}, {'05M', '05F'}],
         get_emotion=lambda n: n[-3:],
-        get_speaker=lambda n: n[3:6]
+        speaker_slice=slice(3, 6)
     ),
     'jl': EmotionalCorpusInfo(
         'JL-corpus',
@@ -227,7 +295,7 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
         male_speakers=['male1', 'male2'],
         female_speakers=['female1', 'female2'],
         get_emotion=lambda n: re.match(r'^\w+\d_([a-z]+)_.*$', n).group(1),
-        get_speaker=lambda n: n[:n.find('_')]
+        speaker_pattern=r'^([^_]*)_'
     ),
     'msp-improv': EmotionalCorpusInfo(
         'MSP-IMPROV',
@@ -242,7 +310,7 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
         speaker_groups=[{'M01', 'F01'}, {'M02', 'F02'}, {'M03', 'F03'},
                         {'M04', 'F04'}, {'M05', 'F05'}, {'M06', 'F06'}],
         get_emotion=lambda n: n[-1],
-        get_speaker=lambda n: n[5:8]
+        speaker_slice=slice(5, 8)
     ),
     'portuguese': EmotionalCorpusInfo(
         'Portuguese',
@@ -258,7 +326,7 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
         speakers=['A', 'B'],
         get_emotion=lambda n: re.match(
             r'^\d+[sp][AB]_([a-z]+)\d+$', n).group(1),
-        get_speaker=lambda n: n[n.find('_') - 1]
+        speaker_pattern=r'^[^_]*([^_])_'
     ),
     'ravdess': EmotionalCorpusInfo(
         'RAVDESS',
@@ -275,7 +343,7 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
         male_speakers=['{:02d}'.format(i) for i in range(1, 25, 2)],
         female_speakers=['{:02d}'.format(i) for i in range(2, 25, 2)],
         get_emotion=lambda n: n[6:8],
-        get_speaker=lambda n: n[-2:]
+        speaker_slice=slice(-2, None)
     ),
     'savee': EmotionalCorpusInfo(
         'SAVEE',
@@ -290,13 +358,13 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
         },
         speakers=['DC', 'JE', 'JK', 'KL'],
         get_emotion=lambda n: n[3] if n[4].isdigit() else n[3:5],
-        get_speaker=lambda n: n[:2]
+        speaker_slice=slice(None, 2)
     ),
     'semaine': EmotionalCorpusInfo(
         'SEMAINE',
         emotion_map={},
         speakers=['{:02d}'.format(i) for i in range(1, 25) if i not in [7, 8]],
-        get_speaker=lambda n: n[:2]
+        speaker_slice=slice(None, 2)
     ),
     'shemo': EmotionalCorpusInfo(
         'ShEMO',
@@ -310,7 +378,7 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
         male_speakers=['M{:02d}'.format(i) for i in range(1, 57)],
         female_speakers=['F{:02d}'.format(i) for i in range(1, 32)],
         get_emotion=lambda n: n[3],
-        get_speaker=lambda n: n[:3]
+        speaker_slice=slice(None, 3)
     ),
     'smartkom': EmotionalCorpusInfo(
         'SmartKom',
@@ -335,7 +403,7 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
             'AJT', 'AJU', 'AJV', 'AJW', 'AJX', 'AJY', 'AJZ', 'AKA', 'AKB',
             'AKC', 'AKD', 'AKE', 'AKF', 'AKG'
         ],
-        get_speaker=lambda n: n[8:11]
+        speaker_slice=slice(8, 11)
     ),
     'tess': EmotionalCorpusInfo(
         'TESS',
@@ -350,7 +418,7 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
         },
         speakers=['OAF', 'YAF'],
         get_emotion=lambda n: n[n.rfind('_') + 1:],
-        get_speaker=lambda n: n[:3]
+        speaker_slice=slice(None, 3)
     ),
     'venec': EmotionalCorpusInfo(
         'VENEC',
@@ -391,13 +459,13 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
             'USA_14', 'USA_15', 'USA_16', 'USA_17', 'USA_18', 'USA_19',
             'USA_21', 'USA_22'
         ],
-        get_speaker=lambda n: n[5:]
+        speaker_slice=slice(5, None)
     ),
 
     # Non-emotional speech datasets
     'accentdb': CorpusInfo(
         'accentDB',
-        get_speaker=lambda n: n[:n.rfind('_')],
+        speaker_pattern=r'^(.*)_',
         speakers=[
             'australian_s01', 'australian_s01', 'bangla_s01', 'bangla_s02',
             'indian_s01', 'indian_s02', 'malayalam_s01', 'malayalam_s02',
@@ -407,12 +475,12 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
     ),
     'esf': CorpusInfo(
         'ESF',
-        get_speaker=lambda n: n[-2:],
+        speaker_slice=slice(-2, None),
         speakers=['JA', 'MA', 'RA', 'AN', 'LA', 'SA', 'VI'],
     ),
     'leap': CorpusInfo(
         'Leap',
-        get_speaker=lambda n: n[:2],
+        speaker_slice=slice(None, 2),
         speakers=[
             'ab', 'ai', 'aj', 'aw', 'ax', 'ay', 'az', 'ba', 'bb', 'bc', 'bd',
             'be', 'bf', 'bg', 'bh', 'bi', 'bj', 'bk', 'bl', 'bm', 'bn', 'bo',
@@ -423,7 +491,7 @@ corpora: Dict[str, EmotionalCorpusInfo] = {
     ),
     'parole': CorpusInfo(
         'PAROLE',
-        get_speaker=lambda n: n[7:10],
+        speaker_slice=slice(7, 10),
         speakers=[
             '001', '002', '003', '004', '005', '006', '007', '008', '009',
             '010', '011', '012', '013', '014', '015', '016', '017', '019',
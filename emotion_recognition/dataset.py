@@ -1,23 +1,34 @@
 import abc
+import hashlib
 import json
+import os
+import shutil
 import warnings
-from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from os import PathLike
 from pathlib import Path
-from typing import (Collection, Dict, List, Mapping, Optional, Sequence, Set,
-                    Tuple, Union)
+from typing import (Any, Callable, Collection, Dict, List, Mapping, Optional,
+                    Sequence, Set, Tuple, Union)
 
-import arff
 import netCDF4
 import numpy as np
 import pandas as pd
 import soundfile
+from scipy.signal import resample_poly
 from sklearn.base import TransformerMixin
-from sklearn.preprocessing import StandardScaler, label_binarize
+from sklearn.preprocessing import StandardScaler
+from tqdm import tqdm
 
-from .binary_arff import decode as decode_arff
+from .binary_arff import load as load_binary_arff
+from .binary_arff import numeric_columns, string_column
 from .corpora import corpora
-from .utils import clip_arrays, frame_arrays, pad_arrays, transpose_time
+from .kernels import KernelCache
+from .normalisation import FoldNormaliser, GroupStatistics
+from .text_arff import load as load_text_arff
+from .text_arff import read_header as read_text_arff_header
+from .utils import (RaggedArray, clip_arrays, frame_arrays, pad_arrays,
+                    transpose_time)
 
 
 def parse_regression_annotations(filename: Union[PathLike, str]) \
@@ -58,6 +69,240 @@ def get_audio_paths(file: Union[PathLike, str]) -> Sequence[Path]:
     return paths
 
 
+def read_audio_files(filepaths: Sequence[Union[PathLike, str]],
+                     sample_rate: Optional[int] = None,
+                     mono: bool = False,
+                     workers: int = 1,
+                     progress: bool = False) -> RaggedArray:
+    """Decodes the given audio files into the contiguous buffer of a
+    RaggedArray. The length of each clip is first read from the file
+    header so that the buffer can be allocated once, then each file is
+    decoded directly into its slice of the buffer.
+
+    Args:
+    -----
+    filepaths: sequence of pathlike or str
+        Paths to the audio files.
+    sample_rate: int, optional
+        If given, audio with a different sample rate is resampled to
+        this rate. Otherwise audio is left at its original rate.
+    mono: bool, default = False
+        Whether to average all channels into one channel.
+    workers: int, default = 1
+        Number of threads used to decode files in parallel. libsndfile
+        and resampling both release the GIL so threads scale well.
+    progress: bool, default = False
+        Whether to show a progress bar.
+
+    Returns:
+    --------
+    audio: RaggedArray
+        Audio of shape (n_files, length[i], n_channels), as float32.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        infos = list(pool.map(soundfile.info, filepaths))
+
+    channels = {1 if mono else x.channels for x in infos}
+    if len(channels) > 1:
+        raise ValueError("Audio files have differing numbers of channels.")
+    lengths = np.array([x.frames for x in infos], dtype=np.int64)
+    rates = np.array([x.samplerate for x in infos], dtype=np.int64)
+    if sample_rate is not None:
+        # Output length of resample_poly() is ceil(n * up / down)
+        lengths = -(-lengths * sample_rate // rates)
+
+    audio = RaggedArray.from_lengths(
+        np.empty((lengths.sum(), channels.pop()), dtype=np.float32), lengths)
+
+    def _decode(i: int):
+        out = audio[i]
+        if (sample_rate is None or rates[i] == sample_rate) and not mono:
+            soundfile.read(filepaths[i], out=out)
+            return
+        x, _ = soundfile.read(filepaths[i], always_2d=True, dtype='float32')
+        if mono:
+            x = np.mean(x, axis=1, keepdims=True)
+        if sample_rate is not None and rates[i] != sample_rate:
+            g = np.gcd(sample_rate, rates[i])
+            x = resample_poly(x, sample_rate // g, rates[i] // g, axis=0)
+        out[:] = x
+
+    with ThreadPoolExecutor(max_workers=workers) as pool, tqdm(
+            total=len(filepaths), desc='Decoding audio', unit='file',
+            disable=not progress) as pbar:
+        for _ in pool.map(_decode, range(len(filepaths))):
+            pbar.update()
+    return audio
+
+
+class NetCDFWriter:
+    """Writes a netCDF4 dataset in our format incrementally. The
+    instance and concat dimensions are unlimited, so batches of
+    instances can be appended as they are produced without holding the
+    whole dataset in memory. Can be used as a context manager, in which
+    case the file is closed on exit.
+
+    Args:
+    -----
+    path: pathlike or str
+        The path to write the dataset.
+    n_features: int
+        The dimensionality of each feature vector.
+    corpus: str
+        The corpus name.
+    annotation_path: pathlike or str, optional
+        The path to an annotation file. If given, annotations are looked
+        up by instance name when appending.
+    annotation_type: str
+        The type of annotations, one of {regression, classification}.
+    chunk_frames: int, optional
+        The chunk length along the concat dimension. Ideally a multiple
+        of the typical sequence length, so that reading one instance
+        touches as few chunks as possible. By default each chunk is
+        about 1 MiB.
+    chunk_instances: int
+        The chunk length of per-instance variables.
+    zlib: bool, default = False
+        Whether to compress the features with zlib.
+    complevel: int
+        The zlib compression level, from 1 to 9.
+    shuffle: bool, default = True
+        Whether to apply the HDF5 shuffle filter before compression,
+        which usually improves the compression ratio of float data.
+    """
+    def __init__(self, path: Union[PathLike, str],
+                 n_features: int,
+                 corpus: str = '',
+                 annotation_path: Optional[Union[PathLike, str]] = None,
+                 annotation_type: str = 'classification',
+                 chunk_frames: Optional[int] = None,
+                 chunk_instances: int = 1024,
+                 zlib: bool = False,
+                 complevel: int = 4,
+                 shuffle: bool = True):
+        if annotation_type not in ['classification', 'regression']:
+            raise ValueError("annotation_type must be one of "
+                             "{classification, regression}.")
+        self._annotation_type = annotation_type
+        self._annotations: Optional[Mapping[str, Any]] = None
+        self._annotation_vars: Optional[List[str]] = None
+        if annotation_path is not None:
+            if annotation_type == 'regression':
+                self._annotations = parse_regression_annotations(
+                    annotation_path)
+            else:
+                self._annotations = parse_classification_annotations(
+                    annotation_path)
+
+        if chunk_frames is None:
+            chunk_frames = max(1, 2**20 // (4 * n_features))
+        self._chunk_instances = chunk_instances
+        self._n_instances = 0
+        self._n_frames = 0
+
+        self._dataset = netCDF4.Dataset(path, 'w')
+        self._dataset.createDimension('instance', None)
+        self._dataset.createDimension('concat', None)
+        self._dataset.createDimension('features', n_features)
+
+        self._slices = self._dataset.createVariable(
+            'slices', np.int64, ('instance',), chunksizes=(chunk_instances,))
+        # Variable-length strings can't be compressed
+        self._filename = self._dataset.createVariable(
+            'filename', str, ('instance',), chunksizes=(chunk_instances,))
+        self._features = self._dataset.createVariable(
+            'features', np.float32, ('concat', 'features'),
+            chunksizes=(chunk_frames, n_features), zlib=zlib,
+            complevel=complevel, shuffle=shuffle
+        )
+        self._dataset.setncattr_string('feature_dims',
+                                       json.dumps(['concat', 'features']))
+        self._dataset.setncattr_string('corpus', corpus)
+
+    def _create_annotation_vars(self, keys: List[str]):
+        if self._annotation_type == 'regression':
+            dtype = np.float32
+        else:
+            dtype = str
+        for k in keys:
+            self._dataset.createVariable(
+                k, dtype, ('instance',), chunksizes=(self._chunk_instances,))
+        self._dataset.setncattr_string('annotation_vars', json.dumps(keys))
+        self._annotation_vars = keys
+
+    def append(self, names: Sequence[str], features: np.ndarray,
+               slices: Optional[Sequence[int]] = None,
+               annotations: Optional[Union[Sequence[str],
+                                           Mapping[str, Sequence[float]]]]
+               = None):
+        """Appends a batch of instances to the dataset.
+
+        Args:
+        -----
+        names: list of str
+            The instance names.
+        features: ndarray
+            Either a matrix of shape (length, n_features), or an array
+            of shape (n_instances, seq_len, n_features) of fixed-length
+            sequences.
+        slices: list of int, optional
+            The number of rows of features for each instance, if
+            features is 2-D. Default is one row per instance.
+        annotations: list of str or dict, optional
+            Annotations for these instances: the label for each instance
+            for classification, or a mapping of annotation name to
+            values for regression. If not given, annotations are taken
+            from the annotation file, or 'unknown' if there is none.
+        """
+        features = np.asarray(features, dtype=np.float32)
+        if features.ndim == 3:
+            slices = np.full(len(features), features.shape[1])
+            features = features.reshape(-1, features.shape[2])
+        elif slices is None:
+            slices = np.ones(len(features), dtype=np.int64)
+        slices = np.asarray(slices, dtype=np.int64)
+        if len(slices) != len(names) or slices.sum() != len(features):
+            raise ValueError("slices doesn't match names and features.")
+
+        if annotations is None:
+            if self._annotations is None:
+                annotations = np.full(len(names), 'unknown', dtype=object)
+            elif self._annotation_type == 'regression':
+                keys = next(iter(self._annotations.values())).keys()
+                annotations = {k: [self._annotations[x][k] for x in names]
+                               for k in keys}
+            else:
+                annotations = [self._annotations[x] for x in names]
+        if self._annotation_type == 'classification':
+            annotations = {'label_nominal': annotations}
+        if self._annotation_vars is None:
+            self._create_annotation_vars(list(annotations.keys()))
+
+        start, end = self._n_instances, self._n_instances + len(names)
+        for k in self._annotation_vars:
+            arr = np.asarray(annotations[k])
+            if self._annotation_type == 'classification':
+                arr = arr.astype(object)
+            self._dataset.variables[k][start:end] = arr
+        self._filename[start:end] = np.array(names, dtype=object)
+        self._slices[start:end] = slices
+        self._features[self._n_frames:self._n_frames + len(features)] = \
+            features
+        self._n_instances = end
+        self._n_frames += len(features)
+
+    def close(self):
+        """Closes the underlying file."""
+        if self._dataset.isopen():
+            self._dataset.close()
+
+    def __enter__(self) -> 'NetCDFWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
 def write_netcdf_dataset(path: Union[PathLike, str],
                          names: List[str],
                          features: np.ndarray,
@@ -65,13 +310,17 @@ def write_netcdf_dataset(path: Union[PathLike, str],
                          corpus: str = '',
                          annotations: Optional[np.ndarray] = None,
                          annotation_path: Optional[Union[PathLike, str]] = None,  # noqa
-                         annotation_type: str = 'classification'):
+                         annotation_type: str = 'classification',
+                         chunk_frames: Optional[int] = None,
+                         zlib: bool = False,
+                         complevel: int = 4):
     """Writes a netCDF4 dataset to the given path. The dataset should
     contain features and annotations. Note that the features matrix has
     to be 2-D, and can either be a vector per instance, or a sequence of
     vectors per instance. Also note that this cannot represent the
     spectrograms in the format required by auDeep, since that is a 3-D
-    matrix of one spectrogram per instance.
+    matrix of one spectrogram per instance. To write a dataset that
+    doesn't fit in memory, use NetCDFWriter directly.
 
     Args:
     -----
@@ -93,82 +342,27 @@ def write_netcdf_dataset(path: Union[PathLike, str],
         The path to an annotation file.
     annotation_type: str
         The type of annotations, one of {regression, classification}.
+    chunk_frames: int, optional
+        The chunk length along the concat dimension. See NetCDFWriter.
+    zlib: bool, default = False
+        Whether to compress the features with zlib.
+    complevel: int
+        The zlib compression level, from 1 to 9.
     """
-    dataset = netCDF4.Dataset(path, 'w')
-    dataset.createDimension('instance', len(names))
-    dataset.createDimension('concat', features.shape[0])
-    dataset.createDimension('features', features.shape[1])
-
-    _slices = dataset.createVariable('slices', int, ('instance',))
-    _slices[:] = slices
-
-    filename = dataset.createVariable('filename', str, ('instance',))
-    filename[:] = np.array(names)
-
-    if annotation_path is not None:
-        if annotation_type == 'regression':
-            annotations = parse_regression_annotations(annotation_path)
-            keys = next(iter(annotations.values())).keys()
-            for k in keys:
-                var = dataset.createVariable(k, np.float32, ('instance',))
-                var[:] = np.array([annotations[x][k] for x in names])
-            dataset.setncattr_string(
-                'annotation_vars', json.dumps([k for k in keys]))
-        elif annotation_type == 'classification':
-            annotations = parse_classification_annotations(annotation_path)
-            label_nominal = dataset.createVariable('label_nominal', str,
-                                                   ('instance',))
-            label_nominal[:] = np.array([annotations[x] for x in names])
-            dataset.setncattr_string('annotation_vars',
-                                     json.dumps(['label_nominal']))
-    elif annotations is not None:
-        if annotation_type == 'regression':
-            for k, arr in annotations:
-                var = dataset.createVariable(k, np.float32, ('instance',))
-                var[:] = arr
-            dataset.setncattr_string(
-                'annotation_vars', json.dumps([k for k in annotations]))
-        elif annotation_type == 'classification':
-            label_nominal = dataset.createVariable('label_nominal', str,
-                                                   ('instance',))
-            label_nominal[:] = annotations
-            dataset.setncattr_string('annotation_vars',
-                                     json.dumps(['label_nominal']))
-    else:
-        label_nominal = dataset.createVariable('label_nominal', str,
-                                               ('instance',))
-        label_nominal[:] = np.array(['unknown' for _ in range(len(names))])
-        dataset.setncattr_string('annotation_vars',
-                                 json.dumps(['label_nominal']))
+    with NetCDFWriter(path, features.shape[1], corpus=corpus,
+                      annotation_path=annotation_path,
+                      annotation_type=annotation_type,
+                      chunk_frames=chunk_frames, zlib=zlib,
+                      complevel=complevel) as writer:
+        writer.append(names, features, slices=slices,
+                      annotations=annotations)
 
-    _features = dataset.createVariable('features', np.float32,
-                                       ('concat', 'features'))
-    _features[:, :] = features
 
-    dataset.setncattr_string('feature_dims',
-                             json.dumps(['concat', 'features']))
-    dataset.setncattr_string('corpus', corpus)
-    dataset.close()
-
-
-def _make_flat(a: np.ndarray) -> Tuple[np.ndarray, List[int]]:
-    """Flattens an array of variable-length sequences."""
-    slices = [x.shape[0] for x in a]
-    flat = np.concatenate(a)
-    return flat, slices
-
-
-def _make_ragged(flat: np.ndarray,
-                 slices: Union[List[int], np.ndarray]) -> np.ndarray:
-    """Returns a list of variable-length sequences."""
-    indices = np.cumsum(slices)
-    arrs = np.split(flat, indices[:-1], axis=0)
-    return arrs
-
-
-def _reshape_data_array(x: np.ndarray, slices: np.ndarray) -> np.ndarray:
+def _reshape_data_array(x: np.ndarray, slices: np.ndarray) \
+        -> Union[np.ndarray, RaggedArray]:
     """Takes a possibly 2D data array and converts it to either a
-    contiguous 2D/3D array or a variable-length 3D array.
+    contiguous 2D/3D array or a variable-length RaggedArray. No data is
+    copied.
     """
     if len(x) == len(slices):
         # 2-D contiguous array
@@ -180,9 +374,39 @@ def _reshape_data_array(x: np.ndarray, slices: np.ndarray) -> np.ndarray:
         return np.reshape(x, (len(slices), seq_len, x[0].shape[-1]))
     else:
         # 3-D variable length array
-        indices = np.cumsum(slices)
-        arrs = np.split(x, indices[:-1], axis=0)
-        return np.array(arrs, dtype=object)
+        return RaggedArray.from_lengths(x, slices)
+
+
+InstanceSelector = Callable[[str, np.ndarray], np.ndarray]
+"""A function taking a corpus name and an array of instance names and
+returning the sorted indices of instances to keep.
+"""
+
+
+def select_instances(corpus: str, names: np.ndarray,
+                     instances: Optional[Union[Sequence[Union[int, str]],
+                                               np.ndarray]] = None,
+                     speakers: Optional[Collection[str]] = None) \
+        -> np.ndarray:
+    """Returns the sorted indices of the given names that are in
+    `instances` (either instance names, indices or a boolean mask) and,
+    if `speakers` is given, whose speaker is in `speakers`.
+    """
+    mask = np.ones(len(names), dtype=bool)
+    if speakers is not None:
+        instance_speakers = corpora[corpus.lower()].get_speakers(names)
+        mask &= pd.Series(instance_speakers).isin(set(speakers)).to_numpy()
+    if instances is not None:
+        instances = np.asarray(instances)
+        if instances.dtype.kind == 'b':
+            mask &= instances
+        elif instances.dtype.kind in 'iu':
+            keep = np.zeros(len(names), dtype=bool)
+            keep[instances] = True
+            mask &= keep
+        else:
+            mask &= np.isin(names, instances)
+    return np.flatnonzero(mask)
 
 
 class DatasetBackend(abc.ABC):
@@ -224,6 +448,45 @@ class DatasetBackend(abc.ABC):
         """Corpus ID."""
         return self._corpus
 
+    def _feature_indices(
+            self, features: Optional[Sequence[Union[int, str]]]) \
+            -> Optional[np.ndarray]:
+        """Converts a sequence of feature names or indices to an array
+        of indices into feature_names.
+        """
+        if features is None:
+            return None
+        lookup = {x: i for i, x in enumerate(self.feature_names)}
+        return np.array([lookup[x] if isinstance(x, str) else x
+                         for x in features], dtype=np.int64)
+
+    def select(self, instances: Optional[InstanceSelector] = None,
+               features: Optional[Sequence[Union[int, str]]] = None):
+        """Subsets the instances and features that have already been
+        loaded by this backend. Backends that can read only a subset of
+        the data from disk should take the same arguments in their
+        constructor instead.
+        """
+        if instances is not None:
+            idx = instances(self.corpus, np.array(self.names, dtype=str))
+            self._names = [self.names[i] for i in idx]
+            if self.labels is not None:
+                self._labels = [self.labels[i] for i in idx]
+            if isinstance(self.features, NetCDFFeatureView):
+                self._features = self.features.select(idx)
+            else:
+                self._features = self.features[idx]
+        cols = self._feature_indices(features)
+        if cols is not None:
+            self._feature_names = [self.feature_names[i] for i in cols]
+            x = self.features
+            if isinstance(x, NetCDFFeatureView):
+                self._features = x.select_features(cols)
+            elif isinstance(x, RaggedArray):
+                self._features = x.with_flat(x.flat[:, cols])
+            else:
+                self._features = x[..., cols]
+
     _features: np.ndarray = np.empty(0)
     _labels: Optional[List[str]] = None
     _names: List[str] = []
@@ -231,11 +494,199 @@ class DatasetBackend(abc.ABC):
     _corpus: str = ''
 
 
+class NetCDFFeatureView:
+    """Read-only view of the features variable in a netCDF4 dataset.
+    Only the instances that are indexed are read from disk, using the
+    slices variable as a table of offsets into the concatenated
+    features matrix. Indexing this view gives the same result as
+    indexing the array returned by `_reshape_data_array()`.
+
+    Args:
+    -----
+    path: pathlike or str
+        The path to the netCDF4 dataset.
+    instances: ndarray, optional
+        Indices of the instances in the file that make up this view.
+        Default is all instances.
+    features: ndarray, optional
+        Indices of the feature columns to read. Default is all features.
+    """
+    def __init__(self, path: Union[PathLike, str],
+                 instances: Optional[np.ndarray] = None,
+                 features: Optional[np.ndarray] = None):
+        self._path = Path(path)
+        self._instances = instances
+        self._features = features
+        self._open()
+
+    def _open(self):
+        self._dataset = netCDF4.Dataset(self._path)
+        self._var = self._dataset.variables['features']
+        self._var.set_auto_mask(False)
+        slices = self._dataset.variables['slices'][:].astype(np.int64)
+        self._offsets = np.concatenate([[0], np.cumsum(slices)])
+
+        if self._features is None:
+            self._cols = slice(None)
+            self._col_order = slice(None)
+            n_features = self._var.shape[1]
+        else:
+            # netCDF4 requires increasing indices for orthogonal indexing
+            cols, self._col_order = np.unique(self._features,
+                                              return_inverse=True)
+            self._cols = cols.tolist()
+            n_features = len(self._features)
+        self._n_features = n_features
+
+        is_vector = self._var.shape[0] == len(slices)
+        if self._instances is None:
+            self._instances = np.arange(len(slices))
+        slices = slices[self._instances]
+        n_instances = len(self._instances)
+        if is_vector:
+            self._seq_len = 0
+            self._shape = (n_instances, n_features)
+        elif len(slices) > 0 and all(slices == slices[0]):
+            self._seq_len = int(slices[0])
+            self._shape = (n_instances, self._seq_len, n_features)
+        else:
+            self._seq_len = -1
+            self._shape = (n_instances,)
+
+    def close(self):
+        """Closes the underlying netCDF4 dataset."""
+        if self._dataset.isopen():
+            self._dataset.close()
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self._shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._var.dtype
+
+    @property
+    def n_features(self) -> int:
+        return self._n_features
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Sequence length of each instance."""
+        return np.diff(self._offsets)[self._instances]
+
+    def _read_rows(self, start: int, end: int) -> np.ndarray:
+        return self._var[start:end, self._cols][:, self._col_order]
+
+    def _read_instance(self, i: int) -> np.ndarray:
+        i = self._instances[i]
+        x = self._read_rows(self._offsets[i], self._offsets[i + 1])
+        return x[0] if self._seq_len == 0 else x
+
+    def _read_instances(self, idx: np.ndarray) \
+            -> Union[np.ndarray, RaggedArray]:
+        # Read each contiguous run of instances as a single hyperslab
+        uniq, inverse = np.unique(self._instances[idx], return_inverse=True)
+        breaks = np.flatnonzero(np.diff(uniq) != 1) + 1
+        starts = uniq[np.r_[0, breaks]]
+        ends = uniq[np.r_[breaks - 1, len(uniq) - 1]] + 1
+        runs = [self._read_rows(self._offsets[s], self._offsets[e])
+                for s, e in zip(starts, ends)]
+        if len(runs) > 0:
+            flat = np.concatenate(runs)
+        else:
+            flat = np.empty((0, self.n_features), dtype=self.dtype)
+
+        if self._seq_len >= 0:
+            x = flat.reshape((len(uniq),) + self.shape[1:])
+        else:
+            x = RaggedArray.from_lengths(flat, np.diff(self._offsets)[uniq])
+        if len(uniq) == len(idx) and np.all(uniq == self._instances[idx]):
+            return x
+        return x[inverse]
+
+    def __getitem__(self, idx) -> Union[np.ndarray, RaggedArray]:
+        if isinstance(idx, tuple):
+            if np.isscalar(idx[0]):
+                return self[idx[0]][idx[1:]]
+            return self[idx[0]][(slice(None),) + idx[1:]]
+        if np.isscalar(idx) and np.issubdtype(type(idx), np.integer):
+            if idx < 0:
+                idx += len(self)
+            if not 0 <= idx < len(self):
+                raise IndexError("Index {} out of bounds.".format(idx))
+            return self._read_instance(idx)
+        if isinstance(idx, slice):
+            idx = np.arange(len(self))[idx]
+        idx = np.asarray(idx)
+        if idx.dtype == bool:
+            idx = np.flatnonzero(idx)
+        idx = np.where(idx < 0, idx + len(self), idx)
+        return self._read_instances(idx)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        x = np.asarray(self[:])
+        return x if dtype is None else x.astype(dtype)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._read_instance(i)
+
+    def select(self, idx) -> 'NetCDFFeatureView':
+        """Returns a view of a subset of the instances of this view,
+        without reading any data.
+        """
+        return NetCDFFeatureView(self._path, instances=self._instances[idx],
+                                 features=self._features)
+
+    def select_features(self, cols) -> 'NetCDFFeatureView':
+        """Returns a view of a subset of the features of this view,
+        without reading any data.
+        """
+        cols = np.arange(self.n_features)[cols]
+        if self._features is not None:
+            cols = self._features[cols]
+        return NetCDFFeatureView(self._path, instances=self._instances,
+                                 features=cols)
+
+    def __getstate__(self):
+        return {'_path': self._path, '_instances': self._instances,
+                '_features': self._features}
+
+    def fingerprint_state(self) -> Tuple:
+        # Identify the file by its stat rather than reading its data
+        stat = self._path.stat()
+        return (str(self._path.resolve()), stat.st_mtime_ns, stat.st_size,
+                self._instances, self._features)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+
 class NetCDFBackend(DatasetBackend):
     """Backend that reads data from a netCDF4 file in our format, which
     is modified from the format used by the auDeep toolkit.
+
+    Args:
+    -----
+    path: pathlike or str
+        The path to the netCDF4 dataset.
+    lazy: bool, default = False
+        If True, the features are not read into memory, but are instead
+        given as a NetCDFFeatureView, which reads only the instances
+        that are indexed.
+    instances: callable, optional
+        Selects the subset of instances to load.
+    features: sequence of int or str, optional
+        The subset of features to load.
     """
-    def __init__(self, path: Union[PathLike, str]):
+    def __init__(self, path: Union[PathLike, str], lazy: bool = False,
+                 instances: Optional[InstanceSelector] = None,
+                 features: Optional[Sequence[Union[int, str]]] = None):
         dataset = netCDF4.Dataset(path)
         if not hasattr(dataset, 'corpus'):
             raise AttributeError(
@@ -247,76 +698,385 @@ class NetCDFBackend(DatasetBackend):
         self._feature_names = ['feature_{}'.format(i + 1) for i in range(
             dataset.dimensions[feature_dim].size)]
 
-        x = np.array(dataset.variables['features'])
-        slices = np.array(dataset.variables['slices'])
-        self._features = _reshape_data_array(x, slices)
         if 'label_nominal' in dataset.variables:
             self._labels = list(dataset.variables['label_nominal'])
 
+        idx = None
+        if instances is not None:
+            idx = instances(self.corpus, np.array(self.names, dtype=str))
+            self._names = [self.names[i] for i in idx]
+            if self.labels is not None:
+                self._labels = [self.labels[i] for i in idx]
+        cols = self._feature_indices(features)
+        if cols is not None:
+            self._feature_names = [self.feature_names[i] for i in cols]
+
+        if lazy or idx is not None or cols is not None:
+            dataset.close()
+            view = NetCDFFeatureView(path, instances=idx, features=cols)
+            # Only the selected hyperslabs are read if not lazy
+            self._features = view if lazy else view[:]
+            return
+        x = np.array(dataset.variables['features'])
+        slices = np.array(dataset.variables['slices'])
+        self._features = _reshape_data_array(x, slices)
         dataset.close()
 
 
 class RawAudioBackend(DatasetBackend):
     """Backend that uses audio clip filepaths from a file and loads the
     audio as raw data.
+
+    Args:
+    -----
+    path: pathlike or str
+        Path to a file containing a list of audio files.
+    workers: int, default = 1
+        Number of threads to decode audio files with.
+    sample_rate: int, optional
+        If given, resample any audio not at this sample rate.
+    progress: bool, default = True
+        Whether to show decoding progress.
+    instances: callable, optional
+        Selects the subset of audio files to decode.
     """
-    def __init__(self, path: Union[PathLike, str]) -> None:
+    def __init__(self, path: Union[PathLike, str], workers: int = 1,
+                 sample_rate: Optional[int] = None,
+                 progress: bool = True,
+                 instances: Optional[InstanceSelector] = None) -> None:
         path = Path(path)
-        self.feature_names.append('pcm')
+        self._feature_names = ['pcm']
 
         filepaths = get_audio_paths(path)
-        self._features = np.empty(len(filepaths), dtype=object)
-        for i, filepath in enumerate(filepaths):
-            self.names.append(filepath.stem)
-            audio, _ = soundfile.read(filepath, always_2d=True,
-                                      dtype='float32')
-            self.features[i] = audio
-
         # We assume the file list is at the root of the dataset directory
         self._corpus = path.parent.stem
         label_file = path.parent / 'labels.csv'
         if label_file.exists():
-            self._labels = []
             annotations = parse_classification_annotations(label_file)
-            self._names = sorted(x for x in self.names if x in annotations)
-            for name in self.names:
-                self.labels.append(annotations[name])
+            filepaths = sorted((x for x in filepaths if x.stem in annotations),
+                               key=lambda x: x.stem)
+        if instances is not None:
+            idx = instances(self.corpus,
+                            np.array([x.stem for x in filepaths], dtype=str))
+            filepaths = [filepaths[i] for i in idx]
+        if label_file.exists():
+            self._labels = [annotations[x.stem] for x in filepaths]
+        self._names = [x.stem for x in filepaths]
+
+        self._features = read_audio_files(
+            filepaths, sample_rate=sample_rate, workers=workers,
+            progress=progress
+        )
+
+
+def _group_runs(names: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the start index and length of each run of identical
+    consecutive names.
+    """
+    if len(names) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]])
+    lengths = np.diff(np.r_[starts, len(names)])
+    return starts, lengths
 
 
 class ARFFBackend(DatasetBackend):
-    """Backend that loads data from an ARFF (text or binary) file."""
-    def __init__(self, path: Union[PathLike, str]) -> None:
+    """Backend that loads data from an ARFF (text or binary) file. The
+    first attribute is the instance name and the last is the class
+    label. Consecutive rows with the same name are treated as a sequence
+    of vectors for one instance.
+
+    Args:
+    -----
+    path: pathlike or str
+        The path to the ARFF file.
+    instances: callable, optional
+        Selects the subset of instances to load. For binary ARFF only
+        the selected rows are read, while for text ARFF instances are
+        selected after parsing.
+    features: sequence of int or str, optional
+        The subset of features to load.
+    """
+    def __init__(self, path: Union[PathLike, str],
+                 instances: Optional[InstanceSelector] = None,
+                 features: Optional[Sequence[Union[int, str]]] = None) \
+            -> None:
         path = Path(path)
         if path.suffix == '.bin':
-            with open(path, 'rb') as fid:
-                data = decode_arff(fid)
+            data = load_binary_arff(path)
+            attributes = data['attributes']
+            self._corpus = data['relation']
+            self._feature_names = [x[0] for x in attributes[1:-1]]
+            cols = self._feature_indices(features)
+            if cols is None:
+                cols = np.arange(len(self.feature_names))
+
+            records = data['data']
+            names = string_column(records, 0)
+            starts, slices = _group_runs(names)
+            names = names[starts]
+            rows = None
+            if instances is not None:
+                idx = instances(self.corpus, names)
+                names = names[idx]
+                starts = starts[idx]
+                slices = slices[idx]
+                rows = (np.repeat(starts - (np.cumsum(slices) - slices),
+                                  slices)
+                        + np.arange(slices.sum()))
+            labels = string_column(records, len(attributes) - 1, rows=starts)
+            x = numeric_columns(records, cols + 1, rows=rows)
+            if features is not None:
+                self._feature_names = [self.feature_names[i] for i in cols]
         else:
-            with open(path) as fid:
-                data = arff.load(fid)
+            relation, attributes = read_text_arff_header(path)
+            self._corpus = relation
+            self._feature_names = [x[0] for x in attributes[1:-1]]
+            cols = self._feature_indices(features)
+            data = load_text_arff(path, features=cols)
+            names = data['names']
+            labels = data['labels']
+            slices = data['slices']
+            x = data['data']
+            if features is not None:
+                self._feature_names = [self.feature_names[i] for i in cols]
+
+        self._names = names.tolist()
+        self._features = _reshape_data_array(x, slices)
+        self._labels = labels.tolist()
+        if path.suffix != '.bin' and instances is not None:
+            self.select(instances=instances)
 
-        self._corpus = data['relation']
-        self._feature_names = [x[0] for x in data['attributes'][1:-1]]
 
-        counts = Counter([x[0] for x in data['data']])
-        self._names = list(counts.keys())
+CACHE_VERSION = 1
 
-        x = np.array([x[1:-1] for x in data['data']])
-        slices = np.array(counts.values())
-        self._features = _reshape_data_array(x, slices)
-        self._labels = list(dict.fromkeys(x[-1] for x in data['data']).keys())
+# Approximate number of feature vectors read at a time when writing a
+# cache from a lazy view
+_CACHE_CHUNK_SIZE = 1 << 16
 
 
-class Dataset(abc.ABC):
+def _source_stat(path: Path) -> Dict[str, List]:
+    """Returns the resolved path, size and modification time of the file
+    at the given path, and of each listed audio file for a file list.
+    """
+    def _stat(p: Path) -> List:
+        st = p.stat()
+        return [str(p), st.st_size, st.st_mtime_ns]
+
+    path = path.resolve()
+    stat = {'source': _stat(path)}
+    if path.suffix == '.txt':
+        stat['files'] = [_stat(p) for p in get_audio_paths(path)]
+    return stat
+
+
+def _source_fingerprint(stat: Dict[str, List],
+                        backend_args: Dict[str, Any]) -> str:
+    """Returns a hash identifying the data with the given
+    `_source_stat()`, read with the given backend arguments, and the
+    cache version.
+    """
+    info = dict(stat, version=CACHE_VERSION,
+                backend_args=sorted((k, repr(v))
+                                    for k, v in backend_args.items()))
+    return hashlib.sha256(json.dumps(info).encode()).hexdigest()[:32]
+
+
+def _remove_stale_caches(cache_dir: Path, path: Path,
+                         stat: Dict[str, List]):
+    """Removes caches of the source at path that were written before it
+    last changed. Caches of the current source written with other
+    backend arguments are kept.
+    """
+    source = str(path.resolve())
+    for old in cache_dir.glob('{}-*'.format(path.stem)):
+        try:
+            with open(old / 'header.json') as fid:
+                header = json.load(fid)
+        except (OSError, ValueError):
+            continue
+        if header.get('source') == source and header.get('stat') != stat:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def _write_view(view: NetCDFFeatureView, tmp_dir: Path) -> bool:
+    """Writes the features of a lazy view to .npy files, a chunk of
+    instances at a time, and returns whether they are ragged.
+    """
+    lengths = view.lengths
+    ragged = len(view.shape) == 1
+    if ragged:
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        np.save(tmp_dir / 'offsets.npy', offsets)
+        out = np.lib.format.open_memmap(
+            tmp_dir / 'flat.npy', mode='w+', dtype=view.dtype,
+            shape=(int(offsets[-1]), view.n_features))
+    else:
+        out = np.lib.format.open_memmap(
+            tmp_dir / 'features.npy', mode='w+', dtype=view.dtype,
+            shape=view.shape)
+
+    per_instance = max(1, int(lengths.mean())) if len(lengths) > 0 else 1
+    step = max(1, _CACHE_CHUNK_SIZE // per_instance)
+    for start in range(0, len(view), step):
+        end = min(start + step, len(view))
+        if ragged:
+            out[offsets[start]:offsets[end]] = view[start:end].flat
+        else:
+            out[start:end] = view[start:end]
+    out.flush()
+    del out
+    return ragged
+
+
+def write_dataset_cache(backend: DatasetBackend, cache_dir: Path,
+                        source: Union[PathLike, str],
+                        stat: Optional[Dict[str, List]] = None):
+    """Writes the data from a backend to a cache directory, consisting
+    of a small JSON header and .npy arrays that can be memory-mapped.
+    The directory is written under a temporary name and then renamed, so
+    that a partially written cache is never read. The header records
+    the `_source_stat()` of the source, computed here if not given, so
+    that stale caches can be identified. Features of a lazy backend
+    are copied a chunk at a time, so they are never read into memory
+    in full.
+    """
+    cache_dir = Path(cache_dir)
+    tmp_dir = cache_dir.with_name(cache_dir.name + '.tmp{}'.format(
+        os.getpid()))
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    x = backend.features
+    if isinstance(x, NetCDFFeatureView):
+        ragged = _write_view(x, tmp_dir)
+    elif isinstance(x, RaggedArray):
+        ragged = True
+        np.save(tmp_dir / 'flat.npy', x.flat)
+        np.save(tmp_dir / 'offsets.npy', x.offsets)
+    else:
+        ragged = False
+        np.save(tmp_dir / 'features.npy', x)
+    np.save(tmp_dir / 'names.npy', np.array(backend.names, dtype=str))
+    if backend.labels is not None:
+        np.save(tmp_dir / 'labels.npy', np.array(backend.labels, dtype=str))
+    header = {
+        'version': CACHE_VERSION,
+        'source': str(Path(source).resolve()),
+        'stat': _source_stat(Path(source)) if stat is None else stat,
+        'corpus': backend.corpus,
+        'feature_names': list(backend.feature_names),
+        'ragged': ragged,
+        'labels': backend.labels is not None
+    }
+    with open(tmp_dir / 'header.json', 'w') as fid:
+        json.dump(header, fid)
+    try:
+        tmp_dir.rename(cache_dir)
+    except OSError:
+        # Another process wrote the same cache first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+class CacheBackend(DatasetBackend):
+    """Backend that reads a cache written by write_dataset_cache(). All
+    arrays are memory-mapped copy-on-write, so they are only read from
+    disk when accessed, and can be modified in-place without changing
+    the cache.
+    """
     def __init__(self, path: Union[PathLike, str]):
         path = Path(path)
-        if path.suffix == '.nc':
-            self.backend = NetCDFBackend(path)
-        elif path.suffix == '.txt':
-            self.backend = RawAudioBackend(path)
-        elif path.suffixes[0] == '.arff':
-            self.backend = ARFFBackend(path)
+        with open(path / 'header.json') as fid:
+            header = json.load(fid)
+        if header['version'] != CACHE_VERSION:
+            raise ValueError("Cache at {} has version {}, expected {}".format(
+                path, header['version'], CACHE_VERSION))
+
+        self._corpus = header['corpus']
+        self._feature_names = header['feature_names']
+        self._names = np.load(path / 'names.npy').tolist()
+        if header['labels']:
+            self._labels = np.load(path / 'labels.npy').tolist()
+        if header['ragged']:
+            self._features = RaggedArray(
+                np.load(path / 'flat.npy', mmap_mode='c'),
+                np.load(path / 'offsets.npy')
+            )
         else:
-            raise NotImplementedError('Unknown filetype.')
+            self._features = np.load(path / 'features.npy', mmap_mode='c')
+
+
+class Dataset(abc.ABC):
+    """Class representing a dataset of instances from a single corpus.
+
+    Args:
+    -----
+    path: pathlike or str
+        The path to the data. The backend used to read the data is
+        determined by the file extension.
+    lazy: bool, default = False
+        Whether to lazily read features from disk, only reading the
+        instances that are indexed. Only netCDF4 datasets support this.
+        Any method that modifies the data matrix will first read the
+        full data matrix into memory.
+    backend_args: dict, optional
+        Additional keyword arguments for the backend, e.g. `workers` and
+        `sample_rate` for RawAudioBackend.
+    cache_dir: pathlike or str, optional
+        If given, a cache of the parsed data is stored in a subdirectory
+        of this directory, and used instead of the source data on
+        subsequent loads. The cache is keyed by a fingerprint of the
+        source path, size, modification time and backend arguments, so
+        it is invalidated automatically when the source changes, and
+        caches of an outdated source are removed. The cache always holds
+        the full dataset; any instance or feature selection is applied
+        after loading from the cache. Cached features are memory-mapped,
+        so with `lazy` they are also only read when indexed, and the
+        cache is written from the lazy view a chunk at a time.
+    instances: sequence of str or int, or bool array, optional
+        The subset of instances to load, given as names, indices or a
+        boolean mask. Where the backend supports it, only these
+        instances are read from disk.
+    speakers: collection of str, optional
+        Only instances from these speakers are loaded.
+    features: sequence of str or int, optional
+        The subset of features to load, given as names or indices.
+    """
+    def __init__(self, path: Union[PathLike, str], lazy: bool = False,
+                 backend_args: Optional[Dict[str, Any]] = None,
+                 cache_dir: Optional[Union[PathLike, str]] = None,
+                 instances: Optional[Union[Sequence[Union[str, int]],
+                                           np.ndarray]] = None,
+                 speakers: Optional[Collection[str]] = None,
+                 features: Optional[Sequence[Union[str, int]]] = None):
+        path = Path(path)
+        if backend_args is None:
+            backend_args = {}
+        if lazy and path.suffix != '.nc':
+            warnings.warn("Lazy loading is only supported for netCDF4 "
+                          "datasets.")
+
+        selector = None
+        if instances is not None or speakers is not None:
+            selector = partial(select_instances, instances=instances,
+                               speakers=speakers)
+
+        if cache_dir is not None:
+            cache_dir = Path(cache_dir)
+            stat = _source_stat(path)
+            key = _source_fingerprint(stat, backend_args)
+            cache_path = cache_dir / '{}-{}'.format(path.stem, key)
+            if (cache_path / 'header.json').exists():
+                self.backend = CacheBackend(cache_path)
+            else:
+                self.backend = self._open_backend(path, lazy, backend_args)
+                _remove_stale_caches(cache_dir, path, stat)
+                write_dataset_cache(self.backend, cache_path, path, stat)
+            self.backend.select(instances=selector, features=features)
+        else:
+            self.backend = self._open_backend(path, lazy, backend_args,
+                                              instances=selector,
+                                              features=features)
 
         self._corpus = self.backend.corpus
 
@@ -327,37 +1087,44 @@ class Dataset(abc.ABC):
         self._features = self.backend.feature_names
         self._x = self.backend.features
 
-        self._speakers = corpora[self.corpus.lower()].speakers
-        get_speaker = corpora[self.corpus.lower()].get_speaker
-        self._speaker_indices = np.array(
-            [self.speakers.index(get_speaker(n)) for n in self.names],
-            dtype=int
-        )
+        corpus_info = corpora[self.corpus.lower()]
+        self._speakers = corpus_info.speakers
+        self._speaker_indices = corpus_info.get_speaker_indices(self.names)
         self._speaker_counts = np.bincount(self.speaker_indices,
                                            minlength=len(self.speakers))
         if any(x == 0 for x in self.speaker_counts):
             warnings.warn("Some speakers have no corresponding instances.")
 
-        self._male_speakers = corpora[self.corpus.lower()].male_speakers
-        self._female_speakers = corpora[self.corpus.lower()].female_speakers
+        self._male_speakers = corpus_info.male_speakers
+        self._female_speakers = corpus_info.female_speakers
         if self.male_speakers and self.female_speakers:
-            self._male_indices = np.array(
-                [i for i in range(self.n_instances)
-                 if get_speaker(self.names[i]) in self.male_speakers]
-            )
-            self._female_indices = np.array(
-                [i for i in range(self.n_instances)
-                 if get_speaker(self.names[i]) in self.female_speakers]
-            )
+            self._male_indices = np.flatnonzero(
+                corpus_info.speaker_is_male[self.speaker_indices])
+            self._female_indices = np.flatnonzero(
+                corpus_info.speaker_is_female[self.speaker_indices])
 
-        self._speaker_groups = corpora[self.corpus.lower()].speaker_groups
-        speaker_indices_to_group = np.array([
-            i for sp in self.speakers for i in range(len(self._speaker_groups))
-            if sp in self._speaker_groups[i]
-        ])
-        self._speaker_group_indices = speaker_indices_to_group[
+        self._speaker_groups = corpus_info.speaker_groups
+        self._speaker_group_indices = corpus_info.speaker_group_index[
             self.speaker_indices]
 
+    @staticmethod
+    def _open_backend(path: Path, lazy: bool, backend_args: Dict[str, Any],
+                      instances: Optional[InstanceSelector] = None,
+                      features: Optional[Sequence[Union[str, int]]] = None) \
+            -> DatasetBackend:
+        if path.suffix == '.nc':
+            return NetCDFBackend(path, lazy=lazy, instances=instances,
+                                 features=features, **backend_args)
+        elif path.suffix == '.txt':
+            backend = RawAudioBackend(path, instances=instances,
+                                      **backend_args)
+            backend.select(features=features)
+            return backend
+        elif path.suffixes[0] == '.arff':
+            return ARFFBackend(path, instances=instances, features=features,
+                               **backend_args)
+        raise NotImplementedError('Unknown filetype.')
+
     def normalise(self, normaliser: TransformerMixin = StandardScaler(),
                   scheme: str = 'speaker'):
         """Transforms the X data matrix of this dataset using some
@@ -368,52 +1135,133 @@ class Dataset(abc.ABC):
                              normaliser.__class__.__name__)
         print("Normalising dataset with scheme '{}' using {}.".format(scheme,
                                                                       fqn))
+        self.materialise()
 
         if scheme == 'all':
-            if self.x.dtype == object or len(self.x.shape) == 3:
-                # Non-contiguous or 3-D array
-                flat, slices = _make_flat(self.x)
-                flat = normaliser.fit_transform(flat)
-                # FIXME: _make_ragged returns a tuple, not array
-                self._x = _make_ragged(flat, slices)
-            else:
-                self._x = normaliser.fit_transform(self.x)
+            self._normalise_groups(normaliser, None)
         elif scheme == 'speaker':
-            for sp in range(len(self.speakers)):
-                idx = np.nonzero(self.speaker_indices == sp)[0]
-                if self.speaker_counts[sp] == 0:
-                    continue
-                if self.x.dtype == object or len(self.x.shape) == 3:
-                    # Non-contiguous or 3-D array
-                    flat, slices = _make_flat(self.x[idx])
-                    flat = normaliser.fit_transform(flat)
-                    self.x[idx] = _make_ragged(flat, slices)
-                else:
-                    self.x[idx] = normaliser.fit_transform(self.x[idx])
+            self._normalise_groups(normaliser, self.speaker_indices)
+
+    def fold_normaliser(self, scheme: str = 'all') -> FoldNormaliser:
+        """Returns a FoldNormaliser for cross-validation on this
+        dataset. Per-speaker statistics are computed once here, and each
+        fold's normalisation is derived from them.
+
+        Args:
+        -----
+        scheme: str, one of {'all', 'speaker'}
+            'all' standardises each fold using the statistics of its
+            training instances. 'speaker' standardises each instance
+            using the statistics of its speaker.
+
+        Lazily loaded data is read in chunks and not kept in memory.
+        """
+        stats = GroupStatistics(self.x, self.speaker_indices,
+                                n_groups=len(self.speakers))
+        if scheme == 'all':
+            return FoldNormaliser(stats, scheme='train')
+        elif scheme == 'speaker':
+            return FoldNormaliser(stats, scheme='group')
+        raise ValueError("Unknown normalisation scheme '{}'.".format(scheme))
+
+    def kernel_cache(self) -> KernelCache:
+        """Returns a KernelCache of the pairwise kernel values of all
+        instances, for use with PrecomputedSVC in cross-validation and
+        grid search. This should be called after normalising, since the
+        cache is not updated when x changes.
+        """
+        self.materialise()
+        if len(self.x.shape) != 2:
+            raise ValueError("Kernel cache requires a 2-D feature matrix.")
+        return KernelCache(self.x)
+
+    def _normalise_groups(self, normaliser: TransformerMixin,
+                          groups: Optional[np.ndarray]):
+        """Fits and applies the normaliser separately to the vectors of
+        each group of instances, or to all vectors if groups is None.
+        Sequences are normalised on the contiguous buffer of all their
+        vectors.
+        """
+        if isinstance(self.x, RaggedArray):
+            flat = self.x.flat
+            if groups is not None:
+                groups = np.repeat(groups, self.x.lengths)
+        elif len(self.x.shape) == 3:
+            flat = self.x.reshape(-1, self.x.shape[-1])
+            if groups is not None:
+                groups = np.repeat(groups, self.x.shape[1])
+        else:
+            flat = self.x
+
+        if groups is None:
+            flat = normaliser.fit_transform(flat)
+        else:
+            for g in np.unique(groups):
+                idx = np.nonzero(groups == g)[0]
+                flat[idx] = normaliser.fit_transform(flat[idx])
+
+        if isinstance(self.x, RaggedArray):
+            self._x = self.x.with_flat(flat)
+        else:
+            self._x = flat.reshape(self.x.shape)
+
+    def _subset(self, mask: np.ndarray):
+        """Keeps only the instances for which mask is True, applying
+        the mask once to the data and every per-instance array. Lazy
+        views are subset without reading any data.
+        """
+        idx = np.flatnonzero(mask)
+        if isinstance(self._x, (NetCDFFeatureView, CombinedFeatureView)):
+            self._x = self._x.select(idx)
+        else:
+            self._x = self._x[idx]
+        self._names = np.array(self._names, dtype=object)[idx].tolist()
+        self._speaker_indices = self._speaker_indices[idx]
+        self._speaker_group_indices = self._speaker_group_indices[idx]
+        self._speaker_counts = np.bincount(self.speaker_indices,
+                                           minlength=len(self.speakers))
+        # Map old instance indices to new indices
+        new_idx = np.cumsum(mask) - 1
+        if getattr(self, '_male_indices', None) is not None:
+            self._male_indices = new_idx[
+                self._male_indices[mask[self._male_indices]]]
+            self._female_indices = new_idx[
+                self._female_indices[mask[self._female_indices]]]
+
+    def materialise(self):
+        """Reads the full data matrix into memory, if it was lazily
+        loaded or is a view over other datasets.
+        """
+        if isinstance(self._x, (NetCDFFeatureView, CombinedFeatureView)):
+            self._x = self._x[:]
 
     def pad_arrays(self, pad: int = 32):
         """Pads each array to the nearest multiple of `pad` greater than
         the array size. Assumes axis 0 of x is time.
         """
         print("Padding array lengths to nearest multiple of {}.".format(pad))
-        pad_arrays(self.x, pad=pad)
+        self.materialise()
+        self._x = pad_arrays(self.x, pad=pad)
 
     def clip_arrays(self, length: int):
         """Clips each array to the specified maximum length."""
         print("Clipping arrays to max length {}.".format(length))
-        clip_arrays(self.x, length=length)
+        self.materialise()
+        self._x = clip_arrays(self.x, length=length)
 
     def frame_arrays(self, frame_size: int = 640, frame_shift: int = 160,
                      num_frames: Optional[int] = None):
         """Create a sequence of frames from the raw signal."""
         print("Framing arrays with size {} and shift {}.".format(frame_size,
                                                                  frame_shift))
+        self.materialise()
         self._x = frame_arrays(self._x, frame_size=frame_size,
                                frame_shift=frame_shift, num_frames=num_frames)
 
     def transpose_time(self):
         """Transpose the time and feature axis of each instance."""
         print("Transposing time and feature axis of data.")
+        self.materialise()
         self._x = transpose_time(self._x)
 
     @property
@@ -510,8 +1358,15 @@ class Dataset(abc.ABC):
         s += '{} features\n'.format(len(self.features))
         s += '{} speakers:\n'.format(len(self.speakers))
         s += '\t{}\n'.format(dict(zip(self.speakers, self.speaker_counts)))
-        if self.x.dtype == object or len(self.x.shape) == 3:
-            lengths = [len(x) for x in self.x]
+        lengths = None
+        if isinstance(self.x, RaggedArray):
+            lengths = self.x.lengths
+        elif len(self.x.shape) == 3:
+            lengths = [self.x.shape[1]]
+        elif len(self.x.shape) == 1:
+            # Lazily loaded variable length sequences
+            lengths = self.x.lengths
+        if lengths is not None:
             s += 'Sequences:\n'
             s += 'min length: {}\n'.format(np.min(lengths))
             s += 'mean length: {}\n'.format(np.mean(lengths))
@@ -523,25 +1378,35 @@ class LabelledDataset(Dataset):
     """Abstract class representing a dataset containing discrete labels
     for instances.
     """
-    def __init__(self, path: Union[PathLike, str]):
-        super().__init__(path)
+    def __init__(self, path: Union[PathLike, str], **kwargs):
+        super().__init__(path, **kwargs)
         self._classes = list(corpora[self.corpus.lower()].emotion_map.values())
-        self._y = np.array([self.class_to_int(x) for x in self.backend.labels])
-        self._class_counts = np.bincount(self.y)
+        class_index: Dict[str, int] = {}
+        for i, c in enumerate(self.classes):
+            class_index.setdefault(c, i)
+        labels = pd.Series(self.backend.labels, dtype=object)
+        y = labels.map(class_index)
+        if y.isna().any():
+            unknown = set(labels[y.isna()])
+            raise ValueError("Unknown labels {} for corpus {}.".format(
+                ', '.join(sorted(map(str, unknown))[:10]), self.corpus))
+        self._y = y.to_numpy(dtype=int)
+        self._class_counts = np.bincount(self.y, minlength=self.n_classes)
         self._labels = {'all': self.y}
 
     def binarise(self, pos_val: List[str] = [], pos_aro: List[str] = []):
         """Creates a N x C array of binary values B, where B[i, j] is 1
         if instance i belongs to class j, and 0 otherwise.
         """
-        self.binary_y = label_binarize(self.y, np.arange(self.n_classes))
+        self.binary_y = (self.y[:, np.newaxis]
+                         == np.arange(self.n_classes)).astype(int)
         self._labels.update(
-            {c: self.binary_y[:, i] for c, i in enumerate(self.classes)})
+            {c: self.binary_y[:, i] for i, c in enumerate(self.classes)})
 
         if pos_aro and pos_val:
             print("Binarising arousal and valence")
-            arousal_map = np.array([int(c in pos_aro) for c in self.classes])
-            valence_map = np.array([int(c in pos_val) for c in self.classes])
+            arousal_map = np.isin(self.classes, pos_aro).astype(int)
+            valence_map = np.isin(self.classes, pos_val).astype(int)
             self._labels['arousal'] = arousal_map[self.y]
             self._labels['valence'] = valence_map[self.y]
 
@@ -550,29 +1415,38 @@ class LabelledDataset(Dataset):
         corresponding to classes are ignored. The new classes will be
         sorted lexicographically.
         """
-        new_classes = sorted(set([map.get(x, x) for x in self.classes]))
-        arr_map = np.array([new_classes.index(map.get(k, k))
-                            for k in self.classes])
-        self._y = arr_map[self.y]
-        self._class_counts = np.bincount(self.y)
-        self._classes = new_classes
+        mapped = [map.get(x, x) for x in self.classes]
+        new_classes = sorted(set(mapped))
+        new_index = {c: i for i, c in enumerate(new_classes)}
+        arr_map = np.array([new_index[x] for x in mapped], dtype=int)
+        self._relabel(arr_map, new_classes)
 
     def remove_classes(self, keep: Collection[str]):
         """Remove instances with labels not in `keep`."""
         keep = set(keep)
-        str_labels = [self.classes[int(i)] for i in self.y]
-        keep_idx = [i for i, x in enumerate(str_labels) if x in keep]
-        self._x = self._x[keep_idx]
-        self._names = [self.names[i] for i in keep_idx]
-        self._speaker_indices = self._speaker_indices[keep_idx]
-        self._speaker_counts = np.bincount(self.speaker_indices,
-                                           minlength=len(self.speakers))
-        self._speaker_group_indices = self._speaker_indices
+        new_classes = sorted(keep.intersection(self.classes))
+        new_index = {c: i for i, c in enumerate(new_classes)}
+        arr_map = np.array([new_index.get(c, -1) for c in self.classes],
+                           dtype=int)
+        self._subset(arr_map[self.y] >= 0)
+        self._relabel(arr_map, new_classes)
+
+    def _relabel(self, arr_map: np.ndarray, classes: List[str]):
+        """Maps each class index i to arr_map[i], and sets the new class
+        list. Any binarised labels are discarded.
+        """
+        self._y = arr_map[self.y]
+        self._classes = classes
+        self._class_counts = np.bincount(self.y, minlength=len(classes))
+        self._labels = {'all': self.y}
 
-        self._classes = sorted(keep.intersection(self.classes))
-        str_labels = [x for x in str_labels if x in keep]
-        self._y = np.array([self._classes.index(y) for y in str_labels])
-        self._class_counts = np.bincount(self.y)
+    def _subset(self, mask: np.ndarray):
+        super()._subset(mask)
+        self._y = self._y[mask]
+        self._labels = {k: v[mask] for k, v in self._labels.items()}
+        if hasattr(self, 'binary_y'):
+            self.binary_y = self.binary_y[mask]
+        self._class_counts = np.bincount(self.y, minlength=self.n_classes)
 
     @property
     def classes(self) -> List[str]:
@@ -613,12 +1487,156 @@ class LabelledDataset(Dataset):
         return s
 
 
+class CombinedFeatureView:
+    """Read-only view of the concatenated feature arrays of several
+    datasets, which keeps each member's array rather than copying them
+    into one buffer. Global indices are mapped to (member, local index)
+    using a table of offsets. Indexing this view gathers only the
+    indexed instances from each member, giving the same result as
+    indexing the concatenated array, and `view[:]` gives the full
+    contiguous array.
+
+    Args:
+    -----
+    members: sequence of ndarray or RaggedArray
+        The feature array of each member dataset. These can also be
+        lazy views, e.g. NetCDFFeatureView.
+    instances: ndarray, optional
+        Indices into the concatenation of the members of the instances
+        in this view. Default is all instances.
+    """
+    def __init__(self, members: Sequence[Any],
+                 instances: Optional[np.ndarray] = None):
+        self._members = list(members)
+        sizes = [len(x) for x in self._members]
+        self._offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=self._offsets[1:])
+        if instances is None:
+            instances = np.arange(self._offsets[-1])
+        self._instances = np.asarray(instances, dtype=np.int64)
+
+        # Feature shape of fixed size instances, or None if variable
+        shapes = {None if isinstance(x, RaggedArray) or len(x.shape) == 1
+                  else tuple(x.shape[1:]) for x in self._members}
+        if len(shapes) == 1 and None not in shapes:
+            self._shape = (len(self._instances),) + shapes.pop()
+        else:
+            self._shape = (len(self._instances),)
+
+    @property
+    def members(self) -> List[Any]:
+        return self._members
+
+    def fingerprint_state(self) -> Tuple[List[Any], np.ndarray]:
+        return self._members, self._instances
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self._shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._members[0].dtype
+
+    @property
+    def is_ragged(self) -> bool:
+        return len(self._shape) == 1
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Sequence length of each instance."""
+        lengths = []
+        for x in self._members:
+            if isinstance(x, RaggedArray) or len(x.shape) == 1:
+                lengths.append(x.lengths)
+            elif len(x.shape) == 3:
+                lengths.append(np.full(len(x), x.shape[1]))
+            else:
+                lengths.append(np.ones(len(x), dtype=np.int64))
+        return np.concatenate(lengths)[self._instances]
+
+    def locate(self, idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the member and local index within that member of the
+        given instances of this view.
+        """
+        g = self._instances[idx]
+        member = np.searchsorted(self._offsets, g, side='right') - 1
+        return member, g - self._offsets[member]
+
+    def select(self, idx) -> 'CombinedFeatureView':
+        """Returns a view of a subset of the instances of this view,
+        without reading any data.
+        """
+        return CombinedFeatureView(self._members, self._instances[idx])
+
+    def _gather(self, idx: np.ndarray) -> Union[np.ndarray, RaggedArray]:
+        member, local = self.locate(idx)
+        order = np.argsort(member, kind='stable')
+        present, starts = np.unique(member[order], return_index=True)
+        ends = np.r_[starts[1:], len(order)]
+        parts = [self._members[m][local[order[s:e]]]
+                 for m, s, e in zip(present, starts, ends)]
+        if len(parts) == 0:
+            parts = [self._members[0][np.empty(0, dtype=np.int64)]]
+        if self.is_ragged:
+            x = RaggedArray.concatenate(
+                [RaggedArray.from_arrays(x) for x in parts])
+        else:
+            x = np.concatenate(parts)
+        if np.all(order[1:] > order[:-1]):
+            # Already grouped by member
+            return x
+        inverse = np.empty_like(order)
+        inverse[order] = np.arange(len(order))
+        return x[inverse]
+
+    def __getitem__(self, idx) -> Union[np.ndarray, RaggedArray]:
+        if isinstance(idx, tuple):
+            if np.isscalar(idx[0]):
+                return self[idx[0]][idx[1:]]
+            return self[idx[0]][(slice(None),) + idx[1:]]
+        if np.isscalar(idx) and np.issubdtype(type(idx), np.integer):
+            if idx < 0:
+                idx += len(self)
+            if not 0 <= idx < len(self):
+                raise IndexError("Index {} out of bounds.".format(idx))
+            member, local = self.locate(idx)
+            return self._members[member][local]
+        if isinstance(idx, slice):
+            idx = np.arange(len(self))[idx]
+        idx = np.asarray(idx)
+        if idx.dtype == bool:
+            idx = np.flatnonzero(idx)
+        idx = np.where(idx < 0, idx + len(self), idx).astype(np.int64)
+        return self._gather(idx)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        x = np.asarray(self[:])
+        return x if dtype is None else x.astype(dtype)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
 class CombinedDataset(LabelledDataset):
     """A dataset that joins individual corpus datasets together and
-    handles labelling differences.
+    handles labelling differences. The features are not copied; `x` is a
+    CombinedFeatureView over the member datasets' arrays, which is only
+    made contiguous by materialise() or by methods that modify the data.
+
+    Args:
+    -----
+    *datasets: LabelledDataset
+        The datasets to combine.
+    labels: collection of str, optional
+        If given, only instances with these labels are kept.
     """
     def __init__(self, *datasets: LabelledDataset,
-                 labels: Optional[List[str]] = None):
+                 labels: Optional[Collection[str]] = None):
         self._corpus = 'combined'
         self._corpora = [x.corpus for x in datasets]
         sizes = [len(x.x) for x in datasets]
@@ -643,21 +1661,35 @@ class CombinedDataset(LabelledDataset):
         self._speaker_indices = np.concatenate(speaker_indices)
         self._speaker_group_indices = np.concatenate(speaker_group_indices)
 
-        self._x = np.concatenate([x.x for x in datasets])
+        self._x = CombinedFeatureView([d.x for d in datasets])
 
+        # Map each dataset's class indices to combined class indices,
+        # or -1 for dropped classes
         all_labels = set(c for d in datasets for c in d.classes)
-        self._classes = sorted(all_labels)
-        str_labels = [d.classes[int(i)] for d in datasets for i in d.y]
         if labels:
-            drop_labels = all_labels - labels
-            keep_idx = [i for i, x in enumerate(str_labels)
-                        if x not in drop_labels]
-            self._x = self._x[keep_idx]
-            self._speaker_indices = self._speaker_indices[keep_idx]
-            self._classes = sorted(labels)
-            str_labels = [x for x in str_labels if x not in drop_labels]
-        self._y = np.array([self._classes.index(y) for y in str_labels])
-        self._speaker_group_indices = self._speaker_indices
+            self._classes = sorted(set(labels))
+        else:
+            self._classes = sorted(all_labels)
+        class_index = {c: i for i, c in enumerate(self._classes)}
+        self._y = np.concatenate([
+            np.array([class_index.get(c, -1) for c in d.classes],
+                     dtype=int)[d.y]
+            for d in datasets
+        ])
+        self._labels = {'all': self._y}
+        keep = self._y >= 0
+        if np.all(keep):
+            self._speaker_counts = np.bincount(self.speaker_indices,
+                                               minlength=len(self.speakers))
+            self._class_counts = np.bincount(self.y,
+                                             minlength=len(self.classes))
+        else:
+            self._subset(keep)
+
+    def _subset(self, mask: np.ndarray):
+        super()._subset(mask)
+        self._corpus_indices = self._corpus_indices[mask]
+        self._corpus_counts = None
 
     @property
     def corpora(self) -> List[str]:
@@ -700,17 +1732,23 @@ class CombinedDataset(LabelledDataset):
             print("Normalising dataset with scheme 'corpus' using {}.".format(
                 fqn))
 
-            for corpus in range(len(self.corpora)):
-                idx = np.nonzero(self.corpus_indices == corpus)[0]
-                if self.x.dtype == object or len(self.x.shape) == 3:
-                    flat, slices = _make_flat(self.x[idx])
-                    flat = normaliser.fit_transform(flat)
-                    self.x[idx] = _make_ragged(flat, slices)
-                else:
-                    self.x[idx] = normaliser.fit_transform(self.x[idx])
+            self.materialise()
+            self._normalise_groups(normaliser, self.corpus_indices)
         else:
             super().normalise(normaliser, scheme)
 
+    def fold_normaliser(self, scheme: str = 'all') -> FoldNormaliser:
+        """Returns a FoldNormaliser for cross-validation on this
+        dataset. In addition to the schemes of Dataset.fold_normaliser(),
+        'corpus' standardises each instance using the statistics of its
+        corpus.
+        """
+        if scheme == 'corpus':
+            stats = GroupStatistics(self.x, self.corpus_indices,
+                                    n_groups=len(self.corpora))
+            return FoldNormaliser(stats, scheme='group')
+        return super().fold_normaliser(scheme)
+
     def __str__(self) -> str:
         s = super().__str__()
         s += '{} corpora:\n'.format(len(self.corpora))
@@ -0,0 +1,256 @@
+"""Memory-bounded computation of kernel matrices in tiles, and caching
+of pairwise kernel values for a full dataset, so that cross-validation
+folds and hyperparameter grid points slice their kernel matrices from
+one precomputed matrix instead of recomputing them.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional, Union
+
+import numpy as np
+
+__all__ = ['KernelCache', 'blocked_kernel', 'gram_tiles', 'sq_dist_tiles']
+
+# Default memory budget for one tile of a blocked kernel matrix, in bytes
+_MAX_TILE_MEMORY = 1 << 28
+
+# Fills the given rows of a kernel matrix in-place
+TileFunction = Callable[[slice, np.ndarray], None]
+# Elementwise in-place transformation of a tile
+TileTransform = Callable[[np.ndarray], None]
+
+
+def blocked_kernel(tile_fn: TileFunction, n_rows: int, n_cols: int,
+                   out: Optional[np.ndarray] = None,
+                   max_memory: Optional[int] = None,
+                   n_jobs: int = 1) -> np.ndarray:
+    """Computes an (n_rows, n_cols) kernel matrix in tiles of whole rows,
+    each written in-place into the output, so that peak memory is the
+    output matrix plus temporaries for at most n_jobs tiles.
+
+    Parameters:
+    -----------
+    tile_fn: callable
+        Function taking a slice of rows and the corresponding view of
+        the output, and filling it in-place.
+    n_rows, n_cols: int
+        The shape of the kernel matrix.
+    out: ndarray, optional
+        Preallocated (possibly memory-mapped) output. If not given, a
+        float32 matrix is allocated.
+    max_memory: int, optional
+        Maximum size of one tile, in bytes. Default is 256 MiB.
+    n_jobs: int
+        Number of threads to compute tiles in parallel. BLAS and numpy
+        elementwise operations release the GIL.
+    """
+    if out is None:
+        out = np.empty((n_rows, n_cols), dtype=np.float32)
+    elif out.shape != (n_rows, n_cols):
+        raise ValueError("out must have shape {}.".format((n_rows, n_cols)))
+    if max_memory is None:
+        max_memory = _MAX_TILE_MEMORY
+    tile_rows = max(1, max_memory // max(1, n_cols * out.itemsize))
+    tiles = [slice(i, min(i + tile_rows, n_rows))
+             for i in range(0, n_rows, tile_rows)]
+    if n_jobs == 1 or len(tiles) == 1:
+        for rows in tiles:
+            tile_fn(rows, out[rows])
+    else:
+        with ThreadPoolExecutor(n_jobs) as pool:
+            # Consume the iterator so that exceptions are raised
+            list(pool.map(lambda rows: tile_fn(rows, out[rows]), tiles))
+    return out
+
+
+def gram_tiles(x: np.ndarray, y: np.ndarray,
+               transform: Optional[TileTransform] = None) -> TileFunction:
+    """Returns a TileFunction computing inner products <x_i, y_j> in
+    float32 with BLAS, optionally followed by an elementwise in-place
+    transform of each tile.
+    """
+    x = np.asarray(x, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+
+    def tile_fn(rows: slice, block: np.ndarray):
+        np.matmul(x[rows], y.T, out=block)
+        if transform is not None:
+            transform(block)
+    return tile_fn
+
+
+def sq_dist_tiles(x: np.ndarray, y: np.ndarray,
+                  transform: Optional[TileTransform] = None,
+                  x_sq_norms: Optional[np.ndarray] = None,
+                  y_sq_norms: Optional[np.ndarray] = None) -> TileFunction:
+    """Returns a TileFunction computing squared distances
+    ||x_i - y_j||^2 in float32, optionally followed by an elementwise
+    in-place transform of each tile. Precomputed squared norms of x and
+    y may be given.
+    """
+    x = np.asarray(x, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    if x_sq_norms is None:
+        x_sq_norms = np.einsum('ij,ij->i', x, x)
+    if y_sq_norms is None:
+        y_sq_norms = np.einsum('ij,ij->i', y, y)
+
+    def tile_fn(rows: slice, block: np.ndarray):
+        # ||x - y||^2 = <x, x> + <y, y> - 2<x, y>
+        np.matmul(x[rows], y.T, out=block)
+        block *= -2
+        block += x_sq_norms[rows, np.newaxis]
+        block += y_sq_norms
+        np.maximum(block, 0, out=block)
+        if transform is not None:
+            transform(block)
+    return tile_fn
+
+
+class KernelCache:
+    """Pairwise squared distances ||x_i - x_j||^2 and inner products
+    <x_i, x_j> of all instances of a dataset, computed once in float32.
+    Kernel values for any subset of rows and
+    columns are derived from these with an elementwise pass over the
+    sliced block, for any choice of gamma, degree or coef0.
+
+    Each matrix is only computed when a kernel first needs it, i.e. the
+    squared distances for 'rbf' and the inner products for 'linear' and
+    'poly', and is computed in tiles with blocked_kernel(). Threads
+    sharing the cache wait for a matrix being computed rather than
+    computing it again. Call precompute() before sending the cache to
+    worker processes, since each would otherwise compute its own.
+
+    Classifiers using the cache (see PrecomputedSVC) take as input a
+    column of instance indices, as returned by indices(), in place of
+    feature vectors.
+
+    Parameters:
+    -----------
+    x: ndarray
+        The 2-D feature matrix of the full dataset.
+    max_memory: int, optional
+        Maximum size of one tile, in bytes. See blocked_kernel().
+    n_jobs: int
+        Number of threads used to compute the matrices.
+    """
+    def __init__(self, x: np.ndarray, max_memory: Optional[int] = None,
+                 n_jobs: int = 1):
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim != 2:
+            raise ValueError("x must be a 2-D matrix.")
+        self._x = x
+        self.max_memory = max_memory
+        self.n_jobs = n_jobs
+        self._sq_norms = np.einsum('ij,ij->i', x, x)
+        self._sq_dist: Optional[np.ndarray] = None
+        self._gram: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        # The cache is never modified after computing, so sklearn's clone()
+        # can share it between estimators instead of copying the matrices.
+        return self
+
+    def fingerprint_state(self) -> np.ndarray:
+        # The matrices are derived from x only
+        return self._x
+
+    @property
+    def n_instances(self) -> int:
+        return len(self._x)
+
+    @property
+    def n_features(self) -> int:
+        return self._x.shape[1]
+
+    def indices(self, idx: Optional[np.ndarray] = None) -> np.ndarray:
+        """Returns a column vector of the given instance indices (default
+        all instances), to pass as input to a classifier using this
+        cache.
+        """
+        if idx is None:
+            idx = np.arange(self.n_instances)
+        return np.asarray(idx, dtype=np.float64)[:, np.newaxis]
+
+    @property
+    def sq_dist(self) -> np.ndarray:
+        """The full matrix of pairwise squared distances."""
+        if self._sq_dist is None:
+            with self._lock:
+                if self._sq_dist is None:
+                    self._sq_dist = blocked_kernel(
+                        sq_dist_tiles(self._x, self._x,
+                                      x_sq_norms=self._sq_norms,
+                                      y_sq_norms=self._sq_norms),
+                        self.n_instances, self.n_instances,
+                        max_memory=self.max_memory, n_jobs=self.n_jobs
+                    )
+        return self._sq_dist
+
+    @property
+    def gram(self) -> np.ndarray:
+        """The full matrix of pairwise inner products."""
+        if self._gram is None:
+            with self._lock:
+                if self._gram is None:
+                    self._gram = blocked_kernel(
+                        gram_tiles(self._x, self._x), self.n_instances,
+                        self.n_instances, max_memory=self.max_memory,
+                        n_jobs=self.n_jobs
+                    )
+        return self._gram
+
+    def precompute(self, kernels: Iterable[str]):
+        """Computes the matrices needed by the given kernels now rather
+        than on first use, e.g. before sharing the cache between threads
+        or worker processes.
+        """
+        kernels = set(kernels)
+        if 'rbf' in kernels:
+            self.sq_dist
+        if kernels & {'linear', 'poly'}:
+            self.gram
+
+    def kernel(self, rows: np.ndarray, cols: np.ndarray, kernel: str = 'rbf',
+               gamma: Union[str, float] = 'auto', degree: int = 3,
+               coef0: float = 0.0) -> np.ndarray:
+        """Returns the kernel matrix between the instances with indices
+        rows and the instances with indices cols, with the same
+        parameters as the kernels of PrecomputedSVC.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        cols = np.asarray(cols, dtype=np.intp)
+        if gamma == 'auto':
+            gamma = 1 / self.n_features
+        if kernel == 'rbf':
+            block = self.sq_dist[rows[:, np.newaxis], cols]
+            block *= -gamma
+            np.exp(block, out=block)
+        elif kernel == 'poly':
+            block = self.gram[rows[:, np.newaxis], cols]
+            block *= gamma
+            block += coef0
+            block **= degree
+        elif kernel == 'linear':
+            block = self.gram[rows[:, np.newaxis], cols]
+        else:
+            raise ValueError("Unknown kernel '{}'.".format(kernel))
+        return block
+
+    def kernel_function(self, x: np.ndarray, y: np.ndarray,
+                        **kwargs) -> np.ndarray:
+        """Kernel function taking columns of instance indices, as
+        returned by indices(), for use as a callable sklearn kernel.
+        """
+        return self.kernel(x[:, 0], y[:, 0], **kwargs)
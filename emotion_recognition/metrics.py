@@ -0,0 +1,105 @@
+"""Classification metrics computed from a single confusion matrix, so
+that WAR, UAR, UAP and per-class precision and recall need only one
+pass over the predictions.
+"""
+
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+__all__ = ['confusion_matrix', 'confusion_metrics', 'classification_metrics',
+           'MetricsScorer']
+
+
+def confusion_matrix(y_true: np.ndarray, y_pred: np.ndarray, n_classes: int,
+                     sample_weight: Optional[np.ndarray] = None) \
+        -> np.ndarray:
+    """Returns the (n_classes, n_classes) confusion matrix, with rows
+    indexed by true class and columns by predicted class, using a
+    single bincount. Labels must be integers in [0, n_classes).
+    """
+    y_true = np.asarray(y_true, dtype=np.int64)
+    y_pred = np.asarray(y_pred, dtype=np.int64)
+    counts = np.bincount(n_classes * y_true + y_pred, weights=sample_weight,
+                         minlength=n_classes**2)
+    return counts.reshape(n_classes, n_classes)
+
+
+def _divide(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    """num / den, with 0 where den is 0 as for sklearn's default
+    zero_division.
+    """
+    out = np.zeros(len(num))
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+def confusion_metrics(cm: np.ndarray) -> Dict[str, np.ndarray]:
+    """Returns the metrics derived from a confusion matrix, as a
+    dictionary with keys:
+
+    'war': weighted average recall, i.e. accuracy.
+    'uar': unweighted average recall.
+    'uap': unweighted average precision.
+    'rec': recall of each class.
+    'prec': precision of each class.
+
+    Recall and precision of a class with no true or predicted instances
+    respectively are 0. As for sklearn's average='macro', UAR and UAP
+    are averaged over the classes occurring in either the true or
+    predicted labels.
+    """
+    tp = np.diag(cm).astype(np.float64)
+    support = cm.sum(1)
+    predicted = cm.sum(0)
+    total = support.sum()
+    rec = _divide(tp, support)
+    prec = _divide(tp, predicted)
+    present = (support > 0) | (predicted > 0)
+    return {
+        'war': tp.sum() / total if total > 0 else 0.0,
+        'uar': rec[present].mean() if present.any() else 0.0,
+        'uap': prec[present].mean() if present.any() else 0.0,
+        'rec': rec,
+        'prec': prec
+    }
+
+
+def classification_metrics(y_true: np.ndarray, y_pred: np.ndarray,
+                           n_classes: int,
+                           sample_weight: Optional[np.ndarray] = None) \
+        -> Dict[str, np.ndarray]:
+    """Returns confusion_metrics() of the predictions y_pred."""
+    return confusion_metrics(confusion_matrix(y_true, y_pred, n_classes,
+                                              sample_weight))
+
+
+class MetricsScorer:
+    """Scorer for use with sklearn's cross_validate() and GridSearchCV
+    which computes all metrics from one set of predictions and one
+    confusion matrix, instead of one scorer per metric.
+
+    Returns a dictionary with keys 'war', 'uar', 'uap', and
+    '<class>_rec' and '<class>_prec' for each class. When used with
+    GridSearchCV, refit must be set to one of these keys.
+
+    Parameters:
+    -----------
+    classes: sequence of str
+        The class names, in label order. Labels must be integers in
+        [0, len(classes)).
+    """
+    def __init__(self, classes: Sequence[str]):
+        self.classes = list(classes)
+
+    def __call__(self, estimator, X, y_true,
+                 sample_weight: Optional[np.ndarray] = None) \
+            -> Dict[str, float]:
+        y_pred = estimator.predict(X)
+        metrics = classification_metrics(
+            y_true, y_pred, len(self.classes), sample_weight=sample_weight)
+        scores = {k: float(metrics[k]) for k in ['war', 'uar', 'uap']}
+        for i, c in enumerate(self.classes):
+            scores[c + '_rec'] = float(metrics['rec'][i])
+            scores[c + '_prec'] = float(metrics['prec'][i])
+        return scores
@@ -0,0 +1,294 @@
+"""Normalisation of datasets from per-group sufficient statistics, so
+that fold-correct normalisation needs no additional passes over the
+data.
+"""
+
+from typing import Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from .utils import RaggedArray
+
+__all__ = ['GroupStatistics', 'FoldNormaliser']
+
+ArrayLike = Union[np.ndarray, RaggedArray]
+
+# Number of vectors to reduce at once, to bound temporary memory
+_BLOCK_SIZE = 1 << 16
+
+
+def _as_ragged(x: ArrayLike) -> RaggedArray:
+    """Returns a RaggedArray of 2-D instances sharing the buffer of x
+    where possible. 2-D matrices become one vector per instance.
+    """
+    if isinstance(x, RaggedArray):
+        return x
+    if x.dtype == object:
+        return RaggedArray.from_arrays(x)
+    if x.ndim == 2:
+        return RaggedArray.from_lengths(x, np.ones(len(x), dtype=np.int64))
+    if x.ndim == 3:
+        return RaggedArray.from_lengths(
+            x.reshape(-1, x.shape[-1]),
+            np.full(len(x), x.shape[1], dtype=np.int64)
+        )
+    raise ValueError("Data must be 2-D, 3-D or ragged.")
+
+
+def _n_features(x) -> int:
+    if isinstance(x, RaggedArray):
+        return int(np.prod(x.feature_shape))
+    return x.shape[-1]
+
+
+def _chunks(x) -> Iterator[Tuple[int, ArrayLike]]:
+    """Yields (start, x[start:end]) for consecutive chunks of instances.
+    In-memory data is yielded whole; lazy views are read in chunks of
+    roughly _BLOCK_SIZE vectors.
+    """
+    if isinstance(x, (np.ndarray, RaggedArray)):
+        yield 0, x
+        return
+    if len(x.shape) == 1:
+        lengths = x.lengths
+        per_instance = max(1, int(lengths.mean())) if len(lengths) else 1
+    elif len(x.shape) == 3:
+        per_instance = x.shape[1]
+    else:
+        per_instance = 1
+    step = max(1, _BLOCK_SIZE // per_instance)
+    for start in range(0, len(x), step):
+        yield start, x[start:start + step]
+
+
+def _like(x: ArrayLike, flat: np.ndarray) -> ArrayLike:
+    """Returns flat in the same form as x."""
+    if isinstance(x, RaggedArray):
+        return x.with_flat(flat)
+    if x.dtype == object:
+        return np.asarray(RaggedArray.from_arrays(x).with_flat(flat))
+    return flat.reshape(x.shape)
+
+
+def _segment_sums(flat: np.ndarray, offsets: np.ndarray,
+                  ref: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the sum and sum of squares, in float64, of each segment
+    flat[offsets[i]:offsets[i + 1]] - ref. Empty segments have zero
+    sum.
+    """
+    n_seg = len(offsets) - 1
+    sums = np.zeros((n_seg, flat.shape[1]), dtype=np.float64)
+    sums_sq = np.zeros_like(sums)
+    starts = offsets[:-1]
+    nonempty = np.flatnonzero(offsets[1:] > starts)
+    if len(nonempty) == 0:
+        return sums, sums_sq
+    # Process whole segments in blocks of roughly _BLOCK_SIZE vectors
+    block_ends = np.searchsorted(starts[nonempty],
+                                 np.arange(_BLOCK_SIZE, offsets[-1],
+                                           _BLOCK_SIZE))
+    for seg in np.split(nonempty, np.unique(block_ends)):
+        if len(seg) == 0:
+            continue
+        lo, hi = starts[seg[0]], offsets[seg[-1] + 1]
+        block = flat[lo:hi] - ref
+        sums[seg] = np.add.reduceat(block, starts[seg] - lo)
+        np.square(block, out=block)
+        sums_sq[seg] = np.add.reduceat(block, starts[seg] - lo)
+    return sums, sums_sq
+
+
+class GroupStatistics:
+    """Count, sum and sum of squares of the feature vectors in each
+    group of instances, computed in one pass with segment reductions
+    over the contiguous buffer of all vectors. Statistics for any union
+    of groups are then obtained by merging these in O(n_groups).
+
+    Vectors are shifted by a reference vector before accumulating, to
+    reduce cancellation error when computing the variance.
+
+    x may also be a lazy view supporting slicing, such as a
+    NetCDFFeatureView or CombinedFeatureView. It is then read in chunks
+    of instances whose group statistics are merged, so the full data is
+    never held in memory.
+
+    Parameters:
+    -----------
+    x: ndarray or RaggedArray
+        The data, either a 2-D matrix of one vector per instance, a 3-D
+        array of fixed-length sequences, or variable-length sequences.
+    groups: ndarray
+        The group index of each instance.
+    n_groups: int, optional
+        The total number of groups. Default is groups.max() + 1.
+    """
+    def __init__(self, x: ArrayLike, groups: np.ndarray,
+                 n_groups: Optional[int] = None):
+        groups = np.asarray(groups, dtype=np.int64)
+        if len(groups) != len(x):
+            raise ValueError("groups must have one entry per instance.")
+        if n_groups is None:
+            n_groups = int(groups.max()) + 1 if len(groups) > 0 else 0
+
+        self._x = x
+        self._groups = groups
+        self._ref: Optional[np.ndarray] = None
+        self._count = np.zeros(n_groups, dtype=np.int64)
+        self._sum: Optional[np.ndarray] = None
+        self._sum_sq: Optional[np.ndarray] = None
+        for start, chunk in _chunks(x):
+            self._accumulate(_as_ragged(chunk),
+                             groups[start:start + len(chunk)])
+        if self._ref is None:
+            self._ref = np.zeros(_n_features(x))
+            self._sum = np.zeros((n_groups, len(self._ref)))
+            self._sum_sq = np.zeros_like(self._sum)
+        self._instance_count = np.bincount(groups, minlength=n_groups)
+
+    def _accumulate(self, ragged: RaggedArray, groups: np.ndarray):
+        """Adds the statistics of a chunk of instances."""
+        flat = ragged.flat.reshape(len(ragged.flat), -1)
+        if self._ref is None:
+            if len(flat) == 0:
+                return
+            self._ref = flat[0].astype(np.float64)
+            self._sum = np.zeros((len(self._count), flat.shape[1]))
+            self._sum_sq = np.zeros_like(self._sum)
+
+        sums, sums_sq = _segment_sums(flat, ragged.offsets, self._ref)
+        order = np.argsort(groups, kind='stable')
+        present, starts = np.unique(groups[order], return_index=True)
+        if len(present) > 0:
+            self._count[present] += np.add.reduceat(ragged.lengths[order],
+                                                    starts)
+            self._sum[present] += np.add.reduceat(sums[order], starts)
+            self._sum_sq[present] += np.add.reduceat(sums_sq[order], starts)
+
+    @property
+    def count(self) -> np.ndarray:
+        """Number of vectors in each group."""
+        return self._count
+
+    @property
+    def n_groups(self) -> int:
+        return len(self._count)
+
+    @property
+    def groups(self) -> np.ndarray:
+        """The group index of each instance."""
+        return self._groups
+
+    def fingerprint_state(self) -> Tuple[np.ndarray, ...]:
+        return (self._groups, self._ref, self._count, self._sum,
+                self._sum_sq)
+
+    def _moments(self, count: np.ndarray, s: np.ndarray,
+                 s_sq: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        count = np.maximum(count, 1)[..., None]
+        mean = s / count
+        var = np.maximum(s_sq / count - mean**2, 0)
+        return mean + self._ref, var
+
+    def group_moments(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the mean and variance of each group, each of shape
+        (n_groups, n_features).
+        """
+        return self._moments(self._count, self._sum, self._sum_sq)
+
+    def moments(self, instances: Optional[np.ndarray] = None) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the mean and variance of all vectors of the given
+        instances. Groups wholly contained in the instances are merged
+        from their statistics; only the instances of partially included
+        groups are read from the data.
+        """
+        if instances is None:
+            return self._moments(self._count.sum(), self._sum.sum(0),
+                                 self._sum_sq.sum(0))
+
+        instances = np.asarray(instances)
+        if instances.dtype == bool:
+            instances = np.flatnonzero(instances)
+        groups = self._groups[instances]
+        counts = np.bincount(groups, minlength=self.n_groups)
+        whole = (counts == self._instance_count) & (counts > 0)
+        count = self._count[whole].sum()
+        s = self._sum[whole].sum(0)
+        s_sq = self._sum_sq[whole].sum(0)
+
+        partial = instances[~whole[groups]]
+        if len(partial) > 0:
+            vecs = _as_ragged(self._x[partial]).flat
+            vecs = vecs.reshape(len(vecs), -1) - self._ref
+            count += len(vecs)
+            s = s + vecs.sum(0)
+            s_sq = s_sq + np.square(vecs).sum(0)
+        return self._moments(count, s, s_sq)
+
+
+def _scale(var: np.ndarray) -> np.ndarray:
+    """Standard deviation, with zero variance mapped to a scale of 1 as
+    in sklearn's StandardScaler.
+    """
+    scale = np.sqrt(var)
+    scale[scale < 10 * np.finfo(scale.dtype).eps] = 1
+    return scale
+
+
+class FoldNormaliser:
+    """Standardises the data of cross-validation folds from
+    GroupStatistics computed once for the full dataset, so that no
+    statistics are fit on test data and no fold requires another pass
+    over the data.
+
+    Parameters:
+    -----------
+    stats: GroupStatistics
+        Statistics of the full dataset.
+    scheme: str, one of {'train', 'group'}
+        'train' standardises both training and test data using the mean
+        and variance of the training instances. 'group' standardises
+        each instance using the statistics of its own group (e.g.
+        speaker or corpus), which is the same for every fold.
+    """
+    def __init__(self, stats: GroupStatistics, scheme: str = 'train'):
+        if scheme not in ['train', 'group']:
+            raise ValueError("scheme must be one of {train, group}.")
+        self.stats = stats
+        self.scheme = scheme
+        if scheme == 'group':
+            mean, var = stats.group_moments()
+            self._group_mean = mean.astype(np.float32)
+            self._group_scale = _scale(var).astype(np.float32)
+
+    def fingerprint_state(self) -> Tuple[str, GroupStatistics]:
+        return self.scheme, self.stats
+
+    def transform(self, x: ArrayLike, instances: np.ndarray,
+                  train: Optional[np.ndarray] = None) -> ArrayLike:
+        """Returns a standardised copy of x.
+
+        Parameters:
+        -----------
+        x: ndarray or RaggedArray
+            The data of the given instances, i.e. data[instances].
+        instances: ndarray
+            Indices into the full dataset of the instances in x.
+        train: ndarray, optional
+            Indices of the training instances of this fold. Required if
+            scheme is 'train'.
+        """
+        ragged = _as_ragged(x)
+        flat = ragged.flat.reshape(len(ragged.flat), -1)
+        if self.scheme == 'train':
+            if train is None:
+                raise ValueError("train must be given for scheme 'train'.")
+            mean, var = self.stats.moments(train)
+            out = flat - mean.astype(np.float32)
+            out /= _scale(var).astype(np.float32)
+        else:
+            frame_groups = np.repeat(self.stats.groups[instances],
+                                     ragged.lengths)
+            out = flat - self._group_mean[frame_groups]
+            out /= self._group_scale[frame_groups]
+        return _like(x, out.reshape(ragged.flat.shape))
@@ -0,0 +1,203 @@
+"""Process-pool execution with large arrays shared through memory-mapped
+files rather than copied to each worker.
+"""
+
+import io
+import os
+import pickle
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Tuple)
+
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+__all__ = ['SharedArrays', 'parallel_imap', 'parallel_map']
+
+# Arrays at least this size (in bytes) are shared rather than pickled
+_MIN_SHARED_BYTES = 1 << 20
+
+# Identifies an array by its memory, so that arrays sharing the same
+# buffer (e.g. np.asarray() of a memmap) are recognised
+ArrayKey = Tuple[int, Tuple[int, ...], Tuple[int, ...], str]
+
+# Worker process state: memory-mapped arrays by path, and paths by key
+_worker_arrays: Dict[str, np.ndarray] = {}
+_worker_paths: Dict[ArrayKey, str] = {}
+_worker_limits = None
+
+
+def _array_key(arr: np.ndarray) -> ArrayKey:
+    return (arr.__array_interface__['data'][0], arr.shape, arr.strides,
+            arr.dtype.str)
+
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, file, persistent_id: Callable[[Any], Optional[str]]):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._persistent_id = persistent_id
+
+    def persistent_id(self, obj):
+        return self._persistent_id(obj)
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, persistent_load: Callable[[str], Any]):
+        super().__init__(file)
+        self._persistent_load = persistent_load
+
+    def persistent_load(self, pid):
+        return self._persistent_load(pid)
+
+
+def _dumps(obj, persistent_id: Callable[[Any], Optional[str]]) -> bytes:
+    buf = io.BytesIO()
+    _Pickler(buf, persistent_id).dump(obj)
+    return buf.getvalue()
+
+
+def _loads(data: bytes, persistent_load: Callable[[str], Any]):
+    return _Unpickler(io.BytesIO(data), persistent_load).load()
+
+
+class SharedArrays:
+    """Pickles objects for worker processes such that every large numpy
+    array they contain is written once to a memory-mapped file (in
+    /dev/shm where available) and attached zero-copy by the workers,
+    instead of being copied into each task.
+
+    Results returned from workers are unpickled such that any array
+    which is a shared array (e.g. the training data stored by a fitted
+    classifier) is replaced by the original array, so it is not copied
+    back either.
+
+    Parameters:
+    -----------
+    min_bytes: int
+        Arrays smaller than this are pickled normally.
+    """
+    def __init__(self, min_bytes: int = _MIN_SHARED_BYTES):
+        self.min_bytes = min_bytes
+        tmp = '/dev/shm' if os.path.isdir('/dev/shm') else None
+        self.folder = tempfile.mkdtemp(prefix='emotion_', dir=tmp)
+        self._paths: Dict[int, str] = {}
+        # Keep a reference to each shared array so that ids are not reused
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    def _persistent_id(self, obj) -> Optional[str]:
+        # Subclasses are included, e.g. copy-on-write memmaps from a
+        # dataset cache, which may differ from their file
+        if (not isinstance(obj, np.ndarray) or obj.dtype == object
+                or obj.nbytes < self.min_bytes):
+            return None
+        path = self._paths.get(id(obj))
+        if path is None:
+            path = os.path.join(self.folder, '{}.npy'.format(len(self._paths)))
+            np.save(path, obj, allow_pickle=False)
+            self._paths[id(obj)] = path
+            self._arrays[path] = obj
+        return path
+
+    def dumps(self, obj) -> bytes:
+        """Pickles obj, sharing large arrays."""
+        return _dumps(obj, self._persistent_id)
+
+    def loads(self, data: bytes):
+        """Unpickles a result from a worker, replacing shared arrays with
+        the originals.
+        """
+        return _loads(data, self._arrays.__getitem__)
+
+    def close(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+        self._paths.clear()
+        self._arrays.clear()
+
+    def __enter__(self) -> 'SharedArrays':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _attach(path: str) -> np.ndarray:
+    arr = _worker_arrays.get(path)
+    if arr is None:
+        arr = np.load(path, mmap_mode='r')
+        _worker_arrays[path] = arr
+        _worker_paths[_array_key(arr)] = path
+    return arr
+
+
+def _worker_persistent_id(obj) -> Optional[str]:
+    if isinstance(obj, np.ndarray) and obj.dtype != object:
+        return _worker_paths.get(_array_key(obj))
+    return None
+
+
+def _init_worker(blas_threads: Optional[int]):
+    global _worker_limits
+    if blas_threads is not None:
+        _worker_limits = threadpool_limits(blas_threads)
+
+
+def _call(data: bytes) -> bytes:
+    fn, item = _loads(data, _attach)
+    return _dumps(fn(item), _worker_persistent_id)
+
+
+def parallel_imap(fn: Callable, items: Iterable, max_workers: int,
+                  backend: str = 'thread',
+                  blas_threads: Optional[int] = None) -> Iterator:
+    """Yields fn(item) for each item in order, computed in parallel. Each
+    result is yielded as soon as it and all previous results are done,
+    so the caller can process results while later items are computed.
+    The arguments are as for parallel_map().
+    """
+    if max_workers == 1:
+        yield from (fn(item) for item in items)
+        return
+    if backend == 'thread':
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            yield from pool.map(fn, items)
+        return
+    elif backend != 'process':
+        raise ValueError("Unknown backend '{}'.".format(backend))
+
+    if blas_threads is None:
+        blas_threads = max(1, len(os.sched_getaffinity(0)) // max_workers)
+    with SharedArrays() as shared, ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_worker,
+            initargs=(blas_threads,)) as pool:
+        tasks = [shared.dumps((fn, item)) for item in items]
+        for x in pool.map(_call, tasks):
+            yield shared.loads(x)
+
+
+def parallel_map(fn: Callable, items: Iterable, max_workers: int,
+                 backend: str = 'thread',
+                 blas_threads: Optional[int] = None) -> List:
+    """Returns [fn(item) for item in items], computed in parallel.
+
+    Parameters:
+    -----------
+    fn: callable
+        The function to apply. For the process backend, it and its
+        arguments must be picklable, e.g. a module-level function or a
+        functools.partial of one.
+    items: iterable
+        The arguments.
+    max_workers: int
+        The number of threads or processes.
+    backend: str, one of {'thread', 'process'}
+        With 'process', large arrays referenced by fn or items are
+        shared with SharedArrays rather than copied to each task.
+    blas_threads: int, optional
+        The number of BLAS/OpenMP threads in each worker process, to
+        avoid oversubscription. Default is the number of available CPUs
+        divided by max_workers.
+    """
+    return list(parallel_imap(fn, items, max_workers, backend=backend,
+                              blas_threads=blas_threads))
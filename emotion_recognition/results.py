@@ -0,0 +1,139 @@
+"""Dense storage of cross-validation results, which are converted to a
+DataFrame only once all folds are done, and which can be written to
+disk after each fold so that interrupted runs can be resumed.
+"""
+
+import os
+from os import PathLike
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+__all__ = ['ResultsStore']
+
+
+class ResultsStore:
+    """Results of cross-validation in a float64 array indexed by metric,
+    class, rep and fold, together with a mask of which (class, rep,
+    fold) entries are done.
+
+    to_dataframe() gives the usual results layout, a DataFrame with one
+    row per fold and columns indexed by (metric, class, rep).
+
+    Parameters:
+    -----------
+    metrics: sequence of str
+        The metric names.
+    classes: sequence of str
+        The class names.
+    reps: int
+        The number of repetitions.
+    folds: sequence
+        The fold labels, e.g. fold numbers or corpus names.
+    path: pathlike or str, optional
+        If given, results are saved to this .npz file by flush(), and
+        results already saved there are loaded, so that a resumed run
+        can skip completed folds. A ValueError is raised if the saved
+        results have different metrics, classes, reps, folds or run_key.
+    run_key: str
+        Identifies the run, e.g. a fingerprint() of the data, model and
+        cross-validation settings, so that results saved by a different
+        run are not resumed.
+    """
+    def __init__(self, metrics: Sequence[str], classes: Sequence[str],
+                 reps: int, folds: Sequence,
+                 path: Optional[Union[PathLike, str]] = None,
+                 run_key: str = ''):
+        self.metrics = list(metrics)
+        self.classes = list(classes)
+        self.reps = reps
+        self.folds = list(folds)
+        self.path = path
+        self.run_key = run_key
+        self._metric_idx = {m: i for i, m in enumerate(self.metrics)}
+        self._class_idx = {c: i for i, c in enumerate(self.classes)}
+        self._fold_idx = {f: i for i, f in enumerate(self.folds)}
+
+        shape = (len(self.metrics), len(self.classes), reps, len(self.folds))
+        self.values = np.full(shape, np.nan)
+        self.done = np.zeros(shape[1:], dtype=bool)
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def _labels(self) -> Dict[str, np.ndarray]:
+        return {
+            'metrics': np.array(self.metrics, dtype=str),
+            'classes': np.array(self.classes, dtype=str),
+            'folds': np.array([str(f) for f in self.folds], dtype=str),
+            'reps': np.array(self.reps),
+            'run_key': np.array(self.run_key, dtype=str)
+        }
+
+    def _load(self):
+        with np.load(self.path, allow_pickle=False) as data:
+            for k, v in self._labels().items():
+                if k not in data or not np.array_equal(data[k], v):
+                    raise ValueError("Saved results in {} have different {}."
+                                     .format(self.path, k))
+            self.values[:] = data['values']
+            self.done[:] = data['done']
+
+    def _index(self, cls: Optional[str]):
+        return slice(None) if cls is None else self._class_idx[cls]
+
+    def record(self, fold, rep: int, metrics: Dict[str, Any],
+               cls: Optional[str] = None):
+        """Records the metrics of one fold and rep, and marks them done.
+
+        Parameters:
+        -----------
+        fold:
+            The fold label.
+        rep: int
+            The repetition.
+        metrics: dict
+            Metric values by name. Each value is either a scalar, which
+            applies to all classes, or an array with one value per
+            class.
+        cls: str, optional
+            If given, the metrics are for this class only and must be
+            scalars.
+        """
+        c = self._index(cls)
+        f = self._fold_idx[fold]
+        for metric, value in metrics.items():
+            self.values[self._metric_idx[metric], c, rep, f] = value
+        self.done[c, rep, f] = True
+
+    def is_done(self, fold, rep: int, cls: Optional[str] = None) -> bool:
+        """Whether results for the given fold and rep (and class, or all
+        classes) have been recorded.
+        """
+        return bool(np.all(self.done[self._index(cls), rep,
+                                     self._fold_idx[fold]]))
+
+    def flush(self):
+        """Saves the results to path, if given. The file is replaced
+        atomically, so an interruption never leaves it incomplete.
+        """
+        if self.path is None:
+            return
+        tmp = '{}.tmp'.format(self.path)
+        with open(tmp, 'wb') as fid:
+            np.savez(fid, values=self.values, done=self.done,
+                     **self._labels())
+        os.replace(tmp, self.path)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Returns the results as a DataFrame with one row per fold and
+        columns indexed by (metric, class, rep).
+        """
+        columns = pd.MultiIndex.from_product(
+            [self.metrics, self.classes, range(self.reps)],
+            names=['metric', 'class', 'rep']
+        )
+        # (metric, class, rep, fold) -> (fold, metric * class * rep)
+        data = self.values.reshape(-1, len(self.folds)).T
+        return pd.DataFrame(data, index=pd.Index(self.folds),
+                            columns=columns)
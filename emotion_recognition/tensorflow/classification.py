@@ -17,7 +17,9 @@ from tensorflow.keras.optimizers import Adam, Optimizer
 from tensorflow.keras.utils import Sequence
 from tqdm import tqdm
 
+from ..cache import FitCache
 from ..classification import Classifier, ScoreFunction
+from ..normalisation import FoldNormaliser
 from ..utils import batch_arrays, shuffle_multiple
 from .utils import create_tf_dataset_ragged, DataFunction, TFModelFunction
 
@@ -117,30 +119,28 @@ def fit(model: Model,
             print(msg.format(epoch, train_loss, valid_loss, *metric_vals))
 
 
-def tf_train_val_test(model_fn: TFModelFunction,
-                      train_data: tf.data.Dataset,
-                      valid_data: tf.data.Dataset,
-                      test_data: tf.data.Dataset,
-                      scoring: Union[str, List[str],
-                                     Dict[str, ScoreFunction]] = 'accuracy',
-                      **fit_params) -> Dict[str, Union[float, History]]:
-    """Trains on given data, using given validation data, and tests on
-    given test data.
-
-    Returns:
-    --------
-    scores, dict
-        A dictionary with scorer names as keys and scores as values.
+def _fit_predict(model_fn: TFModelFunction,
+                 train_data: tf.data.Dataset,
+                 valid_data: tf.data.Dataset,
+                 test_data: tf.data.Dataset,
+                 **fit_params) -> Tuple[np.ndarray, np.ndarray, Dict]:
+    """Trains a new model and returns the predictions and true labels of
+    the test data, and the training history.
     """
-    scores = {}
     tf.keras.backend.clear_session()
     clf = model_fn()
 
     history = clf.fit(train_data, validation_data=valid_data, **fit_params)
-    scores['history'] = history.history
-
     y_pred = np.argmax(clf.predict(test_data), axis=-1)
     y_true = np.concatenate([x[1] for x in test_data])
+    return y_pred, y_true, history.history
+
+
+def _score_predictions(y_true: np.ndarray, y_pred: np.ndarray,
+                       scoring: Union[str, List[str],
+                                      Dict[str, ScoreFunction]]) \
+        -> Dict[str, float]:
+    scores = {}
     dummy = DummyEstimator(y_pred)
     if isinstance(scoring, str):
         val = get_scorer(scoring)(dummy, None, y_true)
@@ -153,7 +153,35 @@ def tf_train_val_test(model_fn: TFModelFunction,
         for k, v in _scores.items():
             scores['test_' + k] = v
     elif callable(scoring):
-        scores['test_score'] = scoring(dummy, None, y_true)
+        val = scoring(dummy, None, y_true)
+        if isinstance(val, dict):
+            # Multi-metric scorer, e.g. MetricsScorer
+            for k, v in val.items():
+                scores['test_' + k] = v
+        else:
+            scores['test_score'] = val
+    return scores
+
+
+def tf_train_val_test(model_fn: TFModelFunction,
+                      train_data: tf.data.Dataset,
+                      valid_data: tf.data.Dataset,
+                      test_data: tf.data.Dataset,
+                      scoring: Union[str, List[str],
+                                     Dict[str, ScoreFunction]] = 'accuracy',
+                      **fit_params) -> Dict[str, Union[float, History]]:
+    """Trains on given data, using given validation data, and tests on
+    given test data.
+
+    Returns:
+    --------
+    scores, dict
+        A dictionary with scorer names as keys and scores as values.
+    """
+    y_pred, y_true, history = _fit_predict(model_fn, train_data, valid_data,
+                                           test_data, **fit_params)
+    scores = {'history': history}
+    scores.update(_score_predictions(y_true, y_pred, scoring))
     return scores
 
 
@@ -167,7 +195,10 @@ def tf_cross_validate(model_fn: TFModelFunction,
                       data_fn: DataFunction = create_tf_dataset_ragged,
                       sample_weight=None,
                       log_dir: Optional[Path] = None,
-                      fit_params: Dict[str, Any] = {}):
+                      fit_params: Dict[str, Any] = {},
+                      normaliser: Optional[FoldNormaliser] = None,
+                      cache: Optional[FitCache] = None,
+                      cache_key: Any = None):
     """Performs cross-validation on a TensorFlow model. This works with
     both sequence models and single vector models.
 
@@ -198,16 +229,48 @@ def tf_cross_validate(model_fn: TFModelFunction,
     fit_params: dict, optional
         Any keyword arguments to supply to the Keras fit() method.
         Default is no keyword arguments.
+    normaliser: FoldNormaliser, optional
+        If given, the data of each fold is normalised using statistics
+        of that fold's training data only, e.g. from
+        Dataset.fold_normaliser(). x should then be unnormalised.
+    cache: FitCache, optional
+        If given, the predictions and training history of each fold are
+        cached, keyed by the model function, data, fit parameters and
+        fold indices, and folds with cached results are not trained
+        again.
+    cache_key: optional
+        Additional value to distinguish otherwise identical runs in the
+        cache, e.g. the repetition number, since training is not
+        deterministic.
     """
     scores = defaultdict(list)
     n_folds = cv.get_n_splits(x, y, groups)
+    if cache is not None:
+        prefix = cache.key(
+            model_fn, x, y, sample_weight, data_fn, normaliser, cache_key,
+            {k: v for k, v in fit_params.items() if k != 'callbacks'}
+        )
     for fold, (train, test) in enumerate(cv.split(x, y, groups)):
         print("\tFold {}/{}".format(fold + 1, n_folds))
+        if cache is not None:
+            key = cache.key(prefix, train, test)
+            entry = cache.get(key)
+            if entry is not None:
+                print("\tCached")
+                scores['history'].append(entry['history'])
+                _scores = _score_predictions(entry['y_true'],
+                                             entry['y_pred'], scoring)
+                for k in _scores:
+                    scores[k].append(_scores[k])
+                continue
 
         x_train = x[train]
         y_train = y[train]
         x_test = x[test]
         y_test = y[test]
+        if normaliser is not None:
+            x_train = normaliser.transform(x_train, train, train)
+            x_test = normaliser.transform(x_test, test, train)
         if sample_weight is not None:
             sw_train = sample_weight[train]
             sw_test = sample_weight[test]
@@ -229,11 +292,16 @@ def tf_cross_validate(model_fn: TFModelFunction,
             )
 
         fit_params['callbacks'] = callbacks
-        _scores = tf_train_val_test(
+        y_pred, y_true, history = _fit_predict(
             model_fn, train_data=train_data, valid_data=test_data,
-            test_data=test_data, scoring=scoring, **fit_params
+            test_data=test_data, **fit_params
         )
+        if cache is not None:
+            cache.put(key, {'y_pred': y_pred, 'y_true': y_true,
+                            'history': history})
 
+        _scores = {'history': history}
+        _scores.update(_score_predictions(y_true, y_pred, scoring))
         for k in _scores:
             scores[k].append(_scores[k])
     scores = {k: np.array(scores[k]) for k in scores}
@@ -325,6 +393,20 @@ class TFClassifier(Classifier):
         y_true = np.concatenate([x[1] for x in test_data])
         return np.argmax(self.model.predict(test_data), axis=1), y_true
 
+    def fingerprint_state(self) -> Dict[str, Any]:
+        # Callbacks are identified by their scalar settings only, since
+        # they hold references to the model after training.
+        callbacks = [
+            (type(cb), {k: v for k, v in vars(cb).items()
+                        if isinstance(v, (bool, int, float, str))
+                        and k != 'log_dir'})
+            for cb in self.callbacks
+        ]
+        return {'model_fn': self.model_fn, 'n_epochs': self.n_epochs,
+                'class_weight': self.class_weight, 'data_fn': self.data_fn,
+                'callbacks': callbacks, 'loss': self.loss,
+                'optimizer': self.optimizer}
+
 
 class BalancedSparseCategoricalAccuracy(SparseCategoricalAccuracy):
     """Calculates categorical accuracy with class weights inversely
@@ -17,7 +17,7 @@ from tensorflow.keras.layers import (RNN, Conv1D, Dense, Dropout, GRUCell, GRU,
 from tensorflow.keras.models import Model, Sequential
 
 from .layers import Attention1D
-from ..utils import create_tf_dataset
+from ...utils import frame_batches
 
 __all__ = ['zhang2019_model', 'create_windowed_dataset']
 
@@ -27,20 +27,31 @@ def create_windowed_dataset(x: np.ndarray,
                             sample_weight: Optional[np.ndarray] = None,
                             batch_size: int = 64,
                             shuffle: bool = True) -> tf.data.Dataset:
-    """Creates a non-ragged dataset with zero-padding."""
-    arrs = []
-    for seq in x:
-        seq = np.squeeze(seq)
-        arr = np.zeros((500, 640), dtype=np.float32)
-        for i in range(0, min(len(seq), 80000), 160):
-            idx = i // 160
-            maxl = min(len(seq) - i, 640)
-            arr[idx, :maxl] = seq[i:i + 640]
-        arrs.append(arr)
-    arrs = np.array(arrs)
-    assert tuple(arrs.shape) == (len(x), 500, 640)
-    return create_tf_dataset(arrs, y, sample_weight=sample_weight,
-                             batch_size=batch_size, shuffle=shuffle)
+    """Creates a non-ragged dataset of 500 frames of 640 samples, with
+    zero-padding. Frames are generated one batch at a time from strided
+    views of the audio, so the framed dataset is never held in memory.
+    """
+    def gen():
+        order = np.arange(len(x))
+        if shuffle:
+            order = np.random.permutation(len(x))
+        batches = frame_batches(x, frame_size=640, frame_shift=160,
+                                num_frames=500, batch_size=batch_size,
+                                order=order)
+        for start, frames in zip(range(0, len(x), batch_size), batches):
+            idx = order[start:start + batch_size]
+            if sample_weight is None:
+                yield frames, y[idx]
+            else:
+                yield frames, y[idx], sample_weight[idx]
+
+    signature = (tf.TensorSpec((None, 500, 640), tf.float32),
+                 tf.TensorSpec((None,), tf.as_dtype(y.dtype)))
+    if sample_weight is not None:
+        signature += (tf.TensorSpec((None,),
+                                    tf.as_dtype(sample_weight.dtype)),)
+    data = tf.data.Dataset.from_generator(gen, output_signature=signature)
+    return data.prefetch(2)
 
 
 def zhang2019_model(n_classes: int):
@@ -5,6 +5,8 @@ import tensorflow as tf
 from tensorflow.keras.layers import Layer, Wrapper
 from tensorflow.keras.models import Model
 
+from ..utils import RaggedArray
+
 TFModelFunction = Callable[[], Model]
 DataFunction = Callable[[np.ndarray, np.ndarray], tf.data.Dataset]
 
@@ -92,9 +94,10 @@ def create_tf_dataset_ragged(x: np.ndarray,
 
     Args:
     -----
-    x: numpy.ndarray
+    x: RaggedArray or numpy.ndarray
         A 3-D data matrix of shape (n_instances, length[i], n_features)
-        with variable length axis 1.
+        with variable length axis 1. If this is not a RaggedArray it is
+        first converted to one.
     y: numpy.ndarray
         A 1-D array of length n_instances containing numeric class
         labels.
@@ -114,15 +117,15 @@ def create_tf_dataset_ragged(x: np.ndarray,
     def ragged_to_dense_weighted(x: tf.RaggedTensor, y, sample_weight):
         return x.to_tensor(), y, sample_weight
 
+    x = RaggedArray.from_arrays(x)
     # Sort according to length
-    perm = np.argsort([len(a) for a in x])
+    perm = np.argsort(x.lengths, kind='stable')
     x = x[perm]
     y = y[perm]
     if sample_weight is not None:
         sample_weight = sample_weight[perm]
 
-    ragged = tf.RaggedTensor.from_row_lengths(np.concatenate(list(x)),
-                                              [len(a) for a in x])
+    ragged = x.to_tensor()
     if sample_weight is None:
         data = tf.data.Dataset.from_tensor_slices((ragged, y))
     else:
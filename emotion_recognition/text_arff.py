@@ -0,0 +1,161 @@
+"""Streaming parser for text ARFF files with numeric features, such as
+those output by openSMILE.
+"""
+
+import re
+from io import TextIOBase
+from os import PathLike
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+__all__ = ['read_header', 'load']
+
+_ATTR_RE = re.compile(
+    r"""^@attribute\s+('(?:[^'\\]|\\.)*'|"[^"]*"|\S+)\s+(.+)$""",
+    re.IGNORECASE
+)
+
+Attribute = Tuple[str, Union[str, List[str]]]
+
+
+def _unquote(s: str) -> str:
+    s = s.strip()
+    if len(s) >= 2 and s[0] == s[-1] and s[0] in '\'"':
+        return s[1:-1]
+    return s
+
+
+def _parse_header(fid: TextIOBase) -> Tuple[str, List[Attribute]]:
+    """Reads lines up to and including the @data line, returning the
+    relation name and attributes in the same format as liac-arff.
+    """
+    relation = ''
+    attributes = []
+    for line in fid:
+        line = line.strip()
+        if not line or line.startswith('%'):
+            continue
+        keyword = line.split(None, 1)[0].lower()
+        if keyword == '@relation':
+            relation = _unquote(line.split(None, 1)[1])
+        elif keyword == '@attribute':
+            match = _ATTR_RE.match(line)
+            if match is None:
+                raise ValueError("Invalid attribute line: {}".format(line))
+            name, tp = _unquote(match.group(1)), match.group(2).strip()
+            if tp.startswith('{'):
+                tp = [_unquote(x) for x in tp.strip('{}').split(',')]
+            else:
+                tp = tp.upper()
+            attributes.append((name, tp))
+        elif keyword == '@data':
+            return relation, attributes
+    raise ValueError("No @data section found.")
+
+
+def read_header(path: Union[PathLike, str]) -> Tuple[str, List[Attribute]]:
+    """Returns the relation name and attributes of the given ARFF file,
+    without reading the data section.
+    """
+    with open(path) as fid:
+        return _parse_header(fid)
+
+
+def load(path: Union[PathLike, str], chunksize: int = 4096,
+         features: Optional[Sequence[int]] = None) -> dict:
+    """Loads a text ARFF file whose first attribute is the instance
+    name, last attribute is the class label and all other attributes are
+    numeric. The data section is parsed in chunks by the pandas C parser
+    and copied into a float32 matrix that grows geometrically, so only
+    the name and class columns are ever held as Python strings.
+    Consecutive rows with the same name are grouped into one instance as
+    they are read.
+
+    Parameters:
+    -----------
+    path: pathlike or str
+        The path to the ARFF file.
+    chunksize: int
+        The number of rows to parse at a time.
+    features: sequence of int, optional
+        Indices of the features (i.e. attributes excluding the name and
+        class) to load. Other columns are skipped by the parser. Default
+        is to load all features.
+
+    Returns:
+    --------
+    data: dict
+        A dictionary with keys 'relation' and 'attributes' as for
+        liac-arff, 'data', the float32 feature matrix of shape
+        (n_rows, n_features), 'names' and 'labels', str arrays
+        with one value per instance, and 'slices', the number of rows
+        for each instance.
+    """
+    with open(path) as fid:
+        relation, attributes = _parse_header(fid)
+        n_attrs = len(attributes)
+        if any(isinstance(tp, list) or tp not in ('NUMERIC', 'REAL',
+                                                  'INTEGER')
+               for _, tp in attributes[1:-1]):
+            raise ValueError("All attributes except the first and last must "
+                             "be numeric.")
+
+        if features is None:
+            features = np.arange(n_attrs - 2)
+        # usecols returns columns in file order, so reorder afterwards
+        cols, col_order = np.unique(np.asarray(features) + 1,
+                                    return_inverse=True)
+        n_features = len(col_order)
+        dtype = {i: np.float32 for i in cols}
+        dtype.update({0: str, n_attrs - 1: str})
+        reader = pd.read_csv(
+            fid, header=None, names=list(range(n_attrs)), dtype=dtype,
+            usecols=[0] + cols.tolist() + [n_attrs - 1], chunksize=chunksize,
+            quotechar="'", escapechar='\\', skipinitialspace=True,
+            comment='%', na_values=['?'], keep_default_na=False, engine='c'
+        )
+
+        x = np.empty((chunksize, n_features), dtype=np.float32)
+        n_rows = 0
+        names = []
+        labels = []
+        slices = []
+        prev_name = None
+        for chunk in reader:
+            if n_rows + len(chunk) > len(x):
+                new_x = np.empty((max(2 * len(x), n_rows + len(chunk)),
+                                  n_features), dtype=np.float32)
+                new_x[:n_rows] = x[:n_rows]
+                x = new_x
+            x[n_rows:n_rows + len(chunk)] = chunk[cols].to_numpy(
+                dtype=np.float32)[:, col_order]
+            n_rows += len(chunk)
+
+            chunk_names = chunk[0].to_numpy()
+            new = np.empty(len(chunk), dtype=bool)
+            new[0] = chunk_names[0] != prev_name
+            new[1:] = chunk_names[1:] != chunk_names[:-1]
+            starts = np.flatnonzero(new)
+            lengths = np.diff(np.r_[starts, len(chunk)])
+            if not new[0]:
+                # Continues the last instance of the previous chunk
+                slices[-1] += starts[0] if len(starts) > 0 else len(chunk)
+            names.append(chunk_names[starts])
+            labels.append(chunk[n_attrs - 1].to_numpy()[starts])
+            slices.extend(lengths.tolist())
+            prev_name = chunk_names[-1]
+
+    # Shrink the buffer in-place rather than copying
+    x.resize((n_rows, n_features), refcheck=False)
+    return {
+        'relation': relation,
+        'attributes': attributes,
+        'data': x,
+        'names': np.concatenate(names).astype(str) if names else np.empty(
+            0, dtype=str),
+        'labels': np.concatenate(labels).astype(str) if labels else np.empty(
+            0, dtype=str),
+        'slices': np.array(slices, dtype=np.int64)
+    }
@@ -1,9 +1,10 @@
 """Various utility functions for modifying arrays and other things."""
 
-from typing import (Callable, List, Optional, Sequence, Tuple, TypeVar, Union,
-                    overload)
+from typing import (Callable, Iterator, List, Optional, Sequence, Tuple,
+                    TypeVar, Union, overload)
 
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 T1 = TypeVar('T1')
 T2 = TypeVar('T2')
@@ -42,72 +43,451 @@ def ordered_intersect(a: Sequence, b: Sequence) -> List:
     return [x for x in a if x in b]
 
 
-def frame_arrays(arrays: Union[List[np.ndarray], np.ndarray],
+class RaggedArray:
+    """A sequence of variable-length arrays stored as a single
+    contiguous buffer along with an array of offsets into that buffer.
+    Instance i is `flat[offsets[i]:offsets[i + 1]]`, and axis 0 of each
+    instance is assumed to be time.
+
+    Indexing with an integer returns a view of that instance, indexing
+    with a slice returns a RaggedArray sharing the same buffer, and
+    indexing with an integer array or boolean mask returns a new
+    RaggedArray with the selected instances gathered into a new buffer.
+
+    Parameters:
+    -----------
+    flat: ndarray
+        The concatenated arrays, of shape (total_length, ...).
+    offsets: ndarray
+        1-D array of length n_instances + 1 giving the start of each
+        instance in flat, with offsets[-1] == len(flat).
+    """
+    def __init__(self, flat: np.ndarray, offsets: np.ndarray):
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if offsets.ndim != 1 or len(offsets) == 0:
+            raise ValueError("offsets must be a non-empty 1-D array.")
+        if offsets[0] != 0 or offsets[-1] != len(flat):
+            raise ValueError("offsets must start at 0 and end at len(flat).")
+        self._flat = flat
+        self._offsets = offsets
+
+    @classmethod
+    def from_lengths(cls, flat: np.ndarray,
+                     lengths: Sequence[int]) -> 'RaggedArray':
+        """Creates a RaggedArray from a flat buffer and the length of
+        each instance.
+        """
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(flat, offsets)
+
+    @classmethod
+    def from_arrays(cls, arrays: Sequence[np.ndarray],
+                    dtype=None) -> 'RaggedArray':
+        """Creates a RaggedArray by concatenating the given arrays."""
+        if isinstance(arrays, RaggedArray):
+            return arrays
+        lengths = [len(x) for x in arrays]
+        flat = np.concatenate(arrays)
+        if dtype is not None:
+            flat = flat.astype(dtype, copy=False)
+        return cls.from_lengths(flat, lengths)
+
+    @classmethod
+    def concatenate(cls, arrays: Sequence['RaggedArray']) -> 'RaggedArray':
+        """Concatenates multiple RaggedArrays into one."""
+        flat = np.concatenate([x.flat for x in arrays])
+        lengths = np.concatenate([x.lengths for x in arrays])
+        return cls.from_lengths(flat, lengths)
+
+    @property
+    def flat(self) -> np.ndarray:
+        """The contiguous buffer of concatenated arrays."""
+        return self._flat
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """Offsets into the flat buffer, of length n_instances + 1."""
+        return self._offsets
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """The length of each instance."""
+        return np.diff(self._offsets)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._flat.dtype
+
+    @property
+    def feature_shape(self) -> Tuple[int, ...]:
+        """The shape of each instance excluding axis 0."""
+        return self._flat.shape[1:]
+
+    def with_flat(self, flat: np.ndarray) -> 'RaggedArray':
+        """Returns a RaggedArray with the same offsets but a different
+        flat buffer, e.g. one that has been transformed elementwise.
+        """
+        return RaggedArray(flat, self._offsets)
+
+    def frame_indices(self, idx: Optional[np.ndarray] = None) -> np.ndarray:
+        """Returns the indices into the flat buffer of every element of
+        the given instances, in order.
+        """
+        if idx is None:
+            return np.arange(len(self._flat))
+        lengths = self.lengths[idx]
+        starts = np.zeros(len(idx), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        return (np.repeat(self._offsets[:-1][idx] - starts, lengths)
+                + np.arange(lengths.sum()))
+
+    def to_tensor(self):
+        """Returns a tf.RaggedTensor sharing this array's row splits."""
+        import tensorflow as tf
+
+        return tf.RaggedTensor.from_row_splits(self._flat, self._offsets)
+
+    def __getitem__(self, idx) -> Union[np.ndarray, 'RaggedArray']:
+        if np.isscalar(idx) and np.issubdtype(type(idx), np.integer):
+            if idx < 0:
+                idx += len(self)
+            if not 0 <= idx < len(self):
+                raise IndexError("Index {} out of bounds.".format(idx))
+            return self._flat[self._offsets[idx]:self._offsets[idx + 1]]
+        if isinstance(idx, slice) and idx.step in (None, 1):
+            start, stop, _ = idx.indices(len(self))
+            stop = max(start, stop)
+            offsets = self._offsets[start:stop + 1]
+            return RaggedArray(self._flat[offsets[0]:offsets[-1]],
+                               offsets - offsets[0])
+        if isinstance(idx, slice):
+            idx = np.arange(len(self))[idx]
+        idx = np.asarray(idx)
+        if idx.dtype == bool:
+            idx = np.flatnonzero(idx)
+        idx = idx.astype(np.int64, copy=False)
+        flat = self._flat[self.frame_indices(idx)]
+        return RaggedArray.from_lengths(flat, self.lengths[idx])
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        arr = np.empty(len(self), dtype=object)
+        for i, x in enumerate(self):
+            arr[i] = x
+        return arr
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._flat[self._offsets[i]:self._offsets[i + 1]]
+
+    def __repr__(self) -> str:
+        return 'RaggedArray(n_instances={}, feature_shape={}, dtype={})' \
+            .format(len(self), self.feature_shape, self.dtype)
+
+
+def _frame_into(out: np.ndarray, seq: np.ndarray, frame_shift: int):
+    """Writes the frames of the 1-D signal seq into out, of shape
+    (num_frames, frame_size). Frames that lie wholly within seq are
+    copied from a strided view of seq; the remaining frames are taken
+    from a small zero-padded copy of the tail of seq.
+    """
+    num_frames, frame_size = out.shape
+    n_full = 0
+    if len(seq) >= frame_size:
+        n_full = min(num_frames, (len(seq) - frame_size) // frame_shift + 1)
+        out[:n_full] = sliding_window_view(
+            seq[:(n_full - 1) * frame_shift + frame_size],
+            frame_size)[::frame_shift]
+    if n_full == num_frames:
+        return
+    start = n_full * frame_shift
+    tail = np.zeros((num_frames - n_full - 1) * frame_shift + frame_size,
+                    dtype=out.dtype)
+    rest = seq[start:start + len(tail)]
+    tail[:len(rest)] = rest
+    out[n_full:] = sliding_window_view(tail, frame_size)[::frame_shift]
+
+
+def _frame_params(arrays: Union[List[np.ndarray], np.ndarray,
+                                RaggedArray],
+                  frame_size: int, frame_shift: int,
+                  num_frames: Optional[int]) -> int:
+    if num_frames is None:
+        max_len = max(len(x) for x in arrays)
+        num_frames = (max_len - frame_size) // frame_shift + 1
+    return num_frames
+
+
+def frame_batches(arrays: Union[List[np.ndarray], np.ndarray, RaggedArray],
+                  frame_size: int = 640, frame_shift: int = 160,
+                  num_frames: Optional[int] = None, batch_size: int = 64,
+                  order: Optional[np.ndarray] = None) \
+        -> Iterator[np.ndarray]:
+    """Generates batches of framed signals, without framing the whole
+    dataset at once. Each batch is an array of shape (batch_size,
+    num_frames, frame_size) with the same contents as the corresponding
+    slice of the output of frame_arrays(), and is only allocated when
+    it is requested.
+
+    Args:
+    -----
+    arrays: list of ndarray, or RaggedArray
+        The 1-D or L x 1 time domain signals.
+    frame_size: int
+        The number of samples in each frame.
+    frame_shift: int
+        The number of samples between the start of consecutive frames.
+    num_frames: int, optional
+        The number of frames per signal. Signals are truncated or
+        zero-padded as needed. Default is the number of whole frames in
+        the longest signal.
+    batch_size: int
+        The number of signals per batch.
+    order: ndarray, optional
+        The order in which to take signals, e.g. a random permutation.
+        Default is the given order.
+    """
+    num_frames = _frame_params(arrays, frame_size, frame_shift, num_frames)
+    if order is None:
+        order = np.arange(len(arrays))
+    for b in range(0, len(order), batch_size):
+        idx = order[b:b + batch_size]
+        buf = np.empty((len(idx), num_frames, frame_size), dtype=np.float32)
+        for j, i in enumerate(idx):
+            _frame_into(buf[j], np.reshape(arrays[i], -1), frame_shift)
+        yield buf
+
+
+def frame_arrays(arrays: Union[List[np.ndarray], np.ndarray, RaggedArray],
                  frame_size: int = 640, frame_shift: int = 160,
                  num_frames: Optional[int] = None):
     """Creates sequences of frames from the given arrays. Each input
     array is a 1-D or L x 1 time domain signal. Each corresponding
     output array is a 2-D array of frames of shape (num_frames,
-    frame_size).
+    frame_size). Frames are copied from strided views of each signal,
+    so use frame_batches() to avoid framing all signals at once.
     """
     # TODO: Make option for vlen output
-    if num_frames is None:
-        max_len = max(len(x) for x in arrays)
-        num_frames = (max_len - frame_size) // frame_shift + 1
-
-    arrs = []
-    for seq in arrays:
-        seq = np.squeeze(seq)
-        arr = np.zeros((num_frames, frame_size), dtype=np.float32)
-        for i in range(0, len(seq), frame_shift):
-            idx = i // frame_shift
-            if idx >= num_frames:
-                break
-            maxl = min(len(seq) - i, frame_size)
-            arr[idx, :maxl] = seq[i:i + frame_size]
-        arrs.append(arr)
-    arrs = np.array(arrs)
-    assert tuple(arrs.shape) == (len(arrays), num_frames, frame_size)
+    num_frames = _frame_params(arrays, frame_size, frame_shift, num_frames)
+    arrs = np.empty((len(arrays), num_frames, frame_size), dtype=np.float32)
+    for i, seq in enumerate(arrays):
+        _frame_into(arrs[i], np.reshape(seq, -1), frame_shift)
     return arrs
 
 
-def pad_arrays(arrays: Union[List[np.ndarray], np.ndarray], pad: int = 32):
+def _like_arrays(arrays: Union[List[np.ndarray], np.ndarray],
+                 ragged: RaggedArray) -> Union[List[np.ndarray], np.ndarray]:
+    """Returns the instances of ragged as the same kind of sequence as
+    arrays, i.e. a list or an object array.
+    """
+    if isinstance(arrays, np.ndarray):
+        return np.asarray(ragged)
+    return list(ragged)
+
+
+def bucket_boundaries(lengths: np.ndarray, pad: Optional[int] = None,
+                      n_buckets: Optional[int] = None) -> np.ndarray:
+    """Returns the sorted padded length of each bucket, for sequences of
+    the given lengths.
+
+    Args:
+    -----
+    lengths: ndarray
+        The length of each sequence.
+    pad: int, optional
+        If given, lengths are rounded up to a multiple of pad.
+    n_buckets: int, optional
+        If given (and pad is not), bucket boundaries are quantiles of
+        lengths, so that buckets hold roughly equal numbers of sequences.
+        Otherwise there is one bucket per unique length.
+    """
+    lengths = np.asarray(lengths)
+    if pad is not None:
+        return np.unique(-(-lengths // pad) * pad)
+    if n_buckets is not None:
+        q = np.linspace(0, 1, n_buckets + 1)[1:]
+        return np.unique(np.quantile(lengths, q, method='higher'))
+    return np.unique(lengths)
+
+
+def pad_instances(arrays: RaggedArray, idx: np.ndarray,
+                  length: int) -> np.ndarray:
+    """Returns a zero-padded array of shape (len(idx), length, ...) of
+    the given instances, which are truncated if longer than length. The
+    array is filled with a single scatter from the flat buffer.
+    """
+    lengths = np.minimum(arrays.lengths[idx], length)
+    out = np.zeros((len(idx), length) + arrays.feature_shape,
+                   dtype=arrays.dtype)
+    rows = np.repeat(np.arange(len(idx)), lengths)
+    cols = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths,
+                                                lengths)
+    out[rows, cols] = arrays.flat[np.repeat(arrays.offsets[:-1][idx], lengths)
+                                  + cols]
+    return out
+
+
+def length_mask(lengths: np.ndarray, length: int) -> np.ndarray:
+    """Returns a boolean mask of shape (len(lengths), length) which is
+    True for the valid (non-padding) timesteps of each sequence.
+    """
+    return np.arange(length) < np.asarray(lengths)[:, np.newaxis]
+
+
+def bucket_batches(arrays: Union[List[np.ndarray], np.ndarray, RaggedArray],
+                   y: Optional[np.ndarray] = None,
+                   batch_size: int = 32,
+                   pad: Optional[int] = None,
+                   n_buckets: Optional[int] = None,
+                   max_length: Optional[int] = None,
+                   shuffle: bool = True,
+                   uniform_batch_size: bool = False) \
+        -> Tuple[List[np.ndarray], Optional[List[np.ndarray]],
+                 List[np.ndarray]]:
+    """Groups variable length sequences into buckets of similar length
+    and returns zero-padded batches from each bucket. Each bucket is
+    filled with a single vectorised scatter from the flat buffer of all
+    sequences, and batches are views of it.
+
+    Args:
+    -----
+    arrays: RaggedArray or list of ndarray
+        The sequences to batch. Axis 0 of each sequence is time.
+    y: ndarray, optional
+        Labels for each sequence, batched in the same way.
+    batch_size: int
+        The maximum number of sequences in each batch.
+    pad: int, optional
+        Quantise bucket lengths to a multiple of pad. See
+        bucket_boundaries().
+    n_buckets: int, optional
+        Use this many buckets with boundaries at quantiles of the
+        lengths. See bucket_boundaries().
+    max_length: int, optional
+        Sequences longer than this are truncated.
+    shuffle: bool, default = True
+        Whether to shuffle the order of sequences within each bucket.
+    uniform_batch_size: bool, default = False
+        Whether to zero-pad the last batch in each bucket to batch_size.
+
+    Returns:
+    --------
+    x_batches: list of ndarray
+        The padded batches, each of shape (n, length, ...).
+    y_batches: list of ndarray, or None
+        The labels for each batch, if y was given.
+    length_batches: list of ndarray
+        The unpadded length of each sequence in each batch, which can be
+        used with length_mask() to create a mask for each batch.
+    """
+    arrays = RaggedArray.from_arrays(arrays)
+    lengths = arrays.lengths
+    if max_length is not None:
+        lengths = np.minimum(lengths, max_length)
+    boundaries = bucket_boundaries(lengths, pad=pad, n_buckets=n_buckets)
+    buckets = np.digitize(lengths, boundaries, right=True)
+
+    order = np.arange(len(arrays))
+    if shuffle:
+        order = np.random.permutation(len(arrays))
+    order = order[np.argsort(buckets[order], kind='stable')]
+    starts = np.searchsorted(buckets[order], np.arange(len(boundaries) + 1))
+
+    x_batches = []
+    y_batches = [] if y is not None else None
+    length_batches = []
+    for b, length in enumerate(boundaries):
+        idx = order[starts[b]:starts[b + 1]]
+        if len(idx) == 0:
+            continue
+        size = len(idx)
+        if uniform_batch_size:
+            size = -(-size // batch_size) * batch_size
+        bucket_x = np.zeros((size, length) + arrays.feature_shape,
+                            dtype=arrays.dtype)
+        bucket_x[:len(idx)] = pad_instances(arrays, idx, length)
+        bucket_len = np.zeros(size, dtype=np.int64)
+        bucket_len[:len(idx)] = lengths[idx]
+        if y is not None:
+            bucket_y = np.zeros(size, dtype=y.dtype)
+            bucket_y[:len(idx)] = y[idx]
+        for i in range(0, size, batch_size):
+            x_batches.append(bucket_x[i:i + batch_size])
+            length_batches.append(bucket_len[i:i + batch_size])
+            if y is not None:
+                y_batches.append(bucket_y[i:i + batch_size])
+    return x_batches, y_batches, length_batches
+
+
+def pad_arrays(arrays: Union[List[np.ndarray], np.ndarray, RaggedArray],
+               pad: int = 32):
     """Pads each array to the nearest multiple of `pad` greater than the
     array size. Assumes axis 0 of each sub-array, or axis 1 of x is
     time.
 
-    NOTE: This function modifies the arrays in-place.
+    A new array (or list) is returned; the input arrays are not
+    modified.
     """
-    if isinstance(arrays, np.ndarray) and len(arrays.shape) > 1:
+    if isinstance(arrays, np.ndarray) and arrays.dtype != object:
         # Pad axis 1
         padding = int(np.ceil(arrays.shape[1] / pad)) * pad - arrays.shape[1]
         extra_dims = tuple((0, 0) for _ in arrays.shape[2:])
-        arrays = np.pad(arrays, ((0, 0), (0, padding)) + extra_dims)
-    else:
-        for i in range(len(arrays)):
-            x = arrays[i]
-            padding = int(np.ceil(x.shape[0] / pad)) * pad - x.shape[0]
-            arrays[i] = np.pad(x, ((0, padding), (0, 0)))
-    return arrays
-
-
-def clip_arrays(arrays: Union[List[np.ndarray], np.ndarray], length: int):
+        return np.pad(arrays, ((0, 0), (0, padding)) + extra_dims)
+
+    ragged = RaggedArray.from_arrays(arrays)
+    lengths = ragged.lengths
+    new_lengths = -(-lengths // pad) * pad
+    padded = RaggedArray.from_lengths(
+        np.zeros((new_lengths.sum(),) + ragged.feature_shape,
+                 dtype=ragged.dtype),
+        new_lengths
+    )
+    dest = np.repeat(padded.offsets[:-1], lengths) + (
+        np.arange(lengths.sum()) - np.repeat(ragged.offsets[:-1], lengths))
+    padded.flat[dest] = ragged.flat
+    if isinstance(arrays, RaggedArray):
+        return padded
+    return _like_arrays(arrays, padded)
+
+
+def clip_arrays(arrays: Union[List[np.ndarray], np.ndarray, RaggedArray],
+                length: int):
     """Clips each array to the specified maximum length.
 
-    NOTE: This function modifies the arrays in-place.
+    A new array (or list) is returned; the input arrays are not
+    modified.
     """
-    for i in range(len(arrays)):
-        arrays[i] = np.copy(arrays[i][:length])
-    assert all(len(x) <= length for x in arrays)
-    return arrays
+    if isinstance(arrays, np.ndarray) and arrays.dtype != object:
+        return arrays[:, :length].copy()
+
+    ragged = RaggedArray.from_arrays(arrays)
+    lengths = np.minimum(ragged.lengths, length)
+    src = np.repeat(ragged.offsets[:-1], lengths) + (
+        np.arange(lengths.sum())
+        - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    )
+    clipped = RaggedArray.from_lengths(ragged.flat[src], lengths)
+    if isinstance(arrays, RaggedArray):
+        return clipped
+    return _like_arrays(arrays, clipped)
 
 
 def transpose_time(arrays: Union[List[np.ndarray], np.ndarray]):
     """Transpose the time and feature axis of each array. Requires each
     array be 2-D.
 
-    NOTE: This function modifies the arrays in-place.
+    NOTE: This function modifies the arrays in-place, unless they are a
+    RaggedArray, in which case an object array of transposed views is
+    returned, since the transposed arrays vary in length along axis 1.
     """
+    if isinstance(arrays, RaggedArray):
+        transposed = np.empty(len(arrays), dtype=object)
+        for i, x in enumerate(arrays):
+            transposed[i] = x.transpose()
+        return transposed
     if isinstance(arrays, np.ndarray) and len(arrays.shape) == 3:
         arrays = arrays.transpose(0, 2, 1)
     else:
@@ -142,7 +522,8 @@ def shuffle_multiple(*arrays, numpy_indexing: bool = True):
     return new_arrays
 
 
-def batch_arrays(arrays_x: List[np.ndarray], y: np.ndarray,
+def batch_arrays(arrays_x: Union[List[np.ndarray], RaggedArray],
+                 y: np.ndarray,
                  batch_size: int = 32, shuffle: bool = True,
                  uniform_batch_size: bool = False) \
         -> Tuple[np.ndarray, np.ndarray]:
@@ -151,7 +532,8 @@ def batch_arrays(arrays_x: List[np.ndarray], y: np.ndarray,
     batch will have a maximum of batch_size arrays, but may have less if
     there are fewer arrays of the same length. It is recommended to use
     the pad_arrays() method of the LabelledDataset instance before using
-    this function, in order to quantise the lengths.
+    this function, in order to quantise the lengths, or to use
+    bucket_batches() directly.
 
     Parameters:
     -----
@@ -182,29 +564,13 @@ def batch_arrays(arrays_x: List[np.ndarray], y: np.ndarray,
         The batched labels corresponding to sequences in x_list.
         y_list[i] has the same length as x_list[i].
     """
-    if shuffle:
-        arrays_x, y = shuffle_multiple(arrays_x, y, numpy_indexing=False)
-
-    fixed_shape = arrays_x[0].shape[1:]
-    lengths = [x.shape[0] for x in arrays_x]
-    unique_len = np.unique(lengths)
-    x_dtype = arrays_x[0].dtype
-    y_dtype = y.dtype
-
-    x_list = []
-    y_list = []
-    for length in unique_len:
-        idx = np.nonzero(lengths == length)[0]
-        for b in range(0, len(idx), batch_size):
-            batch_idx = idx[b:b + batch_size]
-            size = batch_size if uniform_batch_size else len(batch_idx)
-            _x = np.zeros((size, length) + fixed_shape, dtype=x_dtype)
-            _y = np.zeros(size, dtype=y_dtype)
-            _y[:size] = y[batch_idx]
-            for i, j in enumerate(batch_idx):
-                _x[i, ...] = arrays_x[j]
-            x_list.append(_x)
-            y_list.append(_y)
-    x_list = np.array(x_list, dtype=object)
-    y_list = np.array(y_list, dtype=y_dtype if uniform_batch_size else object)
+    x_list, y_list, _ = bucket_batches(
+        arrays_x, y, batch_size=batch_size, shuffle=shuffle,
+        uniform_batch_size=uniform_batch_size
+    )
+    x_list = np.array(x_list + [None], dtype=object)[:-1]
+    if uniform_batch_size:
+        y_list = np.array(y_list, dtype=y.dtype)
+    else:
+        y_list = np.array(y_list + [None], dtype=object)[:-1]
     return x_list, y_list
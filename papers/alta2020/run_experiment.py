@@ -10,8 +10,10 @@ from typing import Optional
 import numpy as np
 import pandas as pd
 import tensorflow as tf
-from emotion_recognition.classification import PrecomputedSVC
+from emotion_recognition.classification import (PrecomputedSVC,
+                                                SVMPathSearchCV)
 from emotion_recognition.dataset import LabelledDataset
+from emotion_recognition.metrics import MetricsScorer
 from emotion_recognition.tensorflow.classification import tf_cross_validate
 from emotion_recognition.tensorflow.models import (aldeneh2017_model,
                                                    latif2019_model,
@@ -20,10 +22,8 @@ from emotion_recognition.tensorflow.models import (aldeneh2017_model,
 from emotion_recognition.tensorflow.models.zhang2019 import \
     create_windowed_dataset
 from emotion_recognition.tensorflow.utils import create_tf_dataset_ragged
-from sklearn.metrics import (get_scorer, make_scorer, precision_score,
-                             recall_score)
-from sklearn.model_selection import (GridSearchCV, GroupKFold,
-                                     LeaveOneGroupOut, cross_validate)
+from sklearn.model_selection import (GroupKFold, LeaveOneGroupOut,
+                                     cross_validate)
 from sklearn.preprocessing import StandardScaler
 from tensorflow.keras import Model
 from tensorflow.keras.optimizers import Adam
@@ -71,30 +71,31 @@ def test_classifier(kind: str,
     df = pd.DataFrame(index=pd.RangeIndex(1, reps + 1, name='rep'),
                       columns=metrics + ['params'])
 
-    scoring = {'war': get_scorer('accuracy'),
-               'uar': get_scorer('balanced_accuracy')}
-    for i, c in enumerate(dataset.classes):
-        scoring.update({
-            c + '_rec': make_scorer(recall_score, average=None, labels=[i]),
-            c + '_prec': make_scorer(precision_score, average=None, labels=[i])
-        })
+    scoring = MetricsScorer(dataset.classes)
 
+    kernel_cache = None
     for rep in range(1, reps + 1):
         print("Rep {}".format(rep))
         if kind == 'svm':
             fit_params = dict(sample_weight=sample_weight)
             param_grid = {'C': 2.0**np.arange(-6, 7, 2), 'kernel': ['rbf'],
                           'gamma': 2.0**np.arange(-12, -1, 2)}
-            clf = GridSearchCV(PrecomputedSVC(), param_grid, cv=splitter,
-                               scoring='balanced_accuracy', n_jobs=-1)
+            if kernel_cache is None:
+                # Kernel values are shared by all folds, grid points and reps
+                kernel_cache = dataset.kernel_cache()
+                kernel_cache.precompute(param_grid['kernel'])
+            x = kernel_cache.indices()
+            clf = SVMPathSearchCV(PrecomputedSVC(kernel_cache=kernel_cache),
+                                  param_grid, cv=splitter,
+                                  scoring='balanced_accuracy', n_jobs=-1)
             clf.fit(
-                dataset.x, dataset.y, groups=dataset.speaker_group_indices,
+                x, dataset.y, groups=dataset.speaker_group_indices,
                 sample_weight=sample_weight
             )
             params = clf.best_params_
             clf = clf.best_estimator_
             scores = cross_validate(
-                clf, dataset.x, dataset.y, cv=splitter, scoring=scoring,
+                clf, x, dataset.y, cv=splitter, scoring=scoring,
                 groups=dataset.speaker_group_indices,
                 fit_params=fit_params, n_jobs=-1, verbose=int(verbose)
             )
@@ -179,6 +180,8 @@ def main():
 
     # Misc. options
     parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--cache_dir', type=Path,
+                        help="Directory to cache parsed datasets in.")
     parser.add_argument('--logs', type=Path,
                         help="Folder to write training logs per fold.")
 
@@ -196,7 +199,7 @@ def main():
     for gpu in tf.config.list_physical_devices('GPU'):
         tf.config.experimental.set_memory_growth(gpu, True)
 
-    dataset = LabelledDataset(args.data)
+    dataset = LabelledDataset(args.data, cache_dir=args.cache_dir)
     dataset.normalise(normaliser=StandardScaler(), scheme='speaker')
     if args.pad:
         dataset.pad_arrays(args.pad)
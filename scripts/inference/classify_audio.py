@@ -18,9 +18,11 @@ def main():
                         help="Pickled model.")
     parser.add_argument('--output', type=Path, required=True,
                         help="Output.")
+    parser.add_argument('--cache_dir', type=Path,
+                        help="Directory to cache parsed datasets in.")
     args = parser.parse_args()
 
-    dataset = Dataset(args.input)
+    dataset = Dataset(args.input, cache_dir=args.cache_dir)
     names = np.array(dataset.names)
     dataset.normalise()
     with open(args.model, 'rb') as fid:
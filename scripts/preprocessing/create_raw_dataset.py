@@ -1,12 +1,12 @@
 """Creates a NetCDF dataset containing the raw audio and labels."""
 
 import argparse
-import sys
+import os
 from pathlib import Path
 
 import numpy as np
-import soundfile
-from emotion_recognition.dataset import get_audio_paths, write_netcdf_dataset
+from emotion_recognition.dataset import (get_audio_paths, read_audio_files,
+                                         write_netcdf_dataset)
 
 
 def main():
@@ -15,23 +15,19 @@ def main():
     parser.add_argument('--corpus', type=str, required=True)
     parser.add_argument('--annotations', type=Path, required=True)
     parser.add_argument('--output', type=Path, required=True)
+    parser.add_argument('--sample_rate', type=int, default=16000,
+                        help="Resample audio to this sample rate.")
+    parser.add_argument('--workers', type=int,
+                        default=len(os.sched_getaffinity(0)),
+                        help="Number of threads to decode audio with.")
     args = parser.parse_args()
 
     filenames = get_audio_paths(args.input)
 
     print("Processing {} audio files.".format(len(filenames)))
-    audio_arr = []
-    for filename in filenames:
-        audio, sr = soundfile.read(filename, always_2d=True, dtype=np.float32)
-        if sr != 16000:
-            sys.stderr.write(
-                "Sample rate of {} != 16000, skipping.\n".format(filename))
-            continue
-        audio = np.mean(audio, axis=1)
-        audio = np.expand_dims(audio, axis=1)
-        audio_arr.append(audio)
-    slices = [len(x) for x in audio_arr]
-    audio_arr = np.concatenate(audio_arr)
+    audio = read_audio_files(filenames, sample_rate=args.sample_rate,
+                             mono=True, workers=args.workers, progress=True)
+    slices = audio.lengths
     print("Num samples:")
     print("\ttotal: {}".format(sum(slices)))
     print("\tmin: {}".format(min(slices)))
@@ -42,7 +38,7 @@ def main():
     names = [f.stem for f in filenames]
     write_netcdf_dataset(
         args.output, corpus=args.corpus, names=names, slices=slices,
-        features=audio_arr, annotation_path=args.annotations
+        features=audio.flat, annotation_path=args.annotations
     )
     print("Wrote NetCDF4 dataset to {}.".format(args.output))
 
@@ -13,7 +13,7 @@ import tensorflow as tf
 import tensorflow_io as tfio
 from matplotlib import pyplot as plt
 
-from emotion_recognition.dataset import (corpora, write_netcdf_dataset,
+from emotion_recognition.dataset import (NetCDFWriter, corpora,
                                          parse_classification_annotations)
 
 
@@ -213,6 +213,8 @@ def main():
                         help="Output to NetCDF4 format.")
     parser.add_argument('--audeep', type=Path,
                         help="Output to NetCDF4 in audeep format.")
+    parser.add_argument('--compress', action='store_true',
+                        help="Compress the NetCDF4 output with zlib.")
 
     parser.add_argument('--length', type=float, default=5,
                         help="Seconds of audio clip to take or pad.")
@@ -269,45 +271,54 @@ def main():
         raise ValueError(
             "Must specify either --preview, --netcdf or --audeep options.")
 
+    labels = None
     if args.labels:
         if not args.corpus:
             raise ValueError(
                 "--corpus must be provided if labels are provided.")
         labels = parse_classification_annotations(args.labels)
 
+    filenames = [x.stem for x in paths]
+    writer = None
+    if args.netcdf is not None:
+        # Spectrograms are streamed to the netCDF file batch by batch
+        args.netcdf.parent.mkdir(parents=True, exist_ok=True)
+        writer = NetCDFWriter(
+            args.netcdf, args.mel_bands, corpus=args.corpus,
+            annotation_path=args.labels, zlib=args.compress
+        )
+
     print("Processing spectrograms:")
     start_time = time.perf_counter()
     dataset, sample_rate = get_batched_audio(args.input, args.batch_size)
     specs = []
+    n_specs = 0
     for x in dataset:
-        specs.append(calculate_spectrogram(
+        spec = calculate_spectrogram(
             x, sample_rate, channels=args.channels, skip=args.skip,
             length=args.length, window_size=args.window_size,
             pre_emphasis=args.pre_emphasis, window_shift=args.window_shift,
             n_mels=args.mel_bands, clip=args.clip
-        ))
-    with tf.device('/device:cpu:0'):
-        specs = tf.concat(specs, 0)
-    spectrograms = specs.numpy()
+        ).numpy()
+        if writer is not None:
+            writer.append(filenames[n_specs:n_specs + len(spec)], spec)
+        if args.audeep is not None:
+            specs.append(spec)
+        n_specs += len(spec)
     print("Processed {} spectrograms in {:.4f}s".format(
-        len(spectrograms), time.perf_counter() - start_time))
+        n_specs, time.perf_counter() - start_time))
+
+    if writer is not None:
+        writer.close()
+        print("Wrote netCDF dataset to {}.".format(args.netcdf))
 
-    filenames = [x.stem for x in paths]
     if args.audeep is not None:
+        spectrograms = np.concatenate(specs)
         write_audeep_dataset(args.audeep, spectrograms, filenames,
                              args.mel_bands, labels, args.corpus)
 
         print("Wrote netCDF dataset to {}.".format(args.audeep))
 
-    if args.netcdf is not None:
-        slices = [spectrograms.shape[1] for _ in range(len(spectrograms))]
-        spectrograms = np.concatenate(spectrograms)
-        write_netcdf_dataset(
-            args.netcdf, corpus=args.corpus, names=filenames, slices=slices,
-            features=spectrograms, annotation_path=args.labels)
-
-        print("Wrote netCDF dataset to {}.".format(args.netcdf))
-
 
 if __name__ == "__main__":
     main()
@@ -9,7 +9,7 @@ from typing import List, Union
 
 import numpy as np
 import pandas as pd
-from emotion_recognition.dataset import get_audio_paths, write_netcdf_dataset
+from emotion_recognition.dataset import NetCDFWriter, get_audio_paths
 from joblib import Parallel, delayed
 
 if sys.platform == 'win32':
@@ -45,7 +45,7 @@ def opensmile(path: Union[str, Path], config: Union[str, Path],
 
 def process_csv(path: Union[str, Path]):
     df = pd.read_csv(path, quotechar="'", header=None)
-    return df.iloc[:, 1:]
+    return df.iloc[:, 1:].to_numpy(dtype=np.float32)
 
 
 def main():
@@ -70,6 +70,10 @@ def main():
     parser.add_argument('--type', default='classification',
                         help="Type of annotations")
     parser.add_argument('--annotations', type=Path, help="Annotations file")
+    parser.add_argument('--batch_size', type=int, default=1000,
+                        help="Number of files to parse and write at a time")
+    parser.add_argument('--compress', action='store_true',
+                        help="Compress the output with zlib")
 
     args, restargs = parser.parse_known_args()
 
@@ -97,22 +101,26 @@ def main():
             msg = "Not all audio files were processed properly. These files " \
                   "are missing:\n" + '\n'.join(map(str, missing))
             raise RuntimeError(msg)
-        # Use CPUs for this because I don't think it releases the GIL
-        # for the whole processing.
-        arr_list = Parallel(**parallel_args)(
-            delayed(process_csv)(path) for path in tmp_files
-        )
-
-    # This should be a 2D array
-    full_array = np.concatenate(arr_list, axis=0)
-    assert len(full_array.shape) == 2
-
-    args.output.parent.mkdir(parents=True, exist_ok=True)
-    write_netcdf_dataset(
-        args.output, corpus=args.corpus, names=names, features=full_array,
-        slices=[x.shape[0] for x in arr_list],
-        annotation_path=args.annotations, annotation_type=args.type
-    )
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        n_features = process_csv(tmp_files[0]).shape[1]
+        with NetCDFWriter(args.output, n_features, corpus=args.corpus,
+                          annotation_path=args.annotations,
+                          annotation_type=args.type,
+                          zlib=args.compress) as writer:
+            # Parse and append in batches so that only one batch of
+            # features is in memory at a time. Use processes for parsing
+            # because I don't think it releases the GIL for the whole
+            # processing.
+            for i in range(0, len(tmp_files), args.batch_size):
+                arr_list = Parallel(**parallel_args)(
+                    delayed(process_csv)(path)
+                    for path in tmp_files[i:i + args.batch_size]
+                )
+                writer.append(
+                    names[i:i + args.batch_size],
+                    np.concatenate(arr_list, axis=0),
+                    slices=[x.shape[0] for x in arr_list]
+                )
 
     print("Wrote netCDF dataset to {}".format(args.output))
 
@@ -22,6 +22,7 @@ import tensorflow as tf
 from tensorflow.keras.models import load_model
 from tqdm import tqdm
 
+from emotion_recognition.dataset import NetCDFWriter
 from emotion_recognition.tensorflow.models import audeep_trae
 
 
@@ -215,29 +216,21 @@ def generate(args):
 
     print("Read dataset from {}.".format(args.dataset))
 
-    representations = []
+    # Representations are written batch by batch as they're generated
+    writer = None
+    n_written = 0
     for batch in tqdm(data):
         _, representation = model(batch, training=False)
-        representations.append(representation.numpy())
-    representations = np.concatenate(representations)
-
-    dataset = netCDF4.Dataset(str(args.output), 'w')
-    dataset.createDimension('instance', len(filenames))
-    dataset.createDimension('generated', representations.shape[-1])
-
-    filename = dataset.createVariable('filename', str, ('instance',))
-    filename[:] = filenames
-
-    label_nominal = dataset.createVariable('label_nominal', str, ('instance',))
-    label_nominal[:] = labels
-
-    features = dataset.createVariable('features', np.float32,
-                                      ('instance', 'generated'))
-    features[:, :] = representations
-
-    dataset.setncattr_string('feature_dims', '["generated"]')
-    dataset.setncattr_string('corpus', corpus)
-    dataset.close()
+        representation = representation.numpy()
+        if writer is None:
+            writer = NetCDFWriter(args.output, representation.shape[-1],
+                                  corpus=corpus)
+        end = n_written + len(representation)
+        writer.append(filenames[n_written:end], representation,
+                      annotations=labels[n_written:end])
+        n_written = end
+    if writer is not None:
+        writer.close()
 
     print("Wrote netCDF4 file to {}.".format(args.output))
 
@@ -8,8 +8,13 @@ from typing import Dict, List, Optional
 import numpy as np
 import pandas as pd
 import tensorflow as tf
-from emotion_recognition.classification import PrecomputedSVC
+from emotion_recognition.cache import FitCache
+from emotion_recognition.classification import (PrecomputedSVC,
+                                                SVMPathSearchCV)
 from emotion_recognition.dataset import LabelledDataset
+from emotion_recognition.kernels import KernelCache
+from emotion_recognition.metrics import MetricsScorer
+from emotion_recognition.normalisation import FoldNormaliser
 from emotion_recognition.tensorflow.classification import tf_cross_validate
 from emotion_recognition.tensorflow.models import (aldeneh2017_model,
                                                    latif2019_model,
@@ -19,8 +24,6 @@ from emotion_recognition.tensorflow.models.zhang2019 import \
     create_windowed_dataset
 from emotion_recognition.tensorflow.utils import create_tf_dataset_ragged
 from scikeras.wrappers import KerasClassifier
-from sklearn.metrics import (get_scorer, make_scorer, precision_score,
-                             recall_score)
 from sklearn.model_selection import (GridSearchCV, GroupKFold,
                                      LeaveOneGroupOut, cross_validate)
 from sklearn.preprocessing import StandardScaler
@@ -121,7 +124,9 @@ def test_classifier(kind: str,
                     verbose: bool = False,
                     lr: float = 1e-4,
                     epochs: int = 50,
-                    bs: int = 64):
+                    bs: int = 64,
+                    fit_cache: Optional[FitCache] = None,
+                    normaliser: Optional[FoldNormaliser] = None):
     splitter = LeaveOneGroupOut()
     if len(dataset.speakers) > 12:
         splitter = GroupKFold(6)
@@ -136,53 +141,86 @@ def test_classifier(kind: str,
     df = pd.DataFrame(index=pd.RangeIndex(1, reps + 1, name='rep'),
                       columns=metrics + ['params'])
 
-    scoring = {'war': get_scorer('accuracy'),
-               'uar': get_scorer('balanced_accuracy')}
-    for i, c in enumerate(dataset.classes):
-        scoring.update({
-            c + '_rec': make_scorer(recall_score, average=None, labels=[i]),
-            c + '_prec': make_scorer(precision_score, average=None, labels=[i])
-        })
+    scoring = MetricsScorer(dataset.classes)
 
     type_ = ''
     _slash = kind.find('/')
     if kind.find('/') >= 0:
         type_ = kind[:_slash]
         kind = kind[_slash + 1:]
+    x = dataset.x
+    if normaliser is not None and type_ != 'cnn':
+        # Speaker normalisation is the same in every fold, so the
+        # scikit-learn models, which need the data in memory, are given
+        # all instances normalised at once
+        x = normaliser.transform(x[:], np.arange(dataset.n_instances))
+    kernel_cache = None
+    if type_ == 'svm':
+        # Kernel values are computed once and shared by all folds, grid
+        # points and reps
+        kernel_cache = KernelCache(x)
+        x = kernel_cache.indices()
+
+    param_grid, search_cls = None, None
+    if type_ == 'svm':
+        # Fits the C values of each grid point as a path
+        param_grid, search_cls = get_svm_params(kind), SVMPathSearchCV
+        # Compute the kernel matrices before they are shared by the
+        # parallel search and cross-validation
+        kernel_cache.precompute(param_grid['kernel'])
+    elif kind == 'rf':
+        param_grid, search_cls = get_rf_params(), GridSearchCV
+
     for rep in range(1, reps + 1):
         print("Rep {}/{}".format(rep, reps))
         if type_ in ['svm', 'mlp'] or kind == 'rf':
-            if type_ == 'mlp':
-                # Force CPU only to do in parallel, supress TF errors
-                os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
-                os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
-                params = dict(lr=lr, batch_size=bs, epochs=epochs)
-                clf = KerasClassifier(
-                    get_vec_model, kind=kind, n_features=dataset.n_features,
-                    n_classes=dataset.n_classes, **params, verbose=False
+            entry = None
+            if fit_cache is not None:
+                # Cache the parameter search and cross-validation of each
+                # rep
+                cache_key = fit_cache.key(
+                    type_, kind, dataset.x, dataset.y,
+                    dataset.speaker_group_indices, normaliser, splitter,
+                    param_grid, search_cls, rep, lr, bs, epochs
                 )
+                entry = fit_cache.get(cache_key)
+            if entry is not None:
+                print("Using cached results.")
+                params, scores = entry['params'], entry['scores']
             else:
-                if type_ == 'svm':
-                    param_grid = get_svm_params(kind)
-                    _clf = PrecomputedSVC()
+                if type_ == 'mlp':
+                    # Force CPU only to do in parallel, supress TF errors
+                    os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
+                    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+                    params = dict(lr=lr, batch_size=bs, epochs=epochs)
+                    clf = KerasClassifier(
+                        get_vec_model, kind=kind,
+                        n_features=dataset.n_features,
+                        n_classes=dataset.n_classes, **params, verbose=False
+                    )
                 else:
-                    param_grid = get_rf_params()
-                    _clf = RandomForestClassifier()
-                clf = GridSearchCV(_clf, param_grid, cv=splitter,
-                                   scoring='balanced_accuracy', n_jobs=-1)
-                # Get best hyperparameters through inner CV
-                clf.fit(
-                    dataset.x, dataset.y, groups=dataset.speaker_group_indices,
-                    sample_weight=sample_weight
+                    if type_ == 'svm':
+                        estimator = PrecomputedSVC(kernel_cache=kernel_cache)
+                    else:
+                        estimator = RandomForestClassifier()
+                    clf = search_cls(estimator, param_grid, cv=splitter,
+                                     scoring='balanced_accuracy', n_jobs=-1)
+                    # Get best hyperparameters through inner CV
+                    clf.fit(
+                        x, dataset.y, groups=dataset.speaker_group_indices,
+                        sample_weight=sample_weight
+                    )
+                    params = clf.best_params_
+                    clf = clf.best_estimator_
+                fit_params = dict(sample_weight=sample_weight)
+                scores = cross_validate(
+                    clf, x, dataset.y, cv=splitter, scoring=scoring,
+                    groups=dataset.speaker_group_indices,
+                    fit_params=fit_params, n_jobs=-1, verbose=int(verbose)
                 )
-                params = clf.best_params_
-                clf = clf.best_estimator_
-            fit_params = dict(sample_weight=sample_weight)
-            scores = cross_validate(
-                clf, dataset.x, dataset.y, cv=splitter, scoring=scoring,
-                groups=dataset.speaker_group_indices,
-                fit_params=fit_params, n_jobs=-1, verbose=int(verbose)
-            )
+                if fit_cache is not None:
+                    fit_cache.put(cache_key, {'params': params,
+                                              'scores': scores})
         else:  # type_ == 'cnn'
             os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1'
             data_fn = create_tf_dataset_ragged
@@ -208,7 +246,8 @@ def test_classifier(kind: str,
                 model_fn, dataset.x, dataset.y, cv=splitter, scoring=scoring,
                 groups=dataset.speaker_group_indices, data_fn=data_fn,
                 sample_weight=sample_weight, log_dir=None,
-                fit_params=dict(epochs=epochs, verbose=verbose)
+                fit_params=dict(epochs=epochs, verbose=verbose),
+                normaliser=normaliser, cache=fit_cache, cache_key=rep
             )
             if logs:
                 log_dir = logs / ('rep_' + str(rep))
@@ -271,8 +310,18 @@ def main():
 
     # Misc. options
     parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--cache_dir', type=Path,
+                        help="Directory to cache parsed datasets in.")
+    parser.add_argument('--lazy', action='store_true',
+                        help="Read instances from disk only as needed. "
+                        "Only netCDF4 datasets support this.")
     parser.add_argument('--logs', type=Path,
                         help="Folder to write training logs per fold.")
+    parser.add_argument('--fit_cache', type=Path,
+                        help="Directory to cache fold results in, so that "
+                        "re-running skips folds already computed.")
+    parser.add_argument('--fit_cache_size', type=float, default=10,
+                        help="Maximum size of the fit cache in GiB.")
 
     # Model-specific options
     parser.add_argument('--learning_rate', type=float, default=1e-4)
@@ -284,17 +333,31 @@ def main():
     for gpu in tf.config.list_physical_devices('GPU'):
         tf.config.experimental.set_memory_growth(gpu, True)
 
-    dataset = LabelledDataset(args.data)
-    dataset.normalise(normaliser=StandardScaler(), scheme='speaker')
-    if args.pad:
-        dataset.pad_arrays(args.pad)
-    if args.clip:
-        dataset.clip_arrays(args.clip)
+    dataset = LabelledDataset(args.data, lazy=args.lazy,
+                              cache_dir=args.cache_dir)
+    normaliser = None
+    if args.pad or args.clip:
+        # Normalise before padding so that padding stays zero
+        dataset.normalise(normaliser=StandardScaler(), scheme='speaker')
+        if args.pad:
+            dataset.pad_arrays(args.pad)
+        if args.clip:
+            dataset.clip_arrays(args.clip)
+    else:
+        # Normalise each fold as it is used, so lazily loaded data is
+        # not read into memory up front
+        normaliser = dataset.fold_normaliser('speaker')
+
+    fit_cache = None
+    if args.fit_cache:
+        fit_cache = FitCache(args.fit_cache,
+                             max_bytes=int(args.fit_cache_size * 2**30))
 
     test_classifier(
         args.kind, dataset, reps=args.reps, results=args.results,
         logs=args.logs, verbose=args.verbose, lr=args.learning_rate,
-        epochs=args.epochs, bs=args.batch_size
+        epochs=args.epochs, bs=args.batch_size, fit_cache=fit_cache,
+        normaliser=normaliser
     )
 
 
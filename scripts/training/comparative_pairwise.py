@@ -11,6 +11,7 @@ import pandas as pd
 import tensorflow as tf
 from emotion_recognition.classification import PrecomputedSVC
 from emotion_recognition.dataset import LabelledDataset
+from emotion_recognition.metrics import MetricsScorer
 from emotion_recognition.tensorflow.classification import (DummyEstimator,
                                                            tf_cross_validate)
 from emotion_recognition.tensorflow.models import (aldeneh2017_model,
@@ -22,10 +23,7 @@ from emotion_recognition.tensorflow.models.zhang2019 import \
 from emotion_recognition.tensorflow.utils import create_tf_dataset_ragged
 from scikeras.wrappers import KerasClassifier
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import (get_scorer, make_scorer, precision_score,
-                             recall_score)
 from sklearn.model_selection import GridSearchCV, GroupKFold, LeaveOneGroupOut
-from sklearn.model_selection._validation import _score
 from sklearn.preprocessing import StandardScaler
 from tensorflow.keras import Model
 from tensorflow.keras.layers import Dense, Dropout, Input
@@ -124,7 +122,9 @@ def test_classifier(kind: str,
                     verbose: bool = False,
                     lr: float = 1e-4,
                     epochs: int = 50,
-                    bs: int = 64):
+                    bs: int = 64,
+                    approx: Optional[str] = None,
+                    rank: int = 1000):
     class_weight = (train_data.n_instances
                     / (train_data.n_classes * train_data.class_counts))
     # Necessary until scikeras supports passing in class_weights directly
@@ -134,13 +134,7 @@ def test_classifier(kind: str,
                + [x + '_prec' for x in train_data.classes])
     df = pd.DataFrame(index=pd.RangeIndex(1, reps + 1, name='rep'),
                       columns=metrics + ['params'])
-    scoring = {'war': get_scorer('accuracy'),
-               'uar': get_scorer('balanced_accuracy')}
-    for i, c in enumerate(train_data.classes):
-        scoring.update({
-            c + '_rec': make_scorer(recall_score, average=None, labels=[i]),
-            c + '_prec': make_scorer(precision_score, average=None, labels=[i])
-        })
+    scoring = MetricsScorer(train_data.classes)
 
     type_ = ''
     _slash = kind.find('/')
@@ -162,7 +156,8 @@ def test_classifier(kind: str,
             else:
                 if type_ == 'svm':
                     param_grid = get_svm_params(kind)
-                    _clf = PrecomputedSVC()
+                    _clf = PrecomputedSVC(approximation=approx,
+                                          n_components=rank)
                 else:
                     param_grid = get_rf_params()
                     _clf = RandomForestClassifier()
@@ -184,7 +179,7 @@ def test_classifier(kind: str,
             y_pred = clf.predict(test_data.x)
             dummy = DummyEstimator(y_pred)
             scores = defaultdict(list)
-            _scores = _score(dummy, y_pred, test_data.y, scoring)
+            _scores = scoring(dummy, y_pred, test_data.y)
             for k, v in _scores.items():
                 scores['test_' + k].append(v)
         else:  # type_ == 'cnn'
@@ -284,6 +279,12 @@ def main():
     parser.add_argument('--learning_rate', type=float, default=1e-4)
     parser.add_argument('--batch_size', type=int, default=64)
     parser.add_argument('--epochs', type=int, default=50)
+    parser.add_argument(
+        '--approx', type=str,
+        help="Approximate the SVM kernel. One of {nystroem, rff}."
+    )
+    parser.add_argument('--rank', type=int, default=1000,
+                        help="Rank of the kernel approximation.")
     args = parser.parse_args()
 
     tf.get_logger().setLevel(40)  # ERROR level
@@ -309,7 +310,8 @@ def main():
     test_classifier(
         args.kind, train_data, test_data, reps=args.reps, results=args.results,
         logs=args.logs, verbose=args.verbose, lr=args.learning_rate,
-        epochs=args.epochs, bs=args.batch_size
+        epochs=args.epochs, bs=args.batch_size, approx=args.approx,
+        rank=args.rank
     )
 
 
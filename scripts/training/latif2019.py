@@ -12,12 +12,11 @@ import numpy as np
 import pandas as pd
 import tensorflow as tf
 from emotion_recognition.dataset import LabelledDataset
+from emotion_recognition.metrics import MetricsScorer
 from emotion_recognition.tensorflow.classification import (
     BalancedSparseCategoricalAccuracy, tf_train_val_test)
 from emotion_recognition.tensorflow.models import latif2019_model
 from emotion_recognition.tensorflow.utils import create_tf_dataset_ragged
-from sklearn.metrics import (get_scorer, make_scorer, precision_score,
-                             recall_score)
 from sklearn.model_selection import LeaveOneGroupOut
 from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
 from tensorflow.keras.metrics import SparseCategoricalAccuracy
@@ -47,13 +46,7 @@ def test_corpus(corpus: str):
     df = pd.DataFrame(index=pd.RangeIndex(1, reps + 1, name='rep'),
                       columns=metrics + ['params'])
 
-    scoring = {'war': get_scorer('accuracy'),
-               'uar': get_scorer('balanced_accuracy')}
-    for i, c in enumerate(dataset.classes):
-        scoring.update({
-            c + '_rec': make_scorer(recall_score, average=None, labels=[i]),
-            c + '_prec': make_scorer(precision_score, average=None, labels=[i])
-        })
+    scoring = MetricsScorer(dataset.classes)
 
     for rep in range(1, reps + 1):
         print("Rep {}/{}".format(rep, reps))
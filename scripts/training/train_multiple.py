@@ -23,6 +23,12 @@ def main():
                         help="Normalisation method. One of {speaker, corpus}.")
     parser.add_argument('--save', type=Path,
                         help="Path to save trained model.")
+    parser.add_argument(
+        '--approx', type=str,
+        help="Approximate the SVM kernel. One of {nystroem, rff}."
+    )
+    parser.add_argument('--rank', type=int, default=1000,
+                        help="Rank of the kernel approximation.")
     args = parser.parse_args()
 
     dataset = CombinedDataset(*(NetCDFDataset(path) for path in args.input))
@@ -60,7 +66,8 @@ def main():
         'ap': make_scorer(average_precision_score, pos_label=0)
     }
 
-    clf = PrecomputedSVC(C=1.0, kernel='rbf', gamma=2**-6, probability=True)
+    clf = PrecomputedSVC(C=1.0, kernel='rbf', gamma=2**-6, probability=True,
+                         approximation=args.approx, n_components=args.rank)
     scores = cross_validate(
         clf, dataset.x, dataset.y, cv=cv, scoring=scoring, groups=groups,
         fit_params={'sample_weight': sample_weight}, n_jobs=6, verbose=0
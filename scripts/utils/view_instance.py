@@ -16,7 +16,7 @@ def main():
     parser.add_argument('--instance', type=str, default='2')
     args = parser.parse_args()
 
-    dataset = Dataset(args.input)
+    dataset = Dataset(args.input, lazy=args.input.suffix == '.nc')
     if args.instance.isdigit():
         instance = int(args.instance)
     else: